@@ -0,0 +1,31 @@
+# 效能基準：以目前資料庫比較「逐一雇主查詢」與「一次批次查詢」產生全雇主月報的耗時。
+# 用法: python benchmarks/employer_summary.py [YYYY-MM]
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_models import employer_dashboard_model
+
+def main():
+    period = sys.argv[1] if len(sys.argv) > 1 else datetime.now().strftime('%Y-%m')
+    # 以 __wrapped__ 呼叫未經快取的函式，量測實際查詢時間
+    employers = employer_dashboard_model.get_all_employers.__wrapped__()
+
+    start = time.perf_counter()
+    for employer in employers:
+        employer_dashboard_model.get_employer_financial_summary.__wrapped__(employer, period)
+    loop_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_df = employer_dashboard_model.get_all_employers_financial_summary.__wrapped__(period)
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"{period}：{len(employers)} 位雇主")
+    print(f"  逐一查詢: {loop_elapsed:.3f} 秒")
+    print(f"  批次查詢: {batch_elapsed:.3f} 秒 ({len(batch_df)} 筆)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# 效能基準：以目前資料庫比較移工總覽關鍵字搜尋使用 LIKE 與 MATCH 的耗時 (結果筆數應相同)。
+# 用法: python benchmarks/worker_search.py 關鍵字 [關鍵字 ...]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_models import text_search, worker_model
+
+def timed_count(term: str, use_index: bool):
+    """回傳 (筆數, 秒數)；use_index 為 False 時暫時視為沒有全文檢索索引，改用 LIKE 條件。"""
+    original = text_search.search_index_ready
+    if not use_index:
+        text_search.search_index_ready = lambda: False
+    try:
+        start = time.perf_counter()
+        count = worker_model.count_workers_for_view.__wrapped__({'name_search': term})
+        return count, time.perf_counter() - start
+    finally:
+        text_search.search_index_ready = original
+
+def main():
+    if not text_search.search_index_ready():
+        sys.exit("資料庫尚未建立全文檢索索引，請先啟動主程式完成升級。")
+    for term in sys.argv[1:]:
+        like_count, like_elapsed = timed_count(term, use_index=False)
+        match_count, match_elapsed = timed_count(term, use_index=True)
+        print(f"{term!r}：LIKE {like_count} 筆 {like_elapsed:.3f} 秒 / MATCH {match_count} 筆 {match_elapsed:.3f} 秒")
+
+if __name__ == '__main__':
+    main()
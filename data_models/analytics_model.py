@@ -1,6 +1,9 @@
 import pandas as pd
 import database
+from . import expense_anomalies
+from .query_cache import cached_query, invalidate_tables, invalidates
 
+@cached_query('Dormitories', 'Meters')
 def get_all_meters_for_selection():
     """獲取所有「我司管理」宿舍的電水錶列表，用於下拉選單。"""
     conn = database.get_db_connection()
@@ -22,6 +25,7 @@ def get_all_meters_for_selection():
     finally:
         if conn: conn.close()
 
+@cached_query('UtilityBills')
 def get_bill_history_for_meter(meter_id: int):
     """根據指定的電水錶ID，查詢其所有的歷史帳單紀錄。"""
     if not meter_id:
@@ -45,61 +49,73 @@ def get_bill_history_for_meter(meter_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories', 'Meters', 'UtilityBills', 'MeterAnomalyBounds')
 def find_expense_anomalies():
     """
     使用統計學方法 (IQR)，找出所有我司管理宿舍中，費用異常升高或降低的帳單紀錄。
     【v1.1 修改】在結果中增加「正常範圍」的欄位，提供判斷依據。
+    帳單以日均金額比較 (帳單期間長短不一)，各電錶的範圍與判斷結果由 expense_anomalies 預先存放，
+    此處只讀出異常紀錄；尚未評分的帳單請先呼叫 refresh_expense_anomalies。
     """
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
         query = """
             SELECT
-                d.original_address,
-                m.meter_type,
-                m.meter_number,
-                b.bill_start_date,
-                b.bill_end_date,
-                b.amount
-            FROM UtilityBills b
+                d.original_address AS "宿舍地址",
+                m.meter_type AS "類型",
+                m.meter_number AS "錶號",
+                b.bill_start_date AS "帳單起日",
+                b.bill_end_date AS "帳單迄日",
+                b.amount AS "異常金額",
+                a.daily_amount, a.lower_bound, a.upper_bound,
+                a.judgement AS "判斷"
+            FROM UtilityBillAnomalies a
+            JOIN UtilityBills b ON a.bill_id = b.id
             JOIN Meters m ON b.meter_id = m.id
             JOIN Dormitories d ON b.dorm_id = d.id
             WHERE d.primary_manager = '我司'
+            ORDER BY d.original_address, m.meter_type, m.meter_number, b.bill_end_date
         """
         df = pd.read_sql_query(query, conn)
-        if df.empty or len(df) < 4:
+        if df.empty:
             return pd.DataFrame()
 
-        anomalies = []
-        for meter, group in df.groupby(['original_address', 'meter_type', 'meter_number']):
-            if len(group) < 4: continue
+        df['日均金額'] = df['daily_amount'].round(1)
+        df['正常範圍 (日均)'] = (
+            df['lower_bound'].map('{:,.1f}'.format) + ' ~ ' + df['upper_bound'].map('{:,.1f}'.format)
+        )
+        return df[['宿舍地址', '類型', '錶號', '帳單起日', '帳單迄日', '異常金額', '日均金額', '正常範圍 (日均)', '判斷']]
+    finally:
+        if conn: conn.close()
 
-            Q1 = group['amount'].quantile(0.25)
-            Q3 = group['amount'].quantile(0.75)
-            IQR = Q3 - Q1
-            
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            
-            outliers = group[(group['amount'] < lower_bound) | (group['amount'] > upper_bound)].copy()
-            
-            if not outliers.empty:
-                outliers['判斷'] = outliers['amount'].apply(lambda x: '費用過高' if x > upper_bound else '費用過低')
-                outliers['正常範圍'] = f"{int(lower_bound):,} ~ {int(upper_bound):,}"
-                anomalies.append(outliers)
+def refresh_expense_anomalies() -> int:
+    """
+    評分尚未評分的帳單 (寫入後評分失敗而留在佇列者；舊資料庫第一次使用時為全部帳單建立範圍)，回傳評分的帳單數。
+    有評分時才讓 find_expense_anomalies 的快取失效，沒有待處理的帳單時不寫入。
+    """
+    conn = database.get_db_connection()
+    if not conn: return 0
+    try:
+        scored = expense_anomalies.score_pending_bills(conn)
+    except Exception as e:
+        print(f"WARNING: 帳單異常評分失敗: {e}")
+        return 0
+    finally:
+        if conn: conn.close()
+    if scored:
+        invalidate_tables('MeterAnomalyBounds')
+    return scored
 
-        if not anomalies:
-            return pd.DataFrame()
-            
-        result_df = pd.concat(anomalies)
-        result_df.rename(columns={
-            'original_address': '宿舍地址',
-            'meter_type': '類型',
-            'meter_number': '錶號',
-            'bill_end_date': '帳單迄日',
-            'amount': '異常金額'
-        }, inplace=True)
-        
-        return result_df[['宿舍地址', '類型', '錶號', '帳單迄日', '異常金額', '正常範圍', '判斷']]
+@invalidates('MeterAnomalyBounds')
+def rebuild_expense_anomalies():
+    """以目前所有帳單重新計算各電錶的正常範圍，並重新判斷所有帳單。"""
+    conn = database.get_db_connection()
+    if not conn: return False, "DB connection failed."
+    try:
+        expense_anomalies.rebuild_all(conn)
+        return True, "已重新計算所有電水錶的正常範圍。"
+    except Exception as e:
+        return False, f"重新計算異常範圍時發生錯誤: {e}"
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
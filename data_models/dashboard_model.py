@@ -4,13 +4,17 @@ from dateutil.relativedelta import relativedelta
 
 # 只依賴最基礎的 database 模組
 import database
+from . import finance_rollup
+from . import residency
+from .query_cache import cached_query
 
+@cached_query('Dormitories', 'Rooms', 'Workers')
 def get_dormitory_dashboard_data():
     """獲取每個宿舍的人數與租金統計，用於「住宿總覽」頁籤。"""
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
-        query = """
+        query = f"""
             SELECT 
                 d.original_address AS "宿舍地址", d.primary_manager AS "主要管理人",
                 COUNT(w.unique_id) AS "總人數",
@@ -21,7 +25,7 @@ def get_dormitory_dashboard_data():
             FROM Dormitories d
             LEFT JOIN Rooms r ON d.id = r.dorm_id
             LEFT JOIN Workers w ON r.id = w.room_id
-            WHERE (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR w.accommodation_end_date > date('now', 'localtime'))
+            WHERE {residency.living_on('w')}
             GROUP BY d.id
             ORDER BY "主要管理人", "總人數" DESC
         """
@@ -30,69 +34,28 @@ def get_dormitory_dashboard_data():
         if conn: conn.close()
 
 
+@cached_query('Dormitories', 'Rooms', 'Workers', 'Leases', 'UtilityBills', 'AnnualExpenses')
 def get_financial_dashboard_data(year_month: str):
-    """執行一個複雜的聚合查詢，為指定的月份計算收支與損益。"""
+    """
+    為指定的月份計算各宿舍的收支與損益。
+    各宿舍每月的收入/月租/雜費/攤銷預先彙總於 DormMonthlyFinance，此處只需依月份查表。
+    """
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
+        finance_rollup.refresh_dorm_monthly_finance(conn, [year_month])
         query = """
-            WITH DateParams AS (
-                SELECT
-                    date(:year_month || '-01') as first_day_of_month,
-                    date(:year_month || '-01', '+1 month') as first_day_of_next_month
-            ),
-            MonthlyIncome AS (
-                SELECT r.dorm_id, SUM(w.monthly_fee) as total_income
-                FROM Workers w
-                JOIN Rooms r ON w.room_id = r.id JOIN Dormitories d ON r.dorm_id = d.id
-                WHERE d.primary_manager = '我司'
-                  AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= (SELECT first_day_of_next_month FROM DateParams))
-                  AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < (SELECT first_day_of_next_month FROM DateParams))
-                GROUP BY r.dorm_id
-            ),
-            MonthlyRent AS (
-                SELECT dorm_id, monthly_rent
-                FROM Leases
-                WHERE date(lease_start_date) < (SELECT first_day_of_next_month FROM DateParams)
-                  AND (lease_end_date IS NULL OR date(lease_end_date) >= (SELECT first_day_of_month FROM DateParams))
-            ),
-            ProratedUtilities AS (
-                SELECT
-                    b.dorm_id,
-                    SUM(
-                        CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1)
-                        * (MIN(julianday((SELECT first_day_of_next_month FROM DateParams)) - 1, julianday(b.bill_end_date)) - MAX(julianday((SELECT first_day_of_month FROM DateParams)), julianday(b.bill_start_date)) + 1)
-                    ) as total_utilities
-                FROM UtilityBills b
-                WHERE date(b.bill_start_date) < (SELECT first_day_of_next_month FROM DateParams) AND date(b.bill_end_date) >= (SELECT first_day_of_month FROM DateParams)
-                GROUP BY b.dorm_id
-            ),
-            AmortizedExpenses AS (
-                SELECT dorm_id, SUM(
-                    ROUND(total_amount * 1.0 / (
-                        (strftime('%Y', amortization_end_month || '-01') - strftime('%Y', amortization_start_month || '-01')) * 12 +
-                        (strftime('%m', amortization_end_month || '-01') - strftime('%m', amortization_start_month || '-01')) + 1
-                    ), 0)
-                ) as total_amortized
-                FROM AnnualExpenses
-                WHERE amortization_start_month <= :year_month AND amortization_end_month >= :year_month
-                GROUP BY dorm_id
-            )
             SELECT
                 d.original_address AS "宿舍地址",
-                IFNULL(mi.total_income, 0) AS "預計總收入",
-                IFNULL(mr.monthly_rent, 0) AS "宿舍月租",
-                ROUND(IFNULL(pu.total_utilities, 0), 0) AS "變動雜費",
-                IFNULL(ae.total_amortized, 0) AS "長期攤銷",
-                (IFNULL(mr.monthly_rent, 0) + ROUND(IFNULL(pu.total_utilities, 0), 0) + IFNULL(ae.total_amortized, 0)) AS "預計總支出",
-                (IFNULL(mi.total_income, 0) - (IFNULL(mr.monthly_rent, 0) + ROUND(IFNULL(pu.total_utilities, 0), 0) + IFNULL(ae.total_amortized, 0))) AS "預估損益"
-            FROM Dormitories d
-            LEFT JOIN MonthlyIncome mi ON d.id = mi.dorm_id
-            LEFT JOIN MonthlyRent mr ON d.id = mr.dorm_id
-            LEFT JOIN ProratedUtilities pu ON d.id = pu.dorm_id
-            LEFT JOIN AmortizedExpenses ae ON d.id = ae.dorm_id
-            WHERE d.primary_manager = '我司'
-              AND (mi.total_income IS NOT NULL OR mr.monthly_rent IS NOT NULL OR pu.total_utilities IS NOT NULL OR ae.total_amortized IS NOT NULL)
+                IFNULL(f.income, 0) AS "預計總收入",
+                IFNULL(f.rent, 0) AS "宿舍月租",
+                ROUND(IFNULL(f.utilities, 0), 0) AS "變動雜費",
+                IFNULL(f.amortized, 0) AS "長期攤銷",
+                (IFNULL(f.rent, 0) + ROUND(IFNULL(f.utilities, 0), 0) + IFNULL(f.amortized, 0)) AS "預計總支出",
+                (IFNULL(f.income, 0) - (IFNULL(f.rent, 0) + ROUND(IFNULL(f.utilities, 0), 0) + IFNULL(f.amortized, 0))) AS "預估損益"
+            FROM DormMonthlyFinance f
+            JOIN Dormitories d ON f.dorm_id = d.id
+            WHERE f.year_month = :year_month AND d.primary_manager = '我司'
             ORDER BY "預估損益" ASC
         """
         
@@ -101,6 +64,47 @@ def get_financial_dashboard_data(year_month: str):
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories', 'Rooms', 'Workers', 'Leases', 'UtilityBills', 'AnnualExpenses')
+def get_financial_series(start_month: str, end_month: str):
+    """
+    一次取得 start_month 到 end_month (含) 每個月、每間「我司管理」宿舍的收支與損益，
+    回傳長表格 (每列為一個宿舍的一個月份)，可直接用於繪製多月份趨勢圖。
+    月份清單由遞迴 CTE 產生的月曆表與 DormMonthlyFinance 彙總表關聯，只需一次查詢。
+    """
+    conn = database.get_db_connection()
+    if not conn: return pd.DataFrame()
+    try:
+        if start_month > end_month:
+            start_month, end_month = end_month, start_month
+        finance_rollup.refresh_dorm_monthly_finance(conn, finance_rollup.month_range(start_month, end_month))
+        query = """
+            WITH RECURSIVE Calendar(year_month) AS (
+                SELECT :start_month
+                UNION ALL
+                SELECT strftime('%Y-%m', year_month || '-01', '+1 month') FROM Calendar WHERE year_month < :end_month
+            )
+            SELECT
+                c.year_month AS "月份",
+                d.id AS dorm_id,
+                d.original_address AS "宿舍地址",
+                IFNULL(f.income, 0) AS "預計總收入",
+                IFNULL(f.rent, 0) AS "宿舍月租",
+                ROUND(IFNULL(f.utilities, 0), 0) AS "變動雜費",
+                IFNULL(f.amortized, 0) AS "長期攤銷",
+                (IFNULL(f.rent, 0) + ROUND(IFNULL(f.utilities, 0), 0) + IFNULL(f.amortized, 0)) AS "預計總支出",
+                (IFNULL(f.income, 0) - (IFNULL(f.rent, 0) + ROUND(IFNULL(f.utilities, 0), 0) + IFNULL(f.amortized, 0))) AS "預估損益"
+            FROM Calendar c
+            JOIN DormMonthlyFinance f ON f.year_month = c.year_month
+            JOIN Dormitories d ON f.dorm_id = d.id
+            WHERE d.primary_manager = '我司'
+            ORDER BY c.year_month, d.original_address
+        """
+        params = {"start_month": start_month, "end_month": end_month}
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        if conn: conn.close()
+
+@cached_query('Dormitories', 'Leases', 'UtilityBills')
 def get_expense_forecast_data(lookback_days: int = 365):
     """分析過去一段時間的數據，以估算未來的平均每日、每月、每年支出。"""
     conn = database.get_db_connection()
@@ -115,8 +119,8 @@ def get_expense_forecast_data(lookback_days: int = 365):
             FROM Leases l
             JOIN Dormitories d ON l.dorm_id = d.id
             WHERE d.primary_manager = '我司'
-            AND date(l.lease_start_date) <= date('now', 'localtime')
-            AND (l.lease_end_date IS NULL OR date(l.lease_end_date) >= date('now', 'localtime'))
+            AND l.lease_start_date <= date('now', 'localtime')
+            AND (l.lease_end_date IS NULL OR l.lease_end_date >= date('now', 'localtime'))
         """
         rent_df = pd.read_sql_query(rent_query, conn)
         total_monthly_rent = rent_df['total_rent'].sum() if not rent_df.empty and pd.notna(rent_df['total_rent'].sum()) else 0
@@ -127,7 +131,7 @@ def get_expense_forecast_data(lookback_days: int = 365):
             FROM UtilityBills b
             JOIN Dormitories d ON b.dorm_id = d.id
             WHERE d.primary_manager = '我司'
-            AND date(b.bill_end_date) >= ?
+            AND b.bill_end_date >= ?
         """
         bills_df = pd.read_sql_query(bills_query, conn, params=(start_date_str,))
 
@@ -164,6 +168,7 @@ def get_expense_forecast_data(lookback_days: int = 365):
     finally:
         if conn: conn.close()
 
+@cached_query('Workers', 'WorkerStatusHistory')
 def get_special_status_summary():
     """
     統計所有「在住」人員中，各種不同「特殊狀況」的人數。
@@ -174,14 +179,14 @@ def get_special_status_summary():
         return pd.DataFrame()
     try:
         # 使用子查詢來找出每位在住員工的「當前」最新狀態
-        query = """
+        query = f"""
             WITH CurrentStatuses AS (
                 SELECT
                     h.status,
                     ROW_NUMBER() OVER(PARTITION BY h.worker_unique_id ORDER BY h.start_date DESC) as rn
                 FROM WorkerStatusHistory h
                 JOIN Workers w ON h.worker_unique_id = w.unique_id
-                WHERE (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) > date('now', 'localtime'))
+                WHERE {residency.living_on('w')}
                   AND h.end_date IS NULL
             )
             SELECT
@@ -197,6 +202,7 @@ def get_special_status_summary():
         if conn:
             conn.close()
 
+@cached_query('Dormitories', 'Leases', 'UtilityBills')
 def get_seasonal_expense_forecast(year_month: str):
     """
     分析【去年同期】的數據，以估算指定月份的【季節性】支出。
@@ -215,8 +221,8 @@ def get_seasonal_expense_forecast(year_month: str):
             SELECT SUM(monthly_rent) as total_rent FROM Leases l
             JOIN Dormitories d ON l.dorm_id = d.id
             WHERE d.primary_manager = '我司'
-            AND date(l.lease_start_date) <= date('now', 'localtime')
-            AND (l.lease_end_date IS NULL OR date(l.lease_end_date) >= date('now', 'localtime'))
+            AND l.lease_start_date <= date('now', 'localtime')
+            AND (l.lease_end_date IS NULL OR l.lease_end_date >= date('now', 'localtime'))
         """
         rent_df = pd.read_sql_query(rent_query, conn)
         total_monthly_rent = rent_df['total_rent'].sum() if not rent_df.empty and pd.notna(rent_df['total_rent'].sum()) else 0
@@ -228,7 +234,7 @@ def get_seasonal_expense_forecast(year_month: str):
             FROM UtilityBills b
             JOIN Dormitories d ON b.dorm_id = d.id
             WHERE d.primary_manager = '我司'
-            AND date(b.bill_end_date) >= ? AND date(b.bill_start_date) <= ?
+            AND b.bill_end_date >= ? AND b.bill_start_date <= ?
         """
         bills_df = pd.read_sql_query(bills_query, conn, params=(lookback_start, lookback_end))
 
@@ -3,7 +3,10 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from . import text_search
+from .query_cache import cached_query, invalidates
 
+@cached_query('Dormitories')
 def get_all_dorms_for_view(search_term: str = None):
     """
     取得所有宿舍的基本資料，用於UI列表顯示。
@@ -26,9 +29,12 @@ def get_all_dorms_for_view(search_term: str = None):
         """
         params = []
         if search_term:
-            query += " WHERE original_address LIKE ? OR normalized_address LIKE ? OR dorm_name LIKE ? OR legacy_dorm_code LIKE ?"
-            term = f"%{search_term}%"
-            params.extend([term, term, term, term])
+            if text_search.can_match(search_term):
+                match_sql, params = text_search.dorm_ids_matching(search_term)
+                query += f" WHERE id IN ({match_sql})"
+            else:
+                like_sql, params = text_search.like_any(database.DORM_SEARCH_COLUMNS, search_term)
+                query += " WHERE " + like_sql
 
         query += " ORDER BY legacy_dorm_code"
         return pd.read_sql_query(query, conn, params=params)
@@ -36,6 +42,7 @@ def get_all_dorms_for_view(search_term: str = None):
         if conn: conn.close()
 
 
+@cached_query('Dormitories')
 def get_dorm_details_by_id(dorm_id: int):
     """取得單一宿舍的詳細資料。"""
     conn = database.get_db_connection()
@@ -48,6 +55,7 @@ def get_dorm_details_by_id(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('Dormitories', 'Rooms')
 def add_new_dormitory(details: dict):
     """新增宿舍的業務邏輯：1. 新增宿舍本身。 2. 自動建立預設房間。"""
     conn = database.get_db_connection()
@@ -55,6 +63,7 @@ def add_new_dormitory(details: dict):
     try:
         cursor = conn.cursor()
         
+        details = database.normalize_date_fields('Dormitories', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO Dormitories ({columns}) VALUES ({placeholders})"
@@ -74,12 +83,14 @@ def add_new_dormitory(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Dormitories')
 def update_dormitory_details(dorm_id: int, details: dict):
     """更新宿舍的詳細資料。"""
     conn = database.get_db_connection()
     if not conn: return False, "無法連接到資料庫"
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('Dormitories', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(dorm_id)
@@ -93,6 +104,7 @@ def update_dormitory_details(dorm_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Dormitories', cascade=True)
 def delete_dormitory_by_id(dorm_id: int):
     """刪除宿舍的業務邏輯：1. 檢查宿舍內是否還有在住移工。 2. 如果沒有，才執行刪除。"""
     conn = database.get_db_connection()
@@ -114,6 +126,7 @@ def delete_dormitory_by_id(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Rooms')
 def get_rooms_for_dorm_as_df(dorm_id: int):
     """
     查詢指定宿舍下的所有房間。
@@ -139,6 +152,7 @@ def get_rooms_for_dorm_as_df(dorm_id: int):
         if conn: conn.close()
 
 # --- 【本次新增】查詢與更新單一房間的函式 ---
+@cached_query('Rooms')
 def get_single_room_details(room_id: int):
     """取得單一房間的詳細資料。"""
     conn = database.get_db_connection()
@@ -151,6 +165,7 @@ def get_single_room_details(room_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('Rooms')
 def update_room_details(room_id: int, details: dict):
     """更新一筆已存在的房間紀錄。"""
     conn = database.get_db_connection()
@@ -170,6 +185,7 @@ def update_room_details(room_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Rooms')
 def add_new_room_to_dorm(details: dict):
     """為指定宿舍新增一個房間。"""
     conn = database.get_db_connection()
@@ -189,6 +205,7 @@ def add_new_room_to_dorm(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Rooms', cascade=True)
 def delete_room_by_id(room_id: int):
     """刪除房間的業務邏輯：1. 檢查房間內是否還有在住移工。 2. 如果沒有，才執行刪除。"""
     conn = database.get_db_connection()
@@ -209,6 +226,7 @@ def delete_room_by_id(room_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories')
 def get_dorms_for_selection():
     """取得 (id, 地址) 的列表，用於下拉選單。"""
     conn = database.get_db_connection()
@@ -221,6 +239,7 @@ def get_dorms_for_selection():
     finally:
         if conn: conn.close()
 
+@cached_query('Rooms')
 def get_rooms_for_selection(dorm_id: int):
     """取得指定宿舍下 (id, 房號) 的列表，用於下拉選單。"""
     if not dorm_id:
@@ -235,6 +254,7 @@ def get_rooms_for_selection(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Rooms')
 def get_dorm_id_from_room_id(room_id: int):
     """根據房間ID反查其所屬的宿舍ID。"""
     if not room_id:
@@ -249,6 +269,7 @@ def get_dorm_id_from_room_id(room_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories')
 def get_my_company_dorms_for_selection(search_term: str = None):
     """
     只取得「我司」管理的宿舍列表，並支援關鍵字搜尋。
@@ -263,9 +284,15 @@ def get_my_company_dorms_for_selection(search_term: str = None):
         params = []
         
         if search_term:
-            query += " AND (original_address LIKE ? OR normalized_address LIKE ?)"
-            term = f"%{search_term}%"
-            params.extend([term, term])
+            address_columns = ('original_address', 'normalized_address')
+            if text_search.can_match(search_term):
+                match_sql, match_params = text_search.dorm_ids_matching(search_term, address_columns)
+                query += f" AND id IN ({match_sql})"
+                params.extend(match_params)
+            else:
+                like_sql, like_params = text_search.like_any(address_columns, search_term)
+                query += " AND " + like_sql
+                params.extend(like_params)
             
         query += " ORDER BY original_address"
         
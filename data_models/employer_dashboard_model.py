@@ -2,7 +2,10 @@ import pandas as pd
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import database
+from . import finance_rollup, residency
+from .query_cache import cached_query
 
+@cached_query('Workers')
 def get_all_employers():
     """獲取所有不重複的雇主名稱列表，用於下拉選單。"""
     conn = database.get_db_connection()
@@ -14,6 +17,7 @@ def get_all_employers():
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory')
 def get_employer_resident_details(employer_name: str):
     """
     根據指定的雇主名稱，查詢其所有在住員工的詳細住宿報告。
@@ -24,7 +28,7 @@ def get_employer_resident_details(employer_name: str):
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
-        query = """
+        query = f"""
             SELECT
                 d.primary_manager AS "主要管理人",
                 d.original_address AS "宿舍地址",
@@ -40,13 +44,14 @@ def get_employer_resident_details(employer_name: str):
             LEFT JOIN Rooms r ON w.room_id = r.id
             LEFT JOIN Dormitories d ON r.dorm_id = d.id
             WHERE w.employer_name = ?
-            AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) > date('now', 'localtime'))
+            AND {residency.living_on('w')}
             ORDER BY d.original_address, r.room_number, w.worker_name
         """
         return pd.read_sql_query(query, conn, params=(employer_name,))
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory', 'Leases', 'UtilityBills', 'AnnualExpenses')
 def get_employer_financial_summary(employer_name: str, year_month: str):
     """
     為指定雇主和月份，計算預估的收支與損益細項。
@@ -55,7 +60,7 @@ def get_employer_financial_summary(employer_name: str, year_month: str):
     conn = database.get_db_connection()
     if not conn: return {"total_income": 0, "total_expense": 0, "profit_loss": 0, "details": {}}
     try:
-        query = """
+        query = f"""
             WITH DateParams AS (
                 SELECT
                     :year_month || '-01' as first_day_of_month,
@@ -69,8 +74,7 @@ def get_employer_financial_summary(employer_name: str, year_month: str):
                     SELECT worker_unique_id, status FROM WorkerStatusHistory
                     WHERE end_date IS NULL
                 ) h ON w.unique_id = h.worker_unique_id
-                WHERE (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= (SELECT first_day_of_month FROM DateParams))
-                  AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < (SELECT first_day_of_next_month FROM DateParams))
+                WHERE {residency.living_during('w', period_start='(SELECT first_day_of_month FROM DateParams)', period_end='(SELECT first_day_of_next_month FROM DateParams)')}
                   AND (h.status IS NULL OR h.status = '在住' OR h.status = '費用不同') -- 只計算實際住在宿舍的人
             ),
             DormOccupancy AS (
@@ -98,8 +102,8 @@ def get_employer_financial_summary(employer_name: str, year_month: str):
                     IFNULL(pu.total_utilities, 0) AS utilities_expense,
                     IFNULL(ae.total_amortized, 0) AS amortized_expense
                 FROM Dormitories d
-                LEFT JOIN (SELECT dorm_id, monthly_rent FROM Leases WHERE date(lease_start_date) < (SELECT first_day_of_next_month FROM DateParams) AND (lease_end_date IS NULL OR date(lease_end_date) >= (SELECT first_day_of_month FROM DateParams))) l ON d.id = l.dorm_id
-                LEFT JOIN (SELECT b.dorm_id, SUM(CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1) * (MIN(julianday(date((SELECT first_day_of_next_month FROM DateParams), '-1 day')), julianday(b.bill_end_date)) - MAX(julianday((SELECT first_day_of_month FROM DateParams)), julianday(b.bill_start_date)) + 1)) as total_utilities FROM UtilityBills b WHERE date(b.bill_start_date) < (SELECT first_day_of_next_month FROM DateParams) AND date(b.bill_end_date) >= (SELECT first_day_of_month FROM DateParams) GROUP BY b.dorm_id) pu ON d.id = pu.dorm_id
+                LEFT JOIN (SELECT dorm_id, monthly_rent FROM Leases WHERE lease_start_date < (SELECT first_day_of_next_month FROM DateParams) AND (lease_end_date IS NULL OR lease_end_date >= (SELECT first_day_of_month FROM DateParams))) l ON d.id = l.dorm_id
+                LEFT JOIN (SELECT b.dorm_id, SUM(CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1) * (MIN(julianday(date((SELECT first_day_of_next_month FROM DateParams), '-1 day')), julianday(b.bill_end_date)) - MAX(julianday((SELECT first_day_of_month FROM DateParams)), julianday(b.bill_start_date)) + 1)) as total_utilities FROM UtilityBills b WHERE b.bill_start_date < (SELECT first_day_of_next_month FROM DateParams) AND b.bill_end_date >= (SELECT first_day_of_month FROM DateParams) GROUP BY b.dorm_id) pu ON d.id = pu.dorm_id
                 LEFT JOIN (SELECT dorm_id, SUM(ROUND(total_amount * 1.0 / ((strftime('%Y', amortization_end_month || '-01') - strftime('%Y', amortization_start_month || '-01')) * 12 + (strftime('%m', amortization_end_month || '-01') - strftime('%m', amortization_start_month || '-01')) + 1))) as total_amortized FROM AnnualExpenses WHERE amortization_start_month <= :year_month AND amortization_end_month >= :year_month GROUP BY dorm_id) ae ON d.id = ae.dorm_id
             ),
             EmployerProratedExpenses AS (
@@ -111,7 +115,7 @@ def get_employer_financial_summary(employer_name: str, year_month: str):
                 JOIN DormMonthlyExpenses dme ON dp.dorm_id = dme.dorm_id
             )
             SELECT
-                (SELECT SUM(w.monthly_fee) FROM Workers w WHERE w.employer_name = :employer_name AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= (SELECT first_day_of_month FROM DateParams)) AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < (SELECT first_day_of_next_month FROM DateParams))) as total_income,
+                (SELECT SUM(w.monthly_fee) FROM Workers w WHERE w.employer_name = :employer_name AND {residency.living_during('w', period_start='(SELECT first_day_of_month FROM DateParams)', period_end='(SELECT first_day_of_next_month FROM DateParams)')}) as total_income,
                 epe.total_rent_expense,
                 epe.total_utilities_expense,
                 epe.total_amortized_expense
@@ -140,4 +144,94 @@ def get_employer_financial_summary(employer_name: str, year_month: str):
             }
         }
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
+
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory', 'Leases', 'UtilityBills', 'AnnualExpenses')
+def get_all_employers_financial_summary(year_month: str):
+    """
+    一次計算「所有」雇主在指定月份的收支與損益，回傳以雇主名稱為索引的 DataFrame。
+    分攤規則與 get_employer_financial_summary 相同 (依實際住宿人數比例分攤各宿舍的月租/雜費/攤銷)，
+    但各宿舍的人數與支出只計算一次，再依雇主分組加總，不需對每位雇主重跑整個查詢。
+    """
+    columns = ['total_income', 'total_expense', 'profit_loss', '分攤月租', '分攤雜費(水電等)', '分攤長期費用(保險等)']
+    conn = database.get_db_connection()
+    if not conn: return pd.DataFrame(columns=columns)
+    try:
+        finance_rollup.refresh_dorm_monthly_finance(conn, [year_month])
+        query = f"""
+            WITH DateParams AS (
+                SELECT
+                    :year_month || '-01' as first_day_of_month,
+                    date(:year_month || '-01', '+1 month') as first_day_of_next_month
+            ),
+            ActiveWorkers AS (
+                SELECT w.unique_id, w.employer_name, r.dorm_id
+                FROM Workers w
+                JOIN Rooms r ON w.room_id = r.id
+                LEFT JOIN (
+                    SELECT worker_unique_id, status FROM WorkerStatusHistory
+                    WHERE end_date IS NULL
+                ) h ON w.unique_id = h.worker_unique_id
+                WHERE {residency.living_during('w', period_start='(SELECT first_day_of_month FROM DateParams)', period_end='(SELECT first_day_of_next_month FROM DateParams)')}
+                  AND (h.status IS NULL OR h.status = '在住' OR h.status = '費用不同') -- 只計算實際住在宿舍的人
+            ),
+            DormOccupancy AS (
+                SELECT dorm_id, COUNT(unique_id) AS total_residents
+                FROM ActiveWorkers
+                GROUP BY dorm_id
+            ),
+            EmployerProration AS (
+                -- 每位雇主在每個宿舍的佔用比例
+                SELECT
+                    aw.employer_name,
+                    aw.dorm_id,
+                    CAST(COUNT(aw.unique_id) AS REAL) / o.total_residents AS proration_ratio
+                FROM ActiveWorkers aw
+                JOIN DormOccupancy o ON aw.dorm_id = o.dorm_id
+                GROUP BY aw.employer_name, aw.dorm_id
+            ),
+            EmployerProratedExpenses AS (
+                SELECT
+                    ep.employer_name,
+                    SUM(IFNULL(f.rent, 0) * ep.proration_ratio) AS total_rent_expense,
+                    SUM(IFNULL(f.utilities, 0) * ep.proration_ratio) AS total_utilities_expense,
+                    SUM(IFNULL(f.amortized, 0) * ep.proration_ratio) AS total_amortized_expense
+                FROM EmployerProration ep
+                LEFT JOIN DormMonthlyFinance f ON f.dorm_id = ep.dorm_id AND f.year_month = :year_month
+                GROUP BY ep.employer_name
+            ),
+            EmployerIncome AS (
+                SELECT w.employer_name, SUM(w.monthly_fee) AS total_income
+                FROM Workers w
+                WHERE {residency.living_during('w', period_start='(SELECT first_day_of_month FROM DateParams)', period_end='(SELECT first_day_of_next_month FROM DateParams)')}
+                GROUP BY w.employer_name
+            )
+            SELECT
+                e.employer_name,
+                IFNULL(i.total_income, 0) AS total_income,
+                IFNULL(x.total_rent_expense, 0) AS total_rent_expense,
+                IFNULL(x.total_utilities_expense, 0) AS total_utilities_expense,
+                IFNULL(x.total_amortized_expense, 0) AS total_amortized_expense
+            FROM (SELECT DISTINCT employer_name FROM Workers) e
+            LEFT JOIN EmployerIncome i ON e.employer_name = i.employer_name
+            LEFT JOIN EmployerProratedExpenses x ON e.employer_name = x.employer_name
+            ORDER BY e.employer_name
+        """
+        summary = pd.read_sql_query(query, conn, params={"year_month": year_month})
+        if summary.empty:
+            return pd.DataFrame(columns=columns)
+
+        # 取整方式與 get_employer_financial_summary 一致
+        expense = summary['total_rent_expense'] + summary['total_utilities_expense'] + summary['total_amortized_expense']
+        result = pd.DataFrame({
+            'total_income': summary['total_income'].astype(int),
+            'total_expense': expense.astype(int),
+            'profit_loss': (summary['total_income'] - expense).astype(int),
+            '分攤月租': summary['total_rent_expense'].astype(int),
+            '分攤雜費(水電等)': summary['total_utilities_expense'].astype(int),
+            '分攤長期費用(保險等)': summary['total_amortized_expense'].astype(int),
+        })
+        result.index = pd.Index(summary['employer_name'], name='employer_name')
+        return result
+    finally:
+        if conn: conn.close()
@@ -3,7 +3,9 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from .query_cache import cached_query, invalidates
 
+@cached_query('DormitoryEquipment')
 def get_equipment_for_dorm_as_df(dorm_id: int):
     """
     查詢指定宿舍下的所有設備，用於UI列表顯示。
@@ -24,6 +26,7 @@ def get_equipment_for_dorm_as_df(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('DormitoryEquipment')
 def get_single_equipment_details(record_id: int):
     """查詢單一筆設備的詳細資料。"""
     conn = database.get_db_connection()
@@ -36,12 +39,14 @@ def get_single_equipment_details(record_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('DormitoryEquipment')
 def add_equipment_record(details: dict):
     """新增一筆設備紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed.", None
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('DormitoryEquipment', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO DormitoryEquipment ({columns}) VALUES ({placeholders})"
@@ -55,12 +60,14 @@ def add_equipment_record(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('DormitoryEquipment')
 def update_equipment_record(record_id: int, details: dict):
     """更新一筆已存在的設備紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed."
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('DormitoryEquipment', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(record_id)
@@ -74,6 +81,7 @@ def update_equipment_record(record_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('DormitoryEquipment')
 def delete_equipment_record(record_id: int):
     """刪除一筆設備紀錄。"""
     conn = database.get_db_connection()
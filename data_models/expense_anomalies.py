@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+# 只依賴最基礎的 database 模組
+import database
+
+# 費用異常偵測 (IQR)：帳單期間長短不一，因此以「日均金額」= 帳單金額 / 帳單天數 比較。
+# 各電水錶的正常範圍 (Q1 - 1.5 × IQR ~ Q3 + 1.5 × IQR) 存於 MeterAnomalyBounds，
+# 超出範圍的帳單存於 UtilityBillAnomalies (見 database.create_expense_anomaly_tables)。
+# 新增 / 修改的帳單由觸發器排入佇列，score_pending_bills 只以已存的範圍評分這些帳單，
+# 因此每次寫入帳單後都能立即檢查，不需重新讀取所有歷史帳單。
+# 評分只在寫入帳單後或明確的 refresh / rebuild 時進行，讀取異常清單的查詢本身不寫入。
+
+MIN_SAMPLES = 4        # 至少需要幾筆帳單才計算正常範圍
+IQR_FACTOR = 1.5
+BOUNDS_REFRESH_GROWTH = 0.2  # 電錶的帳單數比計算範圍當時多出 20% 以上時，重算該錶的範圍
+
+_schema_ready = False
+
+# 可計算日均金額的帳單 (有電錶、金額，且起訖日有效)
+_DAILY_BILLS_SQL = """
+    SELECT b.id AS bill_id, b.meter_id,
+           CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1) AS daily_amount
+    FROM UtilityBills b
+    WHERE b.meter_id IS NOT NULL AND b.amount IS NOT NULL
+      AND julianday(b.bill_end_date) >= julianday(b.bill_start_date)
+"""
+
+def _ensure_schema(conn):
+    """舊資料庫可能還沒有異常偵測的表格與觸發器，第一次使用時補建。"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    database.create_expense_anomaly_tables(conn.cursor())
+    conn.commit()
+    _schema_ready = True
+
+def _outliers(bills: pd.DataFrame) -> pd.DataFrame:
+    """bills 需含 bill_id、meter_id、daily_amount、lower_bound、upper_bound，回傳超出範圍的帳單與判斷。"""
+    high = bills['daily_amount'] > bills['upper_bound']
+    low = bills['daily_amount'] < bills['lower_bound']
+    outliers = bills.loc[high | low, ['bill_id', 'meter_id', 'daily_amount', 'lower_bound', 'upper_bound']]
+    return outliers.assign(judgement=np.where(high[high | low], '費用過高', '費用過低'))
+
+def _insert_anomalies(conn, outliers: pd.DataFrame):
+    conn.executemany("""
+        INSERT OR REPLACE INTO UtilityBillAnomalies (bill_id, meter_id, daily_amount, lower_bound, upper_bound, judgement)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, outliers[['bill_id', 'meter_id', 'daily_amount', 'lower_bound', 'upper_bound', 'judgement']]
+        .astype(object).itertuples(index=False, name=None))
+
+def _rebuild(conn, meter_ids=None) -> int:
+    """
+    重新計算電水錶的正常範圍 (meter_ids 為 None 時為全部電錶)，並以新範圍重新評分這些電錶的所有帳單，回傳評分的帳單數。
+    分位數以 groupby().transform 一次算出，不逐錶迴圈。需在呼叫端的交易中執行。
+    """
+    query, params = _DAILY_BILLS_SQL, []
+    if meter_ids is not None:
+        meter_ids = list(meter_ids)
+        if not meter_ids:
+            return 0
+        placeholders = ', '.join('?' for _ in meter_ids)
+        query += f" AND b.meter_id IN ({placeholders})"
+        params = meter_ids
+        conn.execute(f"DELETE FROM MeterAnomalyBounds WHERE meter_id IN ({placeholders})", meter_ids)
+        conn.execute(f"DELETE FROM UtilityBillAnomalies WHERE meter_id IN ({placeholders})", meter_ids)
+    else:
+        conn.execute("DELETE FROM MeterAnomalyBounds")
+        conn.execute("DELETE FROM UtilityBillAnomalies")
+
+    bills = pd.read_sql_query(query, conn, params=params)
+    if bills.empty:
+        return 0
+    grouped = bills.groupby('meter_id')['daily_amount']
+    bills['sample_size'] = grouped.transform('size')
+    bills['q1'] = grouped.transform('quantile', 0.25)
+    bills['q3'] = grouped.transform('quantile', 0.75)
+    iqr = bills['q3'] - bills['q1']
+    bills['lower_bound'] = bills['q1'] - IQR_FACTOR * iqr
+    bills['upper_bound'] = bills['q3'] + IQR_FACTOR * iqr
+    # 帳單不足的電錶也記錄筆數 (範圍為 NULL)，之後新增帳單時據此判斷是否已足夠計算
+    too_few = bills['sample_size'] < MIN_SAMPLES
+    bills.loc[too_few, ['q1', 'q3', 'lower_bound', 'upper_bound']] = np.nan
+
+    bounds = bills.drop_duplicates('meter_id')[['meter_id', 'sample_size', 'q1', 'q3', 'lower_bound', 'upper_bound']]
+    conn.executemany("""
+        INSERT INTO MeterAnomalyBounds (meter_id, sample_size, q1, q3, lower_bound, upper_bound)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, bounds.astype(object).where(bounds.notna(), None).itertuples(index=False, name=None))
+    _insert_anomalies(conn, _outliers(bills[~too_few]))
+    return len(bills)
+
+def score_pending_bills(conn) -> int:
+    """
+    評分上次評分後新增或修改的帳單 (UtilityBillAnomalyQueue)，回傳處理的帳單數。
+    - 尚未建立過任何範圍時，為所有電錶完整計算一次 (回傳評分的帳單總數)。
+    - 電錶已有範圍：直接以已存的範圍判斷新帳單。
+    - 電錶尚無範圍 (帳單不足) 或帳單數已比計算範圍時多出 BOUNDS_REFRESH_GROWTH：只重算該錶。
+    沒有待處理的帳單時不會開啟寫入交易。
+    """
+    _ensure_schema(conn)
+    built = conn.execute("SELECT EXISTS (SELECT 1 FROM MeterAnomalyBounds)").fetchone()[0]
+    pending = conn.execute("SELECT COUNT(*) FROM UtilityBillAnomalyQueue").fetchone()[0]
+    if built and not pending:
+        return 0
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 取得寫入鎖後重新讀取，避免與其他連線重複計算
+        built = conn.execute("SELECT EXISTS (SELECT 1 FROM MeterAnomalyBounds)").fetchone()[0]
+        pending = conn.execute("SELECT COUNT(*) FROM UtilityBillAnomalyQueue").fetchone()[0]
+        if not built:
+            pending = _rebuild(conn)
+        elif pending:
+            # 佇列中的帳單可能已改為無法計算 (例如移除電錶)，先清除其舊的判斷結果
+            conn.execute("DELETE FROM UtilityBillAnomalies WHERE bill_id IN (SELECT bill_id FROM UtilityBillAnomalyQueue)")
+            bills = pd.read_sql_query(f"""
+                SELECT p.*, mb.sample_size, mb.lower_bound, mb.upper_bound,
+                       (SELECT COUNT(*) FROM UtilityBills c
+                        WHERE c.meter_id = p.meter_id AND c.amount IS NOT NULL
+                          AND julianday(c.bill_end_date) >= julianday(c.bill_start_date)) AS bill_count
+                FROM ({_DAILY_BILLS_SQL} AND b.id IN (SELECT bill_id FROM UtilityBillAnomalyQueue)) p
+                LEFT JOIN MeterAnomalyBounds mb ON mb.meter_id = p.meter_id
+            """, conn)
+            stale = (
+                bills['lower_bound'].isna()
+                | (bills['bill_count'] >= bills['sample_size'].fillna(0) * (1 + BOUNDS_REFRESH_GROWTH))
+            )
+            _rebuild(conn, bills.loc[stale, 'meter_id'].unique().tolist())
+            _insert_anomalies(conn, _outliers(bills[~stale]))
+        conn.execute("DELETE FROM UtilityBillAnomalyQueue")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return pending
+
+def rebuild_all(conn):
+    """以目前所有帳單重新計算全部電錶的正常範圍並重新評分 (例如大量修正歷史資料之後)。"""
+    _ensure_schema(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _rebuild(conn)
+        conn.execute("DELETE FROM UtilityBillAnomalyQueue")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def score_after_write(conn):
+    """帳單寫入提交後呼叫：立即評分新帳單；失敗時只記錄警告，帳單留在佇列中，由 refresh (開啟異常分析時) 再評分。"""
+    try:
+        score_pending_bills(conn)
+    except Exception as e:
+        print(f"WARNING: 帳單異常評分失敗，下次開啟異常分析時重試: {e}")
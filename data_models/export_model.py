@@ -6,7 +6,7 @@ import database
 import utils
 
 # 從其他 model 匯入，以複用查詢邏輯
-from . import worker_model 
+from . import residency, worker_model
 
 # --- 設定 ---
 GSHEET_NAME = "宿舍外部儀表板數據"
@@ -24,7 +24,7 @@ def get_data_for_export():
     if not conn: return pd.DataFrame()
     try:
         # 使用一個與 worker_model.get_workers_for_view 類似的查詢，但專為導出設計
-        query = """
+        query = f"""
             SELECT
                 d.primary_manager AS '主要管理人',
                 d.normalized_address as '宿舍地址',
@@ -34,15 +34,14 @@ def get_data_for_export():
                 w.gender AS '性別',
                 w.nationality AS '國籍',
                 w.monthly_fee as '月費',
-                (SELECT status FROM WorkerStatusHistory 
-                 WHERE worker_unique_id = w.unique_id AND end_date IS NULL 
-                 ORDER BY start_date DESC LIMIT 1) as '特殊狀況'
+                cs.status as '特殊狀況'
             FROM Workers w
             LEFT JOIN Rooms r ON w.room_id = r.id
             LEFT JOIN Dormitories d ON r.dorm_id = d.id
+            {residency.current_status_join('cs', 'w')}
             WHERE 
                 d.primary_manager = '我司' AND
-                (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) > date('now', 'localtime'))
+                {residency.living_on('w')}
             ORDER BY d.normalized_address, r.room_number, w.worker_name
         """
         df = pd.read_sql_query(query, conn)
@@ -70,8 +69,8 @@ def get_equipment_for_export():
             FROM DormitoryEquipment e
             JOIN Dormitories d ON e.dorm_id = d.id
             WHERE d.primary_manager = '我司'
-              AND e.next_check_date IS NOT NULL AND e.next_check_date != ''
-            ORDER BY date(e.next_check_date) ASC
+              AND e.next_check_date IS NOT NULL
+            ORDER BY e.next_check_date ASC
         """
         df = pd.read_sql_query(query, conn)
         print(f"INFO: 查詢完成，共獲取 {len(df)} 筆設備資料。")
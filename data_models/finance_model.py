@@ -3,9 +3,12 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from . import expense_anomalies, residency
+from .query_cache import cached_query, invalidates
 
 # --- 房租管理 ---
 
+@cached_query('Dormitories', 'Rooms', 'Workers')
 def get_workers_for_rent_management(dorm_ids: list):
     """
     根據提供的宿舍ID列表，查詢所有在住移工的房租相關資訊。
@@ -25,13 +28,14 @@ def get_workers_for_rent_management(dorm_ids: list):
             JOIN Rooms r ON w.room_id = r.id
             JOIN Dormitories d ON r.dorm_id = d.id
             WHERE d.id IN ({placeholders})
-            AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) > date('now', 'localtime'))
+            AND {residency.living_on('w')}
             ORDER BY d.original_address, r.room_number, w.worker_name
         """
         return pd.read_sql_query(query, conn, params=tuple(dorm_ids))
     finally:
         if conn: conn.close()
 
+@invalidates('Workers')
 def batch_update_rent(dorm_ids: list, old_rent: int, new_rent: int, update_nulls: bool = False):
     """
     批次更新指定宿舍內移工的月費。
@@ -47,7 +51,7 @@ def batch_update_rent(dorm_ids: list, old_rent: int, new_rent: int, update_nulls
         
         where_clause_parts = [
             f"r.dorm_id IN ({placeholders})",
-            "(w.accommodation_end_date IS NULL OR w.accommodation_end_date = '')"
+            "w.accommodation_end_date IS NULL"
         ]
         params = list(dorm_ids)
 
@@ -83,6 +87,7 @@ def batch_update_rent(dorm_ids: list, old_rent: int, new_rent: int, update_nulls
 
 # --- 費用管理 (帳單式) ---
 
+@cached_query('Meters', 'UtilityBills')
 def get_bill_records_for_dorm_as_df(dorm_id: int):
     """查詢指定宿舍的所有獨立帳單紀錄。"""
     conn = database.get_db_connection()
@@ -102,6 +107,7 @@ def get_bill_records_for_dorm_as_df(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('UtilityBills')
 def get_single_bill_details(record_id: int):
     """查詢單一筆費用帳單的詳細資料。"""
     conn = database.get_db_connection()
@@ -114,12 +120,14 @@ def get_single_bill_details(record_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('UtilityBills')
 def add_bill_record(details: dict):
     """新增一筆獨立的帳單紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed.", None
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('UtilityBills', details)
         query = "SELECT id FROM UtilityBills WHERE dorm_id = ? AND bill_type = ? AND bill_start_date = ? AND amount = ?"
         params = (details['dorm_id'], details['bill_type'], details['bill_start_date'], details['amount'])
         cursor.execute(query, params)
@@ -132,6 +140,7 @@ def add_bill_record(details: dict):
         cursor.execute(sql, tuple(details.values()))
         new_id = cursor.lastrowid
         conn.commit()
+        expense_anomalies.score_after_write(conn)
         return True, f"成功新增費用紀錄 (ID: {new_id})", new_id
     except Exception as e:
         if conn: conn.rollback()
@@ -139,18 +148,21 @@ def add_bill_record(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('UtilityBills')
 def update_bill_record(record_id: int, details: dict):
     """更新一筆已存在的費用帳單。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed."
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('UtilityBills', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(record_id)
         sql = f"UPDATE UtilityBills SET {fields} WHERE id = ?"
         cursor.execute(sql, tuple(values))
         conn.commit()
+        expense_anomalies.score_after_write(conn)
         return True, "帳單紀錄更新成功！"
     except Exception as e:
         if conn: conn.rollback()
@@ -158,6 +170,7 @@ def update_bill_record(record_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('UtilityBills')
 def delete_bill_record(record_id: int):
     """刪除一筆帳單紀錄。"""
     conn = database.get_db_connection()
@@ -174,6 +187,7 @@ def delete_bill_record(record_id: int):
         if conn: conn.close()
 
 # --- 年度費用攤提 ---
+@cached_query('AnnualExpenses')
 def get_annual_expenses_for_dorm_as_df(dorm_id: int):
     """查詢指定宿舍的所有年度費用紀錄。"""
     conn = database.get_db_connection()
@@ -192,12 +206,14 @@ def get_annual_expenses_for_dorm_as_df(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('AnnualExpenses')
 def add_annual_expense_record(details: dict):
     """新增一筆年度費用紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed.", None
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('AnnualExpenses', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO AnnualExpenses ({columns}) VALUES ({placeholders})"
@@ -211,6 +227,7 @@ def add_annual_expense_record(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('AnnualExpenses')
 def delete_annual_expense_record(record_id: int):
     """刪除一筆年度費用紀錄。"""
     conn = database.get_db_connection()
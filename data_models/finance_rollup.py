@@ -0,0 +1,118 @@
+import pandas as pd
+from typing import List
+
+# 只依賴最基礎的 database 模組
+import database
+from . import residency
+
+_schema_ready = False
+
+# 計算 temp._finance_targets 中每個 (宿舍, 月份) 的收支，規則與 dashboard_model 原本的單月查詢相同：
+# 收入 = 當月仍在住 (退宿日不早於下月1日) 的員工月費；月租 = 與當月重疊的合約；
+# 雜費 = 帳單金額依「帳單期間與當月重疊的天數」按日攤分；長期攤銷 = 年度費用平均分攤到各月 (四捨五入)。
+_ROLLUP_SELECT = f"""
+    SELECT * FROM (
+        SELECT
+            t.dorm_id,
+            t.year_month,
+            (SELECT SUM(w.monthly_fee)
+             FROM Workers w JOIN Rooms r ON w.room_id = r.id
+             WHERE r.dorm_id = t.dorm_id
+               AND {residency.living_during('w', period_start='t.next_first_day', period_end='t.next_first_day')}
+            ) AS income,
+            (SELECT SUM(l.monthly_rent)
+             FROM Leases l
+             WHERE l.dorm_id = t.dorm_id
+               AND l.lease_start_date < t.next_first_day
+               AND (l.lease_end_date IS NULL OR l.lease_end_date >= t.first_day)
+            ) AS rent,
+            (SELECT SUM(
+                    CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1)
+                    * (MIN(julianday(t.next_first_day) - 1, julianday(b.bill_end_date)) - MAX(julianday(t.first_day), julianday(b.bill_start_date)) + 1)
+                )
+             FROM UtilityBills b
+             WHERE b.dorm_id = t.dorm_id
+               AND b.bill_start_date < t.next_first_day AND b.bill_end_date >= t.first_day
+            ) AS utilities,
+            (SELECT SUM(
+                    ROUND(a.total_amount * 1.0 / (
+                        (strftime('%Y', a.amortization_end_month || '-01') - strftime('%Y', a.amortization_start_month || '-01')) * 12 +
+                        (strftime('%m', a.amortization_end_month || '-01') - strftime('%m', a.amortization_start_month || '-01')) + 1
+                    ), 0)
+                )
+             FROM AnnualExpenses a
+             WHERE a.dorm_id = t.dorm_id
+               AND a.amortization_start_month <= t.year_month AND a.amortization_end_month >= t.year_month
+            ) AS amortized
+        FROM temp._finance_targets t
+    )
+    WHERE income IS NOT NULL OR rent IS NOT NULL OR utilities IS NOT NULL OR amortized IS NOT NULL
+"""
+
+def month_range(start_month: str, end_month: str) -> List[str]:
+    """回傳 start_month 到 end_month (含) 之間的所有 'YYYY-MM' 月份。"""
+    return [str(period) for period in pd.period_range(start=start_month, end=end_month, freq='M')]
+
+def _ensure_schema(conn):
+    """舊資料庫可能還沒有彙總表與觸發器，第一次使用時補建。"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    database.create_finance_rollup(conn.cursor())
+    conn.commit()
+    _schema_ready = True
+
+def _rebuild(conn, year_months: List[str], dirty_only: bool = False):
+    """重新計算指定月份的彙總資料 (dirty_only=True 時只算已標記異動的宿舍)。需在呼叫端的交易中執行。"""
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS _finance_targets (
+            dorm_id INTEGER, year_month TEXT, first_day TEXT, next_first_day TEXT
+        )
+    """)
+    conn.execute("DELETE FROM temp._finance_targets")
+    dorm_filter = "WHERE d.id IN (SELECT dorm_id FROM DormMonthlyFinanceDirty)" if dirty_only else ""
+    conn.executemany(f"""
+        INSERT INTO temp._finance_targets (dorm_id, year_month, first_day, next_first_day)
+        SELECT d.id, :ym, date(:ym || '-01'), date(:ym || '-01', '+1 month')
+        FROM Dormitories d {dorm_filter}
+    """, [{'ym': year_month} for year_month in year_months])
+
+    conn.execute("""
+        DELETE FROM DormMonthlyFinance
+        WHERE EXISTS (
+            SELECT 1 FROM temp._finance_targets t
+            WHERE t.dorm_id = DormMonthlyFinance.dorm_id AND t.year_month = DormMonthlyFinance.year_month
+        )
+    """)
+    conn.execute(f"INSERT INTO DormMonthlyFinance (dorm_id, year_month, income, rent, utilities, amortized) {_ROLLUP_SELECT}")
+
+def refresh_dorm_monthly_finance(conn, year_months: List[str]):
+    """
+    確保指定月份的彙總資料為最新：
+    1. 重新計算被觸發器標記為「已異動」的宿舍 (涵蓋所有已彙總過的月份)。
+    2. 首次查詢的月份，為所有宿舍計算並記錄為已彙總。
+    沒有需要處理的項目時不會開啟寫入交易。
+    """
+    _ensure_schema(conn)
+    has_dirty = conn.execute("SELECT EXISTS (SELECT 1 FROM DormMonthlyFinanceDirty)").fetchone()[0]
+    tracked = {row[0] for row in conn.execute("SELECT year_month FROM DormMonthlyFinanceMonths")}
+    missing = sorted(set(year_months) - tracked)
+    if not has_dirty and not missing:
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 取得寫入鎖後重新讀取，避免與其他連線重複計算
+        tracked = [row[0] for row in conn.execute("SELECT year_month FROM DormMonthlyFinanceMonths")]
+        if tracked:
+            _rebuild(conn, tracked, dirty_only=True)
+        conn.execute("DELETE FROM DormMonthlyFinanceDirty")
+
+        missing = sorted(set(year_months) - set(tracked))
+        if missing:
+            _rebuild(conn, missing)
+            conn.executemany("INSERT OR IGNORE INTO DormMonthlyFinanceMonths (year_month) VALUES (?)", [(m,) for m in missing])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
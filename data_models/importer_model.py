@@ -3,8 +3,11 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from . import expense_anomalies
+from .query_cache import invalidates
 from data_processor import normalize_taiwan_address
 
+@invalidates('UtilityBills')
 def batch_import_expenses(df: pd.DataFrame):
     """
     批次匯入【每月/變動費用】的核心邏輯。
@@ -99,14 +102,16 @@ def batch_import_expenses(df: pd.DataFrame):
     except Exception as e:
         print(f"批次匯入每月費用時發生錯誤: {e}")
         if conn: conn.rollback()
+    else:
+        conn.commit()
+        expense_anomalies.score_after_write(conn)
     finally:
-        if conn:
-            conn.commit()
-            conn.close()
+        if conn: conn.close()
 
     return success_count, pd.DataFrame(failed_records)
 
 
+@invalidates('AnnualExpenses')
 def batch_import_annual_expenses(df: pd.DataFrame):
     """
     批次匯入【年度/長期】費用的核心邏輯。
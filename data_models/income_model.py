@@ -1,6 +1,8 @@
 import pandas as pd
 import database
+from .query_cache import cached_query, invalidates
 
+@cached_query('OtherIncome')
 def get_income_for_dorm_as_df(dorm_id: int):
     """查詢指定宿舍的所有其他收入紀錄。"""
     conn = database.get_db_connection()
@@ -21,12 +23,14 @@ def get_income_for_dorm_as_df(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('OtherIncome')
 def add_income_record(details: dict):
     """新增一筆其他收入紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed.", None
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('OtherIncome', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO OtherIncome ({columns}) VALUES ({placeholders})"
@@ -40,6 +44,7 @@ def add_income_record(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('OtherIncome')
 def delete_income_record(record_id: int):
     """刪除一筆其他收入紀錄。"""
     conn = database.get_db_connection()
@@ -3,7 +3,9 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from .query_cache import cached_query, invalidates
 
+@cached_query('Dormitories', 'Leases')
 def get_leases_for_view(dorm_id_filter=None):
     """
     查詢租賃合約，並關聯宿舍地址以便顯示。
@@ -35,6 +37,7 @@ def get_leases_for_view(dorm_id_filter=None):
     finally:
         if conn: conn.close()
 
+@cached_query('Leases')
 def get_single_lease_details(lease_id: int):
     """取得單一合約的詳細資料。"""
     conn = database.get_db_connection()
@@ -47,12 +50,14 @@ def get_single_lease_details(lease_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('Leases')
 def add_lease(details: dict):
     """新增一筆租賃合約。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed.", None
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('Leases', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO Leases ({columns}) VALUES ({placeholders})"
@@ -66,12 +71,14 @@ def add_lease(details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Leases')
 def update_lease(lease_id: int, details: dict):
     """更新一筆租賃合約。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed."
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('Leases', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(lease_id)
@@ -85,6 +92,7 @@ def update_lease(lease_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('Leases')
 def delete_lease(lease_id: int):
     """刪除一筆租賃合約。"""
     conn = database.get_db_connection()
@@ -3,7 +3,9 @@ import sqlite3
 
 # 只依賴最基礎的 database 模組
 import database
+from .query_cache import cached_query, invalidates
 
+@cached_query('Meters')
 def get_meters_for_dorm_as_df(dorm_id: int):
     """
     查詢指定宿舍下的所有電水錶，用於UI列表顯示。
@@ -27,6 +29,7 @@ def get_meters_for_dorm_as_df(dorm_id: int):
         if conn: 
             conn.close()
 
+@invalidates('Meters')
 def add_meter_record(details: dict):
     """
     新增一筆電水錶紀錄。
@@ -59,6 +62,7 @@ def add_meter_record(details: dict):
         if conn: 
             conn.close()
 
+@invalidates('Meters', cascade=True)
 def delete_meter_record(record_id: int):
     """
     刪除一筆電水錶紀錄。
@@ -79,6 +83,7 @@ def delete_meter_record(record_id: int):
         if conn: 
             conn.close()
 
+@cached_query('Meters')
 def get_meters_for_selection(dorm_id: int):
     """
     取得指定宿舍下的 (id, 類型與錶號) 的列表，用於下拉選單。
@@ -0,0 +1,223 @@
+# 房間在住情形的記憶體索引：room_id -> 容量、在住人數、性別與國籍組成。
+# 第一次查詢時由資料庫整體建立，之後：
+#   - 經由 worker_model 寫入的員工 (@tracks_workers)，只重新讀取這幾位員工並增量更新索引；
+#   - 其他來源的寫入 (匯入、自動更新程式、房間 / 宿舍編修) 由 DataVersions 版本變動偵測，下次查詢時整體重建；
+#   - 換日時也整體重建 (「在住」依當天日期判斷，見 residency.living_on)。
+# 查詢只在記憶體中篩選房間，不需再從 Workers 表重新計算在住人數。
+import copy
+import functools
+import threading
+from collections import Counter
+from datetime import date
+
+import database
+from . import residency
+from .query_cache import get_data_versions
+
+# 各性別可入住的房間性別政策 (房內無人時不受政策限制)
+GENDER_POLICIES = {
+    '女': ('僅限女性', '可混住'),
+    '男': ('僅限男性', '可混住'),
+}
+
+_TABLES = ('Dormitories', 'Rooms', 'Workers')
+
+# 目前資料庫的索引：db、built_on (建立日期)、versions (建立時的資料版本)、
+# rooms (room_id -> 房間資料)、dorm_rooms (dorm_id -> [room_id])、workers (unique_id -> (room_id, 性別, 國籍))
+_index = {}
+_lock = threading.RLock()
+_stats = {'builds': 0, 'incremental_updates': 0}
+
+def _add_occupant(room: dict, gender, nationality):
+    room['occupants'] += 1
+    room['genders'][gender] += 1
+    room['nationalities'][nationality] += 1
+
+def _remove_occupant(room: dict, gender, nationality):
+    room['occupants'] -= 1
+    for counter, key in ((room['genders'], gender), (room['nationalities'], nationality)):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+def _build(versions) -> dict:
+    """由資料庫讀取所有房間與在住員工，建立新的索引。"""
+    conn = database.get_db_connection()
+    if not conn: return {}
+    try:
+        rooms, dorm_rooms = {}, {}
+        for row in conn.execute("""
+            SELECT r.id, r.dorm_id, r.room_number, r.capacity, r.gender_policy, r.nationality_policy, r.room_notes,
+                   d.original_address, d.primary_manager
+            FROM Rooms r JOIN Dormitories d ON r.dorm_id = d.id
+            ORDER BY r.dorm_id, r.id
+        """):
+            room = dict(row)
+            room['room_id'] = room.pop('id')
+            room.update(occupants=0, genders=Counter(), nationalities=Counter())
+            rooms[room['room_id']] = room
+            dorm_rooms.setdefault(room['dorm_id'], []).append(room['room_id'])
+
+        workers = {}
+        for unique_id, room_id, gender, nationality in conn.execute(f"""
+            SELECT w.unique_id, w.room_id, w.gender, w.nationality FROM Workers w
+            WHERE w.room_id IS NOT NULL AND {residency.living_on('w')}
+        """):
+            if room_id in rooms:
+                _add_occupant(rooms[room_id], gender, nationality)
+                workers[unique_id] = (room_id, gender, nationality)
+    finally:
+        conn.close()
+    _stats['builds'] += 1
+    return {
+        'db': database.DB_NAME, 'built_on': date.today().isoformat(), 'versions': versions,
+        'rooms': rooms, 'dorm_rooms': dorm_rooms, 'workers': workers,
+    }
+
+def _current_index() -> dict:
+    """回傳與資料庫一致的索引，必要時重建 (呼叫端需持有 _lock)。"""
+    global _index
+    versions = get_data_versions(_TABLES)
+    if (versions is None or _index.get('versions') != versions or _index.get('db') != database.DB_NAME
+            or _index.get('built_on') != date.today().isoformat()):
+        _index = _build(versions)
+    return _index
+
+def refresh_workers(unique_ids):
+    """
+    重新讀取指定員工的房間與住宿日期，增量更新索引。
+    只有在上次同步後恰好多了一次 Workers 寫入 (即呼叫端自己的寫入) 時才增量更新，
+    否則代表還有其他寫入，直接捨棄索引，下次查詢時重建。
+    """
+    global _index
+    with _lock:
+        if not _index or _index.get('db') != database.DB_NAME:
+            return
+        versions = get_data_versions(_TABLES)
+        if versions == _index['versions']:
+            return  # 索引是在這次寫入之後才建立的，已是最新
+        stored = dict(zip(_TABLES, _index['versions']))
+        stored['Workers'] += 1
+        if versions is None or versions != tuple(stored[t] for t in _TABLES):
+            _index = {}
+            return
+
+        unique_ids = list(dict.fromkeys(uid for uid in unique_ids if uid))
+        conn = database.get_db_connection()
+        if not conn:
+            _index = {}
+            return
+        try:
+            placeholders = ', '.join('?' for _ in unique_ids)
+            current = {
+                row[0]: row[1:] for row in conn.execute(f"""
+                    SELECT w.unique_id, w.room_id, w.gender, w.nationality FROM Workers w
+                    WHERE w.unique_id IN ({placeholders}) AND w.room_id IS NOT NULL AND {residency.living_on('w')}
+                """, unique_ids)
+            } if unique_ids else {}
+        finally:
+            conn.close()
+
+        rooms, workers = _index['rooms'], _index['workers']
+        for uid in unique_ids:
+            previous = workers.pop(uid, None)
+            if previous and previous[0] in rooms:
+                _remove_occupant(rooms[previous[0]], previous[1], previous[2])
+            entry = current.get(uid)
+            if entry and entry[0] in rooms:
+                _add_occupant(rooms[entry[0]], entry[1], entry[2])
+                workers[uid] = tuple(entry)
+        _index['versions'] = versions
+        _stats['incremental_updates'] += 1
+
+def tracks_workers(get_unique_ids):
+    """
+    裝飾 worker_model 的寫入函式 (需放在 @invalidates 之上，於版本遞增之後執行)：
+    寫入完成後以 get_unique_ids(*args, **kwargs) 取得受影響的員工，增量更新索引。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            try:
+                refresh_workers(get_unique_ids(*args, **kwargs))
+            except Exception as e:
+                print(f"WARNING: 更新在住索引失敗，下次查詢時重建: {e}")
+                invalidate()
+            return result
+        return wrapper
+    return decorator
+
+def invalidate():
+    """捨棄索引，下次查詢時重建。"""
+    global _index
+    with _lock:
+        _index = {}
+
+def _snapshot(room: dict) -> dict:
+    room = copy.copy(room)
+    room['genders'] = dict(room['genders'])
+    room['nationalities'] = dict(room['nationalities'])
+    capacity = room['capacity']
+    room['free_beds'] = capacity - room['occupants'] if capacity is not None else None
+    return room
+
+def find_rooms(gender: str = None, min_free_beds: int = 1, dorm_ids=None, managed_only: bool = True) -> list:
+    """
+    回傳至少有 min_free_beds 個空床位的房間 (dict 複本，含 free_beds、genders、nationalities)。
+    指定 gender 時只回傳該性別可入住的房間：性別政策允許，或房內目前無人。
+    dorm_ids 限定宿舍；managed_only 時只包含我司管理的宿舍。
+    """
+    allowed_policies = GENDER_POLICIES.get(gender, ()) if gender else None
+    with _lock:
+        index = _current_index()
+        if not index:
+            return []
+        rooms = index['rooms']
+        if dorm_ids:
+            room_ids = [rid for dorm_id in dorm_ids for rid in index['dorm_rooms'].get(dorm_id, [])]
+        else:
+            room_ids = rooms.keys()
+        results = []
+        for room_id in room_ids:
+            room = rooms[room_id]
+            if managed_only and room['primary_manager'] != '我司':
+                continue
+            if room['capacity'] is None or room['capacity'] - room['occupants'] < min_free_beds:
+                continue
+            if allowed_policies is not None and room['gender_policy'] not in allowed_policies and room['occupants'] > 0:
+                continue
+            results.append(_snapshot(room))
+        return results
+
+def get_room_occupancy(room_id: int) -> dict:
+    """單一房間的在住情形 (dict 複本)，房間不存在時回傳 None。"""
+    with _lock:
+        room = _current_index().get('rooms', {}).get(room_id)
+        return _snapshot(room) if room else None
+
+def get_dorm_occupancy(dorm_id: int) -> dict:
+    """單一宿舍的床位容量、在住人數、空床位數與性別 / 國籍組成。"""
+    with _lock:
+        index = _current_index()
+        rooms = [index['rooms'][rid] for rid in index.get('dorm_rooms', {}).get(dorm_id, [])]
+        genders, nationalities = Counter(), Counter()
+        for room in rooms:
+            genders.update(room['genders'])
+            nationalities.update(room['nationalities'])
+        capacity = sum(room['capacity'] or 0 for room in rooms)
+        occupants = sum(room['occupants'] for room in rooms)
+        return {
+            'dorm_id': dorm_id, 'rooms': len(rooms), 'capacity': capacity, 'occupants': occupants,
+            'free_beds': capacity - occupants, 'genders': dict(genders), 'nationalities': dict(nationalities),
+        }
+
+def get_index_stats() -> dict:
+    """回傳索引的建立 / 增量更新次數與目前收錄的房間數、在住人數。"""
+    with _lock:
+        return {
+            **_stats,
+            'rooms': len(_index.get('rooms', {})),
+            'occupants': len(_index.get('workers', {})),
+            'built_on': _index.get('built_on'),
+        }
@@ -1,75 +1,126 @@
 import pandas as pd
 import database
+from . import occupancy_index, residency
+from .occupancy_index import GENDER_POLICIES
+
+def _occupant_details(conn, room_ids) -> pd.Series:
+    """各房間的現住人員摘要 (雇主-國籍(性別), ...)，以 room_id 為索引，依寫入順序排列。"""
+    if not room_ids:
+        return pd.Series(dtype=object)
+    occupants_df = pd.read_sql_query(f"""
+        SELECT w.room_id, w.employer_name, w.nationality, w.gender
+        FROM Workers w
+        WHERE w.room_id IN ({', '.join('?' for _ in room_ids)})
+          AND {residency.living_on('w')}
+        ORDER BY w.rowid
+    """, conn, params=list(room_ids))
+    labels = (
+        occupants_df['employer_name'].fillna('') + '-' + occupants_df['nationality'].fillna('')
+        + '(' + occupants_df['gender'].fillna('') + ')'
+    )
+    return labels.groupby(occupants_df['room_id']).agg(', '.join)
 
 def find_available_rooms(filters: dict):
     """
-    根據篩選條件（例如性別、多個宿舍），查找所有符合條件且有空床位的房間。
+    根據篩選條件（例如性別、多個宿舍、最少空床位數），查找所有符合條件且有空床位的房間。
+    候選房間由在住索引 (occupancy_index) 篩選，只為這些房間查詢現住人員摘要。
+    不另加 cached_query：在住索引本身即為快取，並會在資料變動或跨日時重建。
     """
     gender_to_place = filters.get("gender")
     # 【本次修改】將接收單一ID改為接收ID列表
     dorm_ids_filter = filters.get("dorm_ids")
 
-    if not gender_to_place:
+    if gender_to_place not in GENDER_POLICIES:
+        return pd.DataFrame()
+
+    rooms = occupancy_index.find_rooms(gender_to_place, filters.get("min_free_beds") or 1, dorm_ids_filter)
+    if not rooms:
         return pd.DataFrame()
 
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
-        base_query = """
-            SELECT
-                r.id as room_id, d.original_address, r.room_number,
-                r.capacity, r.gender_policy, r.nationality_policy, r.room_notes
-            FROM Rooms r
-            JOIN Dormitories d ON r.dorm_id = d.id
-            WHERE d.primary_manager = '我司'
-        """
-        params = []
-        
-        # 如果使用者提供了宿舍列表，則使用 IN 子句進行篩選
-        if dorm_ids_filter:
-            placeholders = ', '.join('?' for _ in dorm_ids_filter)
-            base_query += f" AND d.id IN ({placeholders})"
-            params.extend(dorm_ids_filter)
+        details = _occupant_details(conn, [room['room_id'] for room in rooms])
+    finally:
+        if conn: conn.close()
 
-        rooms_df = pd.read_sql_query(base_query, conn, params=params)
-        if rooms_df.empty:
-            return pd.DataFrame()
+    rooms_df = pd.DataFrame(rooms)
+    return pd.DataFrame({
+        "宿舍地址": rooms_df['original_address'], "房號": rooms_df['room_number'],
+        "空床位數": rooms_df['free_beds'], "房間性別政策": rooms_df['gender_policy'],
+        "房內現住人員": rooms_df['room_id'].map(details).fillna("無 (空房)"), "房間備註": rooms_df['room_notes'],
+    })
 
-        workers_query = "SELECT room_id, employer_name, nationality, gender FROM Workers WHERE (accommodation_end_date IS NULL OR accommodation_end_date = '')"
-        workers_df = pd.read_sql_query(workers_query, conn)
-        
-        occupancy = workers_df.groupby('room_id').size().rename('current_occupants')
-        rooms_df = rooms_df.merge(occupancy, left_on='room_id', right_index=True, how='left')
-        rooms_df['current_occupants'] = rooms_df['current_occupants'].fillna(0).astype(int)
-        
-        rooms_df['vacancies'] = rooms_df['capacity'] - rooms_df['current_occupants']
-        available_rooms_df = rooms_df[rooms_df['vacancies'] > 0].copy()
-        
-        room_gender_info = workers_df.groupby('room_id')['gender'].unique().apply(list).rename('current_genders')
-        available_rooms_df = available_rooms_df.merge(room_gender_info, on='room_id', how='left')
+def _room_accepts(room: dict, gender: str, nationality: str) -> bool:
+    """房間目前 (含本批已安排的人) 是否可再安排一位該性別、國籍的員工。"""
+    if room['vacancies'] <= 0:
+        return False
+    if room['gender_policy'] not in GENDER_POLICIES[gender] and room['current_occupants'] > 0:
+        return False
+    if room['nationality_policy'] == '單一國籍' and room['current_nationalities'] - {nationality}:
+        return False
+    return True
 
-        suitable_rooms = []
-        for _, room in available_rooms_df.iterrows():
-            is_suitable = False
-            current_genders = room.get('current_genders') if isinstance(room.get('current_genders'), list) else []
+def _placement_rank(room: dict, gender: str, nationality: str, remaining: int) -> tuple:
+    """
+    挑選房間的優先順序 (越小越優先)：不與異性同住、不與他國籍同住、符合房間性別政策 (空房也盡量依政策安排)，
+    能一次容納剩餘人數時選空床位最少的房間 (best-fit，保留大房給後續的大組)，
+    容納不下時選空床位最多的房間，讓同組的人盡量集中。
+    """
+    other_gender = sum(count for g, count in room['gender_counts'].items() if g != gender)
+    other_nationality = bool(room['current_nationalities'] - {nationality})
+    fits = room['vacancies'] >= remaining
+    return (
+        other_gender > 0, other_nationality, room['gender_policy'] not in GENDER_POLICIES[gender], not fits,
+        room['vacancies'] if fits else -room['vacancies'],
+        room['original_address'] or '', room['room_number'] or '',
+    )
 
-            if gender_to_place == '女':
-                if room['gender_policy'] in ['僅限女性', '可混住']: is_suitable = True
-                elif not current_genders: is_suitable = True
-            
-            elif gender_to_place == '男':
-                if room['gender_policy'] in ['僅限男性', '可混住']: is_suitable = True
-                elif not current_genders: is_suitable = True
+def plan_batch_placement(batch: list, dorm_ids: list = None):
+    """
+    一次為整批新進員工安排房間。batch 為分組清單，每組為
+    {'gender': '男' / '女', 'nationality': 國籍, 'count': 人數}。
+    以貪婪法 (人數多的組先排) 逐組分配，回傳 (安排結果 DataFrame, 未能安排的人數 DataFrame)。
+    房間的性別政策判斷與 find_available_rooms 相同；「單一國籍」的房間只安排與房內相同國籍的人。
+    """
+    assignment_columns = ["宿舍地址", "房號", "性別", "國籍", "安排人數", "安排後空床位", "房間性別政策"]
+    unplaced_columns = ["性別", "國籍", "未安排人數"]
+    groups = [
+        {'gender': g.get('gender'), 'nationality': g.get('nationality') or '', 'count': int(g.get('count') or 0)}
+        for g in batch
+    ]
+    groups = [g for g in groups if g['count'] > 0]
+    if not groups:
+        return pd.DataFrame(columns=assignment_columns), pd.DataFrame(columns=unplaced_columns)
 
-            if is_suitable:
-                current_occupants_list = workers_df[workers_df['room_id'] == room['room_id']]
-                occupant_details = ", ".join([f"{w['employer_name']}-{w['nationality']}({w['gender']})" for _, w in current_occupants_list.iterrows()]) or "無 (空房)"
-                suitable_rooms.append({
-                    "宿舍地址": room['original_address'], "房號": room['room_number'],
-                    "空床位數": room['vacancies'], "房間性別政策": room['gender_policy'],
-                    "房內現住人員": occupant_details, "房間備註": room['room_notes']
-                })
-        
-        return pd.DataFrame(suitable_rooms)
-    finally:
-        if conn: conn.close()
\ No newline at end of file
+    # 房間目前的空床位與性別 / 國籍組成取自在住索引，分配過程中直接更新這份複本
+    rooms = occupancy_index.find_rooms(dorm_ids=dorm_ids)
+    for room in rooms:
+        room['vacancies'] = room.pop('free_beds')
+        room['current_occupants'] = room.pop('occupants')
+        room['gender_counts'] = {g: n for g, n in room.pop('genders').items() if g in GENDER_POLICIES}
+        room['current_nationalities'] = frozenset(n for n in room.pop('nationalities') if n is not None)
+
+    assignments, unplaced = [], []
+    for group in sorted(groups, key=lambda g: (-g['count'], str(g['gender']), g['nationality'])):
+        gender, nationality, remaining = group['gender'], group['nationality'], group['count']
+        while remaining > 0 and gender in GENDER_POLICIES:
+            candidates = [room for room in rooms if _room_accepts(room, gender, nationality)]
+            if not candidates:
+                break
+            room = min(candidates, key=lambda r: _placement_rank(r, gender, nationality, remaining))
+            placed = min(room['vacancies'], remaining)
+            room['vacancies'] -= placed
+            room['current_occupants'] += placed
+            room['gender_counts'][gender] = room['gender_counts'].get(gender, 0) + placed
+            room['current_nationalities'] = room['current_nationalities'] | {nationality}
+            remaining -= placed
+            assignments.append({
+                "宿舍地址": room['original_address'], "房號": room['room_number'],
+                "性別": gender, "國籍": nationality, "安排人數": placed,
+                "安排後空床位": room['vacancies'], "房間性別政策": room['gender_policy'],
+            })
+        if remaining > 0:
+            unplaced.append({"性別": gender, "國籍": nationality, "未安排人數": remaining})
+
+    return pd.DataFrame(assignments, columns=assignment_columns), pd.DataFrame(unplaced, columns=unplaced_columns)
@@ -0,0 +1,194 @@
+import copy
+import functools
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import database
+
+# 刪除父表格資料時，會因 ON DELETE CASCADE / SET NULL 一併變動的子表格
+TABLE_DEPENDENTS = {
+    'Dormitories': ['Rooms', 'DormitoryEquipment', 'Meters', 'Leases', 'UtilityBills', 'AnnualExpenses', 'OtherIncome'],
+    'Rooms': ['Workers'],
+    'Workers': ['WorkerStatusHistory'],
+    'Meters': ['UtilityBills'],
+}
+
+# 行程內最多保留的快取結果數，超過時淘汰最久未使用的項目
+MAX_CACHE_ENTRIES = 512
+
+# 全行程共用的查詢結果快取 (所有 Streamlit session 共用)：
+#   (函式, 參數) -> (依賴的表格, (查詢當天日期, 查詢當下各表格的資料版本), 結果)
+# 資料版本存放在資料庫的 DataVersions 表，每次寫入就遞增；
+# 因此其他 session、其他行程 (例如排程執行的更新程式) 的寫入也會讓快取自動失效。
+_entries = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_lock = threading.RLock()
+# 已確認具有 DataVersions 表的資料庫路徑 (測試或設定可能切換 database.DB_NAME)
+_versions_ready_dbs = set()
+
+def _freeze(value):
+    """將參數轉為可雜湊的形式 (dict / list / set 參數也能作為快取鍵)。"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+def _expand_tables(tables, cascade: bool) -> list:
+    expanded, pending = [], list(tables)
+    while pending:
+        table = pending.pop(0)
+        if table in expanded:
+            continue
+        expanded.append(table)
+        if cascade:
+            pending.extend(TABLE_DEPENDENTS.get(table, []))
+    return expanded
+
+def _ensure_versions_table(conn, own_conn: bool):
+    """
+    尚未執行升級 (database.run_migrations) 的資料庫可能還沒有 DataVersions 表，第一次使用時補建。
+    只在自行開啟的連線 (own_conn) 上提交；呼叫端傳入的連線則在其交易中建立，由呼叫端提交，
+    不會提前提交呼叫端寫到一半的資料。
+    """
+    if database.DB_NAME in _versions_ready_dbs:
+        return
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'DataVersions'").fetchone():
+        _versions_ready_dbs.add(database.DB_NAME)
+        return
+    database.create_data_versions_table(conn.cursor())
+    if own_conn:
+        conn.commit()
+        _versions_ready_dbs.add(database.DB_NAME)
+
+def get_data_versions(tables) -> tuple:
+    """讀取指定表格目前的資料版本；無法讀取時回傳 None (呼叫端應略過快取)。"""
+    conn = database.get_db_connection()
+    if not conn: return None
+    try:
+        _ensure_versions_table(conn, own_conn=True)
+        placeholders = ', '.join(['?'] * len(tables))
+        rows = conn.execute(
+            f"SELECT table_name, version FROM DataVersions WHERE table_name IN ({placeholders})", tuple(tables)
+        ).fetchall()
+        versions = {row['table_name']: row['version'] for row in rows}
+        return tuple(versions.get(table, 0) for table in tables)
+    except Exception as e:
+        print(f"WARNING: 讀取資料版本失敗，本次查詢不使用快取: {e}")
+        return None
+    finally:
+        conn.close()
+
+def cached_query(*tables: str):
+    """
+    裝飾 data_models 的讀取函式：以 (函式, 參數, 依賴表格的資料版本) 為鍵快取結果。
+    任一依賴表格的版本變動後，舊結果就不會再被使用。
+    許多查詢以「今天」判斷在住 / 離住 (見 residency.living_on)，結果會隨日期改變，
+    因此快取結果也只在取得當天有效，跨日後第一次呼叫會重新查詢。
+    回傳的是快取結果的複本，呼叫端修改 DataFrame 不會影響快取。
+    """
+    def decorator(func):
+        func_name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            versions = get_data_versions(tables)
+            if versions is None:
+                return func(*args, **kwargs)
+            versions = (date.today().isoformat(), versions)
+
+            key = (func_name, _freeze(args), _freeze(kwargs))
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None and entry[1] == versions:
+                    _entries.move_to_end(key)
+                    _stats['hits'] += 1
+                    return copy.deepcopy(entry[2])
+                if entry is not None:
+                    _stats['invalidations'] += 1
+                _stats['misses'] += 1
+
+            # 版本在查詢「之前」讀取：若查詢期間有寫入，存入的版本已過時，下次會重新查詢
+            result = func(*args, **kwargs)
+            with _lock:
+                _entries[key] = (tables, versions, result)
+                _entries.move_to_end(key)
+                while len(_entries) > MAX_CACHE_ENTRIES:
+                    _entries.popitem(last=False)
+            return copy.deepcopy(result)
+
+        def clear():
+            """只清除此函式的快取結果 (用法同 st.cache_data 的 .clear())。"""
+            with _lock:
+                keys = [key for key in _entries if key[0] == func_name]
+                for key in keys:
+                    del _entries[key]
+                _stats['invalidations'] += len(keys)
+
+        wrapper.tables = tables
+        wrapper.clear = clear
+        return wrapper
+    return decorator
+
+def invalidate_tables(*tables: str, cascade: bool = False, conn=None):
+    """
+    遞增指定表格的資料版本，讓依賴這些表格的快取結果失效。cascade=True 時一併遞增子表格。
+    傳入 conn 時在呼叫端的交易中更新 (與資料寫入一起提交)，否則自行開連線並立即提交。
+    """
+    tables = _expand_tables(tables, cascade)
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+        if not conn: return
+    try:
+        _ensure_versions_table(conn, own_conn)
+        conn.executemany("""
+            INSERT INTO DataVersions (table_name, version) VALUES (?, 1)
+            ON CONFLICT(table_name) DO UPDATE SET version = version + 1
+        """, [(table,) for table in tables])
+        if own_conn:
+            conn.commit()
+    except Exception as e:
+        print(f"WARNING: 更新資料版本失敗，改為清除本行程的全部快取: {e}")
+        clear_cache()
+    finally:
+        if own_conn:
+            conn.close()
+
+def invalidates(*tables: str, cascade: bool = False):
+    """裝飾 data_models 的寫入函式：執行後遞增這些表格的資料版本。"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                invalidate_tables(*tables, cascade=cascade)
+        return wrapper
+    return decorator
+
+def clear_cache():
+    """清除本行程的全部快取結果 (例如使用者手動按下「重新整理」)。"""
+    with _lock:
+        _stats['invalidations'] += len(_entries)
+        _entries.clear()
+
+def get_cache_stats() -> dict:
+    """回傳快取命中/未命中次數、失效項目數與目前各表格的快取項目數。"""
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        entries_by_table = {}
+        for tables, _, _ in _entries.values():
+            for table in tables:
+                entries_by_table[table] = entries_by_table.get(table, 0) + 1
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'hit_rate': _stats['hits'] / lookups if lookups else 0.0,
+            'invalidations': _stats['invalidations'],
+            'entries': len(_entries),
+            'entries_by_table': dict(sorted(entries_by_table.items())),
+        }
@@ -1,7 +1,9 @@
 import pandas as pd
 import database
+from .query_cache import cached_query
 from datetime import datetime, timedelta
 
+@cached_query('Dormitories', 'DormitoryEquipment', 'Leases', 'Rooms', 'Workers')
 def get_upcoming_reminders(days_ahead: int = 90):
     """
     查詢所有在未來指定天數內即將到期的項目。
@@ -23,7 +25,7 @@ def get_upcoming_reminders(days_ahead: int = 90):
             SELECT d.original_address AS "宿舍地址", l.lease_end_date AS "到期日", l.monthly_rent AS "月租金"
             FROM Leases l
             JOIN Dormitories d ON l.dorm_id = d.id
-            WHERE date(l.lease_end_date) BETWEEN date(?) AND date(?)
+            WHERE l.lease_end_date BETWEEN date(?) AND date(?)
             ORDER BY l.lease_end_date ASC
         """
         leases_df = pd.read_sql_query(lease_query, conn, params=(today_date, end_date))
@@ -36,7 +38,7 @@ def get_upcoming_reminders(days_ahead: int = 90):
             FROM Workers w
             JOIN Rooms r ON w.room_id = r.id
             JOIN Dormitories d ON r.dorm_id = d.id
-            WHERE date(w.work_permit_expiry_date) BETWEEN date(?) AND date(?)
+            WHERE w.work_permit_expiry_date BETWEEN date(?) AND date(?)
             ORDER BY w.work_permit_expiry_date ASC
         """
         workers_df = pd.read_sql_query(worker_query, conn, params=(today_date, end_date))
@@ -48,7 +50,7 @@ def get_upcoming_reminders(days_ahead: int = 90):
                 e.location AS "位置", e.next_check_date AS "下次檢查/更換日"
             FROM DormitoryEquipment e
             JOIN Dormitories d ON e.dorm_id = d.id
-            WHERE date(e.next_check_date) BETWEEN date(?) AND date(?)
+            WHERE e.next_check_date BETWEEN date(?) AND date(?)
             ORDER BY e.next_check_date ASC
         """
         equipment_df = pd.read_sql_query(equipment_query, conn, params=(today_date, end_date))
@@ -61,7 +63,7 @@ def get_upcoming_reminders(days_ahead: int = 90):
                 insurance_fee AS "年度保險費",
                 insurance_end_date AS "保險到期日"
             FROM Dormitories
-            WHERE date(insurance_end_date) BETWEEN date(?) AND date(?)
+            WHERE insurance_end_date BETWEEN date(?) AND date(?)
             ORDER BY insurance_end_date ASC
         """
         insurance_df = pd.read_sql_query(insurance_query, conn, params=(today_date, end_date))
@@ -4,7 +4,10 @@ from datetime import datetime
 
 # 只依賴最基礎的 database 模組
 import database
+from . import residency
+from .query_cache import cached_query
 
+@cached_query('Rooms', 'Workers', 'WorkerStatusHistory')
 def get_dorm_report_data(dorm_id: int):
     """
     為指定的單一宿舍，查詢產生深度分析報告所需的所有在住人員詳細資料。
@@ -18,7 +21,7 @@ def get_dorm_report_data(dorm_id: int):
         return pd.DataFrame()
         
     try:
-        query = """
+        query = f"""
             SELECT
                 r.room_number,
                 w.worker_name,
@@ -33,7 +36,7 @@ def get_dorm_report_data(dorm_id: int):
             FROM Workers w
             JOIN Rooms r ON w.room_id = r.id
             WHERE r.dorm_id = ?
-            AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR w.accommodation_end_date > date('now', 'localtime'))
+            AND {residency.living_on('w')}
             ORDER BY r.room_number, w.worker_name
         """
         
@@ -46,6 +49,7 @@ def get_dorm_report_data(dorm_id: int):
         if conn: 
             conn.close()
 
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory')
 def get_monthly_exception_report(year_month: str):
     """
     查詢指定月份中，所有「當月離住」或「有特殊狀況」的人員。
@@ -56,7 +60,7 @@ def get_monthly_exception_report(year_month: str):
         return pd.DataFrame()
         
     try:
-        query = """
+        query = f"""
             -- 查詢一：找出所有在該月份離住的人員
             SELECT
                 d.original_address AS "宿舍地址",
@@ -86,8 +90,7 @@ def get_monthly_exception_report(year_month: str):
             JOIN WorkerStatusHistory h ON w.unique_id = h.worker_unique_id
             WHERE
                 -- 條件一：在該月份有居住事實
-                (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < date(?, '+1 month'))
-                AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= date(?))
+                {residency.living_during('w', period_start="date(?)", period_end="date(?, '+1 month')")}
                 -- 條件二：其「當前」狀態(end_date IS NULL)不為空或'在住'
                 AND h.end_date IS NULL
                 AND h.status IS NOT NULL
@@ -0,0 +1,40 @@
+# 「誰住在這裡」的共用 SQL 條件。
+# 日期欄位已統一為 'YYYY-MM-DD' / NULL (見 database.DATE_COLUMNS)，條件只做欄位比較，
+# 配合 idx_workers_residency (room_id, accommodation_start_date, accommodation_end_date, gender, monthly_fee)
+# 依房間查詢在住人數、性別、月費時可直接由索引取得，不需讀取 Workers 表本身。
+
+TODAY = "date('now', 'localtime')"
+
+def living_on(alias: str = 'w', on: str = TODAY) -> str:
+    """on 當天仍在住：尚未離住，或離住日在 on 之後。"""
+    return f"({alias}.accommodation_end_date IS NULL OR {alias}.accommodation_end_date > {on})"
+
+def moved_out_by(alias: str = 'w', on: str = TODAY) -> str:
+    """on 當天 (含) 以前已離住，即 living_on 的相反條件。"""
+    return f"{alias}.accommodation_end_date <= {on}"
+
+def living_during(alias: str = 'w', period_start: str = '?', period_end: str = '?') -> str:
+    """
+    期間 [period_start, period_end) 內曾在住：入住日早於期間結束，且離住日不早於期間開始。
+    使用預設的 '?' 時，參數順序為 (period_end, period_start)。
+    """
+    return (
+        f"({alias}.accommodation_start_date IS NULL OR {alias}.accommodation_start_date < {period_end})"
+        f" AND ({alias}.accommodation_end_date IS NULL OR {alias}.accommodation_end_date >= {period_start})"
+    )
+
+# 每位員工「目前」的狀態：尚未結束 (end_date IS NULL) 的紀錄中起始日最新的一筆。
+# 以視窗函式一次算出所有員工，再 LEFT JOIN 回 Workers，取代逐列執行的相關子查詢
+# (搭配 idx_status_worker_current)。
+CURRENT_STATUS_SQL = """
+    SELECT worker_unique_id, status FROM (
+        SELECT worker_unique_id, status,
+               ROW_NUMBER() OVER (PARTITION BY worker_unique_id ORDER BY start_date DESC) AS rn
+        FROM WorkerStatusHistory
+        WHERE end_date IS NULL
+    ) WHERE rn = 1
+"""
+
+def current_status_join(alias: str = 'cs', worker_alias: str = 'w') -> str:
+    """LEFT JOIN 每位員工的目前狀態，之後以 {alias}.status 取用。"""
+    return f"LEFT JOIN ({CURRENT_STATUS_SQL}) {alias} ON {alias}.worker_unique_id = {worker_alias}.unique_id"
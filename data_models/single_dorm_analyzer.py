@@ -1,10 +1,15 @@
 import pandas as pd
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 from dateutil.relativedelta import relativedelta
 
 # 只依賴最基礎的 database 模組
 import database
+from . import finance_rollup, residency
+from .query_cache import cached_query
 
+@cached_query('Dormitories', 'Leases')
 def get_dorm_basic_info(dorm_id: int):
     """獲取單一宿舍的基本管理資訊。"""
     conn = database.get_db_connection()
@@ -17,8 +22,8 @@ def get_dorm_basic_info(dorm_id: int):
                 l.lease_start_date, l.lease_end_date, l.monthly_rent
             FROM Dormitories d
             LEFT JOIN Leases l ON d.id = l.dorm_id
-                AND date(l.lease_start_date) <= date('now', 'localtime')
-                AND (l.lease_end_date IS NULL OR date(l.lease_end_date) >= date('now', 'localtime'))
+                AND l.lease_start_date <= date('now', 'localtime')
+                AND (l.lease_end_date IS NULL OR l.lease_end_date >= date('now', 'localtime'))
             WHERE d.id = ?
         """
         cursor.execute(query, (dorm_id,))
@@ -27,6 +32,7 @@ def get_dorm_basic_info(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Meters')
 def get_dorm_meters(dorm_id: int):
     """獲取單一宿舍的所有電水錶資訊。"""
     conn = database.get_db_connection()
@@ -37,6 +43,7 @@ def get_dorm_meters(dorm_id: int):
     finally:
         if conn: conn.close()
 
+@cached_query('Rooms', 'Workers')
 def get_resident_summary(dorm_id: int, year_month: str):
     """
     計算指定月份，宿舍的在住人員統計數據。
@@ -45,14 +52,13 @@ def get_resident_summary(dorm_id: int, year_month: str):
     first_day_of_month = f"{year_month}-01"
     first_day_of_next_month = (datetime.strptime(first_day_of_month, "%Y-%m-%d") + relativedelta(months=1)).strftime('%Y-%m-%d')
     
-    query = """
+    query = f"""
         SELECT 
             w.gender, w.nationality, w.monthly_fee
         FROM Workers w
         JOIN Rooms r ON w.room_id = r.id
         WHERE r.dorm_id = ?
-          AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < ?)
-          AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= ?)
+          AND {residency.living_during('w')}
     """
     
     conn = database.get_db_connection()
@@ -67,6 +73,10 @@ def get_resident_summary(dorm_id: int, year_month: str):
     finally:
         if conn: conn.close()
 
+    return _summarize_residents(df)
+
+def _summarize_residents(df: pd.DataFrame) -> dict:
+    """由當月在住人員 (gender, nationality, monthly_fee) 計算人數、性別 / 國籍分佈與房租簡表。"""
     if df is None or df.empty:
         return {
             "total_residents": 0, "gender_counts": pd.DataFrame(columns=['性別', '人數']),
@@ -89,6 +99,7 @@ def get_resident_summary(dorm_id: int, year_month: str):
         "rent_summary": rent_summary.sort_values(by='房租金額')
     }
 
+@cached_query('AnnualExpenses', 'Leases', 'UtilityBills')
 def get_expense_summary(dorm_id: int, year_month: str):
     """計算指定月份，宿舍的總支出細項。"""
     conn = database.get_db_connection()
@@ -97,7 +108,7 @@ def get_expense_summary(dorm_id: int, year_month: str):
     try:
         first_day_of_month = f"{year_month}-01"
         
-        rent_df = pd.read_sql_query("SELECT monthly_rent FROM Leases WHERE dorm_id = ? AND date(lease_start_date) <= date(?) AND (lease_end_date IS NULL OR date(lease_end_date) >= date(?))", conn, params=(dorm_id, first_day_of_month, first_day_of_month))
+        rent_df = pd.read_sql_query("SELECT monthly_rent FROM Leases WHERE dorm_id = ? AND lease_start_date <= date(?) AND (lease_end_date IS NULL OR lease_end_date >= date(?))", conn, params=(dorm_id, first_day_of_month, first_day_of_month))
         total_rent = rent_df['monthly_rent'].sum() if not rent_df.empty else 0
 
         bills_query = """
@@ -107,8 +118,8 @@ def get_expense_summary(dorm_id: int, year_month: str):
             ) as prorated_amount, bill_type
             FROM UtilityBills b
             WHERE b.dorm_id = :dorm_id
-              AND date(b.bill_start_date) < date(:y_m, '+1 month') 
-              AND date(b.bill_end_date) >= date(:y_m)
+              AND b.bill_start_date < date(:y_m, '+1 month') 
+              AND b.bill_end_date >= date(:y_m)
             GROUP BY bill_type
         """
         bills_df = pd.read_sql_query(bills_query, conn, params={"y_m": first_day_of_month, "dorm_id": dorm_id})
@@ -126,21 +137,26 @@ def get_expense_summary(dorm_id: int, year_month: str):
         """
         amortized_df = pd.read_sql_query(amortized_query, conn, params=(dorm_id, year_month, year_month))
 
-        expense_items = {"月租金": total_rent}
-        if not bills_df.empty:
-            for _, row in bills_df.iterrows():
-                expense_items[row['bill_type']] = row['prorated_amount']
-        if not amortized_df.empty:
-            for _, row in amortized_df.iterrows():
-                expense_items[row['expense_item']] = row['total_amortized']
-                
-        summary_df = pd.DataFrame(list(expense_items.items()), columns=['費用項目', '金額'])
-        summary_df['金額'] = summary_df['金額'].fillna(0).astype(int)
-        
-        return summary_df[summary_df['金額'] > 0]
+        return _summarize_expenses(
+            total_rent,
+            dict(zip(bills_df['bill_type'], bills_df['prorated_amount'])),
+            dict(zip(amortized_df['expense_item'], amortized_df['total_amortized'])),
+        )
     finally:
         if conn: conn.close()
 
+def _summarize_expenses(total_rent, bills_by_type: dict, amortized_by_item: dict) -> pd.DataFrame:
+    """組合月租金、各類帳單分攤金額與年度費用攤提，回傳金額大於 0 的費用項目。"""
+    expense_items = {"月租金": total_rent}
+    expense_items.update(bills_by_type)
+    expense_items.update(amortized_by_item)
+            
+    summary_df = pd.DataFrame(list(expense_items.items()), columns=['費用項目', '金額'])
+    summary_df['金額'] = summary_df['金額'].fillna(0).astype(int)
+    
+    return summary_df[summary_df['金額'] > 0]
+
+@cached_query('Rooms', 'Workers', 'WorkerStatusHistory')
 def get_resident_details_as_df(dorm_id: int, year_month: str):
     """
     為指定的單一宿舍和月份，查詢所有在住人員的詳細資料。
@@ -156,7 +172,7 @@ def get_resident_details_as_df(dorm_id: int, year_month: str):
         first_day_of_month = f"{year_month}-01"
         first_day_of_next_month = (datetime.strptime(first_day_of_month, "%Y-%m-%d") + relativedelta(months=1)).strftime('%Y-%m-%d')
         
-        query = """
+        query = f"""
             SELECT 
                 r.room_number AS "房號",
                 w.worker_name AS "姓名",
@@ -174,8 +190,7 @@ def get_resident_details_as_df(dorm_id: int, year_month: str):
             FROM Workers w
             JOIN Rooms r ON w.room_id = r.id
             WHERE r.dorm_id = ?
-              AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < date(?))
-              AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= date(?))
+              AND {residency.living_during('w', period_start='date(?)', period_end='date(?)')}
             ORDER BY r.room_number, w.worker_name
         """
         df = pd.read_sql_query(query, conn, params=(dorm_id, first_day_of_next_month, first_day_of_month))
@@ -184,6 +199,16 @@ def get_resident_details_as_df(dorm_id: int, year_month: str):
         if conn:
             conn.close()
 
+# 員工 w 在 [:month_start, :next_month_start) 當月的狀態：期間與當月重疊的狀態紀錄中，起始日最新的一筆
+_MONTH_STATUS_SQL = """(
+    SELECT status FROM WorkerStatusHistory
+    WHERE worker_unique_id = w.unique_id
+      AND (start_date IS NULL OR start_date < :next_month_start)
+      AND (end_date IS NULL OR end_date >= :month_start)
+    ORDER BY start_date DESC LIMIT 1
+)"""
+
+@cached_query('Rooms', 'Workers', 'WorkerStatusHistory')
 def get_dorm_analysis_data(dorm_id: int, year_month: str):
     """
     為指定的單一宿舍和月份，執行全方位的營運數據分析。
@@ -199,60 +224,279 @@ def get_dorm_analysis_data(dorm_id: int, year_month: str):
         first_day_of_month = f"{year_month}-01"
         first_day_of_next_month = (datetime.strptime(first_day_of_month, "%Y-%m-%d") + relativedelta(months=1)).strftime('%Y-%m-%d')
         
-        # 【核心修正】JOIN WorkerStatusHistory 來獲取當前狀態
-        workers_query = """
+        # 【核心修正】由 WorkerStatusHistory 取得當月的狀態：期間與當月重疊的紀錄中起始日最新的一筆
+        workers_query = f"""
             SELECT 
                 w.*, 
                 r.room_number, 
                 r.capacity as room_capacity, 
                 r.room_notes,
-                h.status as current_status
+                {_MONTH_STATUS_SQL} as current_status
             FROM Workers w
             JOIN Rooms r ON w.room_id = r.id
-            LEFT JOIN (
-                SELECT worker_unique_id, status FROM WorkerStatusHistory
-                WHERE end_date IS NULL OR date(end_date) >= date(?)
-                ORDER BY start_date DESC
-            ) h ON w.unique_id = h.worker_unique_id
-            WHERE r.dorm_id = ?
-              AND (w.accommodation_start_date IS NULL OR date(w.accommodation_start_date) < ?)
-              AND (w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) >= ?)
-            GROUP BY w.unique_id
+            WHERE r.dorm_id = :dorm_id
+              AND {residency.living_during('w', period_start=':month_start', period_end=':next_month_start')}
         """
-        workers_df = pd.read_sql_query(workers_query, conn, params=(first_day_of_month, dorm_id, first_day_of_next_month, first_day_of_month))
+        workers_df = pd.read_sql_query(workers_query, conn, params={
+            "dorm_id": dorm_id, "month_start": first_day_of_month, "next_month_start": first_day_of_next_month})
+
+        return _analyze_occupancy(rooms_df, workers_df)
+    finally:
+        if conn: conn.close()
 
-        # --- 2. 執行計算 ---
-        total_capacity = int(rooms_df['capacity'].sum())
+def _analyze_occupancy(rooms_df: pd.DataFrame, workers_df: pd.DataFrame) -> dict:
+    """
+    由宿舍的房間 (Rooms 全部欄位) 與當月在住人員 (含 room_id、gender、current_status)
+    計算總容量、實際住宿 / 掛宿外住人數、特殊房間的獨立空床與一般可住空床數。
+    """
+    total_capacity = int(rooms_df['capacity'].sum())
 
-        # 【核心修正】使用新的 'current_status' 欄位來判斷
-        is_external = workers_df['current_status'].str.contains("掛宿外住", na=False)
-        external_workers_df = workers_df[is_external]
-        actual_residents_df = workers_df[~is_external]
+    # 【核心修正】使用新的 'current_status' 欄位來判斷
+    # 以布林陣列直接計數，不逐一切出子表 (單一宿舍的資料量小，pandas 的切片成本反而是大宗)
+    is_external = workers_df['current_status'].map(lambda status: isinstance(status, str) and "掛宿外住" in status).to_numpy(dtype=bool)
+    is_male = (workers_df['gender'] == '男').to_numpy()
+    is_female = (workers_df['gender'] == '女').to_numpy()
 
-        total_actual_residents = len(actual_residents_df)
-        male_actual_residents = len(actual_residents_df[actual_residents_df['gender'] == '男'])
-        female_actual_residents = len(actual_residents_df[actual_residents_df['gender'] == '女'])
+    total_actual_residents = int((~is_external).sum())
+    male_actual_residents = int((is_male & ~is_external).sum())
+    female_actual_residents = int((is_female & ~is_external).sum())
 
-        total_external = len(external_workers_df)
-        male_external = len(external_workers_df[external_workers_df['gender'] == '男'])
-        female_external = len(external_workers_df[external_workers_df['gender'] == '女'])
-        
-        special_rooms_df = rooms_df[rooms_df['room_notes'].notna() & (rooms_df['room_notes'] != '')].copy()
-        if not special_rooms_df.empty:
-            special_room_occupancy = actual_residents_df[actual_residents_df['room_id'].isin(special_rooms_df['id'])]\
-                                     .groupby('room_id').size().rename('目前住的人數')
-            special_rooms_df = special_rooms_df.merge(special_room_occupancy, left_on='id', right_index=True, how='left').fillna(0)
-            special_rooms_df['獨立空床數'] = special_rooms_df['capacity'] - special_rooms_df['目前住的人數']
-            
-        total_special_empty_beds = int(special_rooms_df['獨立空床數'].sum()) if not special_rooms_df.empty else 0
-        total_available_beds = total_capacity - total_actual_residents - total_special_empty_beds
+    total_external = int(is_external.sum())
+    male_external = int((is_male & is_external).sum())
+    female_external = int((is_female & is_external).sum())
+    
+    special_rooms_df = rooms_df[rooms_df['room_notes'].notna() & (rooms_df['room_notes'] != '')].copy()
+    if not special_rooms_df.empty:
+        actual_room_counts = workers_df['room_id'][~is_external].value_counts()
+        special_rooms_df['目前住的人數'] = special_rooms_df['id'].map(actual_room_counts)
+        special_rooms_df = special_rooms_df.fillna(0)
+        special_rooms_df['獨立空床數'] = special_rooms_df['capacity'] - special_rooms_df['目前住的人數']
         
-        return {
-            "total_capacity": total_capacity,
-            "actual_residents": {"total": total_actual_residents, "male": male_actual_residents, "female": female_actual_residents},
-            "external_residents": {"total": total_external, "male": male_external, "female": female_external},
-            "available_beds": {"total": total_available_beds},
-            "special_rooms": special_rooms_df
-        }
+    total_special_empty_beds = int(special_rooms_df['獨立空床數'].sum()) if not special_rooms_df.empty else 0
+    total_available_beds = total_capacity - total_actual_residents - total_special_empty_beds
+    
+    return {
+        "total_capacity": total_capacity,
+        "actual_residents": {"total": total_actual_residents, "male": male_actual_residents, "female": female_actual_residents},
+        "external_residents": {"total": total_external, "male": male_external, "female": female_external},
+        "available_beds": {"total": total_available_beds},
+        "special_rooms": special_rooms_df
+    }
+
+@dataclass
+class DormAnalysis:
+    """get_dorm_analysis_bundle 的結果：宿舍深度分析頁面所需的全部資料。"""
+    dorm_id: int
+    year_month: str
+    basic_info: Optional[dict]          # 管理人、支付方與「今天」有效的租約 (同 get_dorm_basic_info)
+    meters: pd.DataFrame                # 電水錶 (同 get_dorm_meters)
+    resident_summary: dict              # 當月在住人數、性別 / 國籍分佈、房租簡表 (同 get_resident_summary)
+    expenses: pd.DataFrame              # 當月預估支出細項 (同 get_expense_summary)
+    occupancy: dict                     # 容量、實際住宿 / 掛宿外住、空床 (同 get_dorm_analysis_data)
+    resident_details: pd.DataFrame      # 當月在住人員詳細名單 (同 get_resident_details_as_df)
+
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory', 'Meters', 'Leases', 'UtilityBills', 'AnnualExpenses')
+def get_dorm_analysis_bundle(dorm_id: int, year_month: str):
+    """
+    以單一連線取回宿舍在指定月份的房間、在住人員 (含狀態)、電水錶、租約、帳單與年度費用攤提，
+    再以 pandas 算出頁面所需的各項統計，回傳 DormAnalysis。
+    各項結果與對應的個別函式相同；當月在住人員只篩選一次，供人數統計、容量分析與名單共用。
+    """
+    first_day_of_month = f"{year_month}-01"
+    first_day_of_next_month = (datetime.strptime(first_day_of_month, "%Y-%m-%d") + relativedelta(months=1)).strftime('%Y-%m-%d')
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    conn = database.get_db_connection()
+    if not conn: return None
+    try:
+        dorm = conn.execute("SELECT primary_manager, rent_payer, utilities_payer FROM Dormitories WHERE id = ?", (dorm_id,)).fetchone()
+        meters_df = pd.read_sql_query("SELECT meter_type, meter_number, area_covered FROM Meters WHERE dorm_id = ?", conn, params=(dorm_id,))
+        rooms_df = pd.read_sql_query("SELECT * FROM Rooms WHERE dorm_id = ?", conn, params=(dorm_id,))
+        # 每位在住人員附上兩種狀態：目前狀態 (名單用) 與當月仍有效的最新狀態 (判斷掛宿外住用)
+        residents_df = pd.read_sql_query(f"""
+            SELECT
+                w.unique_id, w.room_id, r.room_number, w.worker_name, w.employer_name, w.gender, w.nationality,
+                w.accommodation_start_date, w.accommodation_end_date, w.work_permit_expiry_date,
+                w.monthly_fee, w.worker_notes,
+                (SELECT status FROM WorkerStatusHistory
+                 WHERE worker_unique_id = w.unique_id AND end_date IS NULL
+                 ORDER BY start_date DESC LIMIT 1) AS special_status,
+                {_MONTH_STATUS_SQL} AS current_status
+            FROM Workers w
+            JOIN Rooms r ON w.room_id = r.id
+            WHERE r.dorm_id = :dorm_id
+              AND {residency.living_during('w', period_start=':month_start', period_end=':next_month_start')}
+            ORDER BY r.room_number, w.worker_name
+        """, conn, params={"dorm_id": dorm_id, "month_start": first_day_of_month, "next_month_start": first_day_of_next_month})
+        leases_df = pd.read_sql_query(
+            "SELECT lease_start_date, lease_end_date, monthly_rent FROM Leases WHERE dorm_id = ? ORDER BY id",
+            conn, params=(dorm_id,))
+        # 帳單依天數分攤與年度費用攤提沿用 get_expense_summary 的 SQL 計算，確保金額一致
+        bills_df = pd.read_sql_query("""
+            SELECT SUM(
+                CAST(b.amount AS REAL) / (julianday(b.bill_end_date) - julianday(b.bill_start_date) + 1)
+                * (MIN(julianday(date(:y_m, '+1 month', '-1 day')), julianday(b.bill_end_date)) - MAX(julianday(date(:y_m)), julianday(b.bill_start_date)) + 1)
+            ) as prorated_amount, bill_type
+            FROM UtilityBills b
+            WHERE b.dorm_id = :dorm_id
+              AND b.bill_start_date < date(:y_m, '+1 month') 
+              AND b.bill_end_date >= date(:y_m)
+            GROUP BY bill_type
+        """, conn, params={"y_m": first_day_of_month, "dorm_id": dorm_id})
+        amortized_df = pd.read_sql_query("""
+            SELECT SUM(
+                ROUND(total_amount * 1.0 / (
+                    (strftime('%Y', amortization_end_month || '-01') - strftime('%Y', amortization_start_month || '-01')) * 12 +
+                    (strftime('%m', amortization_end_month || '-01') - strftime('%m', amortization_start_month || '-01')) + 1
+                ), 0)
+            ) as total_amortized, expense_item
+            FROM AnnualExpenses
+            WHERE dorm_id = ? AND amortization_start_month <= ? AND amortization_end_month >= ?
+            GROUP BY expense_item
+        """, conn, params=(dorm_id, year_month, year_month))
+    finally:
+        if conn: conn.close()
+
+    # --- 基本資訊：「今天」有效的租約 (多筆時取第一筆) ---
+    basic_info = None
+    if dorm:
+        basic_info = dict(dorm)
+        current_leases = leases_df[
+            (leases_df['lease_start_date'] <= today)
+            & (leases_df['lease_end_date'].isna() | (leases_df['lease_end_date'] >= today))
+        ]
+        lease = current_leases.iloc[0].to_dict() if not current_leases.empty else {}
+        for column in ('lease_start_date', 'lease_end_date', 'monthly_rent'):
+            value = lease.get(column)
+            basic_info[column] = None if pd.isna(value) else value.item() if hasattr(value, 'item') else value
+
+    # --- 當月支出：月初有效租約的租金 + 帳單分攤 + 年度費用攤提 ---
+    month_leases = leases_df[
+        (leases_df['lease_start_date'] <= first_day_of_month)
+        & (leases_df['lease_end_date'].isna() | (leases_df['lease_end_date'] >= first_day_of_month))
+    ]
+    total_rent = month_leases['monthly_rent'].sum() if not month_leases.empty else 0
+    expenses_df = _summarize_expenses(
+        total_rent,
+        dict(zip(bills_df['bill_type'], bills_df['prorated_amount'])),
+        dict(zip(amortized_df['expense_item'], amortized_df['total_amortized'])),
+    )
+
+    details_df = residents_df[[
+        'room_number', 'worker_name', 'employer_name', 'gender', 'nationality', 'accommodation_start_date',
+        'accommodation_end_date', 'work_permit_expiry_date', 'monthly_fee', 'special_status', 'worker_notes',
+    ]].set_axis(["房號", "姓名", "雇主", "性別", "國籍", "起住日", "離住日", "工作期限", "房租", "特殊狀況", "備註"], axis=1)
+
+    return DormAnalysis(
+        dorm_id=dorm_id,
+        year_month=year_month,
+        basic_info=basic_info,
+        meters=meters_df,
+        resident_summary=_summarize_residents(residents_df),
+        expenses=expenses_df,
+        occupancy=_analyze_occupancy(rooms_df, residents_df),
+        resident_details=details_df,
+    )
+
+# 多宿舍比較的排名指標：值越大越好的指標由大到小排名，成本類指標由小到大排名
+PORTFOLIO_METRICS = {
+    "住用率": False,
+    "每床月收入": False,
+    "每人月成本": True,
+    "每人月水電": True,
+    "預估損益": False,
+}
+
+@cached_query('Dormitories', 'Rooms', 'Workers', 'Leases', 'UtilityBills', 'AnnualExpenses')
+def get_portfolio_analysis(dorm_ids: list, start_month: str, end_month: str, rank_by: str = "住用率"):
+    """
+    一次比較多間宿舍在 start_month 到 end_month (含) 期間的營運表現，回傳依 rank_by 排名的 DataFrame。
+    dorm_ids 為空時比較所有「我司管理」的宿舍。不論宿舍數量，只需三次查詢：
+      收支取自 DormMonthlyFinance 彙總表；床位為各宿舍房間容量合計；
+      在住人數以月曆 CTE 一次算出每間宿舍每個月的在住人數 (與 get_resident_summary 相同的區間重疊判斷)。
+    指標：住用率 = 月均在住人數 / 總床位；每床月收入 = 總收入 / (總床位 × 月數)；
+          每人月成本 = 總支出 / 在住人月數；每人月水電 = 變動雜費 / 在住人月數。
+    """
+    if start_month > end_month:
+        start_month, end_month = end_month, start_month
+    months = finance_rollup.month_range(start_month, end_month)
+
+    conn = database.get_db_connection()
+    if not conn: return pd.DataFrame()
+    try:
+        if dorm_ids:
+            dorm_filter = f"d.id IN ({', '.join('?' for _ in dorm_ids)})"
+            dorm_params = list(dorm_ids)
+        else:
+            dorm_filter = "d.primary_manager = '我司'"
+            dorm_params = []
+
+        finance_rollup.refresh_dorm_monthly_finance(conn, months)
+        # 1. 宿舍與床位
+        dorms_df = pd.read_sql_query(f"""
+            SELECT d.id AS dorm_id, d.original_address, IFNULL(SUM(r.capacity), 0) AS capacity
+            FROM Dormitories d
+            LEFT JOIN Rooms r ON r.dorm_id = d.id
+            WHERE {dorm_filter}
+            GROUP BY d.id
+        """, conn, params=dorm_params)
+        if dorms_df.empty:
+            return pd.DataFrame()
+        # 2. 各宿舍期間內的收支合計
+        finance_df = pd.read_sql_query(f"""
+            SELECT
+                f.dorm_id,
+                SUM(IFNULL(f.income, 0)) AS income,
+                SUM(IFNULL(f.rent, 0) + ROUND(IFNULL(f.utilities, 0), 0) + IFNULL(f.amortized, 0)) AS expense,
+                SUM(ROUND(IFNULL(f.utilities, 0), 0)) AS utilities
+            FROM DormMonthlyFinance f
+            JOIN Dormitories d ON f.dorm_id = d.id
+            WHERE {dorm_filter} AND f.year_month BETWEEN ? AND ?
+            GROUP BY f.dorm_id
+        """, conn, params=dorm_params + [start_month, end_month])
+        # 3. 每間宿舍每個月的在住人數
+        residents_df = pd.read_sql_query(f"""
+            WITH RECURSIVE Calendar(year_month, first_day, next_first_day) AS (
+                SELECT ?, date(? || '-01'), date(? || '-01', '+1 month')
+                UNION ALL
+                SELECT strftime('%Y-%m', next_first_day), next_first_day, date(next_first_day, '+1 month')
+                FROM Calendar WHERE year_month < ?
+            )
+            SELECT r.dorm_id, c.year_month, COUNT(*) AS residents
+            FROM Dormitories d
+            JOIN Rooms r ON r.dorm_id = d.id
+            JOIN Workers w ON w.room_id = r.id
+            JOIN Calendar c ON {residency.living_during('w', period_start='c.first_day', period_end='c.next_first_day')}
+            WHERE {dorm_filter}
+            GROUP BY r.dorm_id, c.year_month
+        """, conn, params=[start_month, start_month, start_month, end_month] + dorm_params)
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
+
+    resident_months = residents_df.groupby('dorm_id')['residents'].sum()
+    df = dorms_df.merge(finance_df, on='dorm_id', how='left').fillna({'income': 0, 'expense': 0, 'utilities': 0})
+    df['resident_months'] = df['dorm_id'].map(resident_months).fillna(0).astype(int)
+
+    month_count = len(months)
+    bed_months = df['capacity'] * month_count
+    per_resident = df['resident_months'].where(df['resident_months'] > 0)
+    result = pd.DataFrame({
+        "dorm_id": df['dorm_id'],
+        "宿舍地址": df['original_address'],
+        "總床位": df['capacity'].astype(int),
+        "月均在住人數": (df['resident_months'] / month_count).round(1),
+        "住用率": (df['resident_months'] / bed_months.where(bed_months > 0)).round(3),
+        "總收入": df['income'].round(0).astype(int),
+        "總支出": df['expense'].round(0).astype(int),
+        "預估損益": (df['income'] - df['expense']).round(0).astype(int),
+        "每床月收入": (df['income'] / bed_months.where(bed_months > 0)).round(0),
+        "每人月成本": (df['expense'] / per_resident).round(0),
+        "每人月水電": (df['utilities'] / per_resident).round(0),
+    })
+
+    if rank_by not in PORTFOLIO_METRICS:
+        rank_by = "住用率"
+    ascending = PORTFOLIO_METRICS[rank_by]
+    result["排名"] = result[rank_by].rank(method='min', ascending=ascending, na_option='bottom').astype(int)
+    result = result.sort_values(["排名", "宿舍地址"]).reset_index(drop=True)
+    return result[["排名"] + [c for c in result.columns if c != "排名"]]
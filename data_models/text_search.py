@@ -0,0 +1,57 @@
+# 員工 / 宿舍關鍵字搜尋的共用 SQL 條件。
+# 以 FTS5 trigram 影子表 WorkerSearch / DormSearch (見 database.create_search_index) 做子字串比對，
+# 取代對整張表逐列 LIKE '%關鍵字%' 的掃描。trigram 至少需要 3 個字元，
+# 較短的關鍵字或資料庫沒有 FTS5 索引時，自動退回原本的 LIKE 條件 (結果相同，只是較慢)。
+import database
+
+MIN_MATCH_LENGTH = 3
+
+# 已確認具有全文檢索表的資料庫路徑 (只快取「有」，尚未升級的資料庫升級後即可使用)
+_ready_dbs = set()
+
+def search_index_ready() -> bool:
+    """目前的資料庫是否已建立 WorkerSearch / DormSearch。"""
+    if database.DB_NAME in _ready_dbs:
+        return True
+    conn = database.get_db_connection()
+    if not conn: return False
+    try:
+        found = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('WorkerSearch', 'DormSearch')"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    if found == 2:
+        _ready_dbs.add(database.DB_NAME)
+        return True
+    return False
+
+def can_match(term: str) -> bool:
+    """關鍵字夠長且索引存在時才使用 MATCH。"""
+    return len(term) >= MIN_MATCH_LENGTH and search_index_ready()
+
+def match_expr(term: str, columns=None) -> str:
+    """
+    將使用者輸入的關鍵字轉為 FTS5 MATCH 參數：整串視為一個片語 (引號內的 " 需重複)，
+    不解讀 AND / OR / * 等查詢語法；columns 指定時只比對這些欄位。
+    """
+    phrase = '"' + term.replace('"', '""') + '"'
+    if columns:
+        return '{' + ' '.join(columns) + '} : ' + phrase
+    return phrase
+
+def worker_ids_matching(term: str, columns=database.WORKER_SEARCH_COLUMNS) -> tuple:
+    """回傳 (SQL, 參數)：姓名、雇主、護照或居留證號包含 term 的 unique_id 子查詢。"""
+    return (
+        "SELECT k.unique_id FROM WorkerSearch s JOIN WorkerSearchKeys k ON k.id = s.rowid WHERE WorkerSearch MATCH ?",
+        [match_expr(term, columns)],
+    )
+
+def dorm_ids_matching(term: str, columns=database.DORM_SEARCH_COLUMNS) -> tuple:
+    """回傳 (SQL, 參數)：指定欄位 (預設為地址、名稱、舊編號) 包含 term 的宿舍 id 子查詢。"""
+    return "SELECT rowid FROM DormSearch WHERE DormSearch MATCH ?", [match_expr(term, columns)]
+
+def like_any(columns, term: str) -> tuple:
+    """回傳 (SQL, 參數)：任一欄位 LIKE '%term%' 的條件，供無法使用 MATCH 時退回。"""
+    pattern = f"%{term}%"
+    return "(" + " OR ".join(f"{c} LIKE ?" for c in columns) + ")", [pattern] * len(columns)
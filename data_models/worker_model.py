@@ -4,76 +4,166 @@ from datetime import datetime
 
 # 只依賴最基礎的 database 模組
 import database
+from . import occupancy_index, residency, text_search
+from .query_cache import cached_query, invalidates
 
+# 移工總覽的欄位與排序。排序鍵最後加上 unique_id，使順序唯一，分頁 (keyset) 才不會漏列或重複
+_WORKER_VIEW_SELECT = f"""
+    SELECT
+        w.unique_id,
+        d.primary_manager AS '主要管理人',
+        w.gender AS '性別',
+        w.nationality AS '國籍',
+        d.original_address as '宿舍地址',
+        r.room_number as '房號',
+        w.accommodation_start_date AS '入住日期',
+        w.accommodation_end_date AS '離住日期',
+        w.arrival_date AS '抵台日期',
+        w.work_permit_expiry_date AS '工作限期',
+        cs.status as '特殊狀況',
+        CASE 
+            WHEN {residency.moved_out_by('w')} 
+            THEN '已離住'
+            ELSE '在住'
+        END as '在住狀態',
+        w.monthly_fee as '月費',
+        w.worker_notes AS '個人備註',
+        w.employer_name AS '雇主',
+        w.worker_name AS '姓名',
+        w.passport_number AS '護照號碼',
+        w.arc_number AS '居留證號碼',
+        w.data_source as '資料來源'
+"""
+_WORKER_VIEW_FROM = """
+    FROM Workers w
+    LEFT JOIN Rooms r ON w.room_id = r.id
+    LEFT JOIN Dormitories d ON r.dorm_id = d.id
+"""
+_WORKER_VIEW_SORT_KEY = "(IFNULL(d.primary_manager, ''), w.employer_name, w.worker_name, w.unique_id)"
+_WORKER_VIEW_ORDER = "ORDER BY IFNULL(d.primary_manager, ''), w.employer_name, w.worker_name, w.unique_id"
+
+# 關鍵字同時比對員工的姓名、雇主、護照與居留證號，以及所住宿舍的地址
+_ADDRESS_SEARCH_COLUMNS = ('original_address', 'normalized_address')
+
+def _worker_view_filters(filters: dict):
+    """將總覽的篩選條件轉為 WHERE 子句清單與參數。"""
+    where_clauses = []
+    params = []
+
+    if filters.get('name_search'):
+        term = filters['name_search']
+        if text_search.can_match(term):
+            worker_sql, worker_params = text_search.worker_ids_matching(term)
+            dorm_sql, dorm_params = text_search.dorm_ids_matching(term, _ADDRESS_SEARCH_COLUMNS)
+            # 以 UNION 收集符合的 unique_id，再依主鍵取回員工，不必逐列掃描 Workers
+            where_clauses.append(f"""w.unique_id IN (
+                {worker_sql}
+                UNION ALL
+                SELECT sw.unique_id FROM Workers sw JOIN Rooms sr ON sr.id = sw.room_id
+                WHERE sr.dorm_id IN ({dorm_sql})
+            )""")
+            params.extend(worker_params + dorm_params)
+        else:
+            like_sql, like_params = text_search.like_any(
+                [f"w.{c}" for c in database.WORKER_SEARCH_COLUMNS] + [f"d.{c}" for c in _ADDRESS_SEARCH_COLUMNS], term)
+            where_clauses.append(like_sql)
+            params.extend(like_params)
+        
+    if filters.get('dorm_id'):
+        where_clauses.append("d.id = ?")
+        params.append(filters['dorm_id'])
+
+    status_filter = filters.get('status')
+    if status_filter == '在住':
+        where_clauses.append(residency.living_on('w'))
+    elif status_filter == '已離住':
+        where_clauses.append(residency.moved_out_by('w'))
+
+    return where_clauses, params
+
+def _where_sql(where_clauses: list) -> str:
+    return " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory')
 def get_workers_for_view(filters: dict):
     """
-    根據篩選條件，查詢移工的詳細住宿資訊。
-    在 SELECT 中增加 w.worker_notes AS '個人備註'。
+    根據篩選條件，查詢移工的詳細住宿資訊 (全部符合的資料)。
+    在 SELECT 中增加 w.worker_notes AS '個人備註'。畫面顯示請改用 get_workers_page 分頁查詢。
     """
     conn = database.get_db_connection()
     if not conn: return pd.DataFrame()
     try:
-        base_query = """
-            SELECT
-                w.unique_id,
-                d.primary_manager AS '主要管理人',
-                w.gender AS '性別',
-                w.nationality AS '國籍',
-                d.original_address as '宿舍地址',
-                r.room_number as '房號',
-                w.accommodation_start_date AS '入住日期',
-                w.accommodation_end_date AS '離住日期',
-                w.arrival_date AS '抵台日期',
-                w.work_permit_expiry_date AS '工作限期',
-                (SELECT status FROM WorkerStatusHistory 
-                 WHERE worker_unique_id = w.unique_id AND end_date IS NULL 
-                 ORDER BY start_date DESC LIMIT 1) as '特殊狀況',
-                CASE 
-                    WHEN w.accommodation_end_date IS NOT NULL 
-                         AND w.accommodation_end_date != '' 
-                         AND date(w.accommodation_end_date) <= date('now', 'localtime') 
-                    THEN '已離住'
-                    ELSE '在住'
-                END as '在住狀態',
-                w.monthly_fee as '月費',
-                w.worker_notes AS '個人備註',
-                w.employer_name AS '雇主',
-                w.worker_name AS '姓名',
-                w.passport_number AS '護照號碼',
-                w.arc_number AS '居留證號碼',
-                w.data_source as '資料來源'
-            FROM Workers w
+        where_clauses, params = _worker_view_filters(filters)
+        query = (
+            _WORKER_VIEW_SELECT + _WORKER_VIEW_FROM + residency.current_status_join('cs', 'w')
+            + _where_sql(where_clauses) + " " + _WORKER_VIEW_ORDER
+        )
+        return pd.read_sql_query(query, conn, params=tuple(params))
+    finally:
+        if conn: conn.close()
+
+@cached_query('Dormitories', 'Rooms', 'Workers')
+def count_workers_for_view(filters: dict) -> int:
+    """計算符合篩選條件的移工人數 (只計數，不查詢狀態與排序)。"""
+    conn = database.get_db_connection()
+    if not conn: return 0
+    try:
+        where_clauses, params = _worker_view_filters(filters)
+        query = "SELECT COUNT(*)" + _WORKER_VIEW_FROM + _where_sql(where_clauses)
+        return conn.execute(query, tuple(params)).fetchone()[0]
+    finally:
+        if conn: conn.close()
+
+@cached_query('Dormitories', 'Rooms', 'Workers', 'WorkerStatusHistory')
+def get_workers_page(filters: dict, page_size: int = 100, after: tuple = None):
+    """
+    以 keyset 分頁查詢移工總覽：回傳 (本頁 DataFrame, 下一頁的 after 鍵)，沒有下一頁時鍵為 None。
+    after 為上一頁最後一列的排序鍵 (主要管理人, 雇主, 姓名, unique_id)，第一頁傳 None。
+    只有本頁的員工會與目前狀態 JOIN，歷史離住資料再多也只影響篩選與排序的成本。
+    """
+    conn = database.get_db_connection()
+    if not conn: return pd.DataFrame(), None
+    try:
+        where_clauses, params = _worker_view_filters(filters)
+        if after is not None:
+            where_clauses.append(f"{_WORKER_VIEW_SORT_KEY} > (?, ?, ?, ?)")
+            params.extend(after)
+        # 先取出本頁的員工 (多取一筆判斷是否還有下一頁)，再補上房間、宿舍與狀態
+        query = f"""
+            WITH Page AS (
+                SELECT w.unique_id {_WORKER_VIEW_FROM} {_where_sql(where_clauses)}
+                {_WORKER_VIEW_ORDER}
+                LIMIT ?
+            ),
+            PageStatuses AS (
+                SELECT worker_unique_id, status FROM (
+                    SELECT worker_unique_id, status,
+                           ROW_NUMBER() OVER (PARTITION BY worker_unique_id ORDER BY start_date DESC) AS rn
+                    FROM WorkerStatusHistory
+                    WHERE end_date IS NULL AND worker_unique_id IN (SELECT unique_id FROM Page)
+                ) WHERE rn = 1
+            )
+            {_WORKER_VIEW_SELECT}
+            FROM Page p
+            JOIN Workers w ON w.unique_id = p.unique_id
             LEFT JOIN Rooms r ON w.room_id = r.id
             LEFT JOIN Dormitories d ON r.dorm_id = d.id
+            LEFT JOIN PageStatuses cs ON cs.worker_unique_id = w.unique_id
+            {_WORKER_VIEW_ORDER}
         """
-        
-        where_clauses = []
-        params = []
-        
-        if filters.get('name_search'):
-            term = f"%{filters['name_search']}%"
-            where_clauses.append("(w.worker_name LIKE ? OR w.employer_name LIKE ? OR d.original_address LIKE ?)")
-            params.extend([term, term, term])
-            
-        if filters.get('dorm_id'):
-            where_clauses.append("d.id = ?")
-            params.append(filters['dorm_id'])
-
-        status_filter = filters.get('status')
-        if status_filter == '在住':
-            where_clauses.append("(w.accommodation_end_date IS NULL OR w.accommodation_end_date = '' OR date(w.accommodation_end_date) > date('now', 'localtime'))")
-        elif status_filter == '已離住':
-            where_clauses.append("(w.accommodation_end_date IS NOT NULL AND w.accommodation_end_date != '' AND date(w.accommodation_end_date) <= date('now', 'localtime'))")
+        params.append(page_size + 1)
+        df = pd.read_sql_query(query, conn, params=tuple(params))
 
-        if where_clauses:
-            base_query += " WHERE " + " AND ".join(where_clauses)
-            
-        base_query += " ORDER BY d.primary_manager, w.employer_name, w.worker_name"
-        
-        return pd.read_sql_query(base_query, conn, params=tuple(params))
+        next_after = None
+        if len(df) > page_size:
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            next_after = (last['主要管理人'] if pd.notna(last['主要管理人']) else '', last['雇主'], last['姓名'], last['unique_id'])
+        return df, next_after
     finally:
         if conn: conn.close()
 
+@cached_query('Workers')
 def get_single_worker_details(unique_id: str):
     """取得單一移工的所有詳細資料。"""
     conn = database.get_db_connection()
@@ -87,6 +177,8 @@ def get_single_worker_details(unique_id: str):
     finally:
         if conn: conn.close()
 
+@occupancy_index.tracks_workers(lambda unique_id, details: [unique_id])
+@invalidates('Workers')
 def update_worker_details(unique_id: str, details: dict):
     """更新移工的核心資料 (不包含狀態)。"""
     conn = database.get_db_connection()
@@ -95,6 +187,7 @@ def update_worker_details(unique_id: str, details: dict):
         cursor = conn.cursor()
         # 【核心修正】確保 special_status 不會被傳入
         details.pop('special_status', None)
+        details = database.normalize_date_fields('Workers', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(unique_id)
@@ -108,6 +201,8 @@ def update_worker_details(unique_id: str, details: dict):
     finally:
         if conn: conn.close()
 
+@occupancy_index.tracks_workers(lambda details, initial_status: [details.get('unique_id')])
+@invalidates('Workers', 'WorkerStatusHistory')
 def add_manual_worker(details: dict, initial_status: dict):
     """新增一筆手動管理的移工資料，並為其建立初始狀態。"""
     details['data_source'] = '手動管理(他仲)'
@@ -120,6 +215,7 @@ def add_manual_worker(details: dict, initial_status: dict):
             return False, f"新增失敗：員工ID '{details['unique_id']}' 已存在。", None
         
         # 新增 Worker
+        details = database.normalize_date_fields('Workers', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO Workers ({columns}) VALUES ({placeholders})"
@@ -127,6 +223,7 @@ def add_manual_worker(details: dict, initial_status: dict):
         
         # 新增初始狀態
         if initial_status and initial_status.get('status'):
+            initial_status = database.normalize_date_fields('WorkerStatusHistory', initial_status)
             initial_status['worker_unique_id'] = details['unique_id']
             status_cols = ', '.join(f'"{k}"' for k in initial_status.keys())
             status_placeholders = ', '.join(['?'] * len(initial_status))
@@ -141,6 +238,8 @@ def add_manual_worker(details: dict, initial_status: dict):
     finally:
         if conn: conn.close()
 
+@occupancy_index.tracks_workers(lambda unique_id: [unique_id])
+@invalidates('Workers', cascade=True)
 def delete_worker_by_id(unique_id: str):
     """根據 unique_id 刪除一筆移工資料。"""
     conn = database.get_db_connection()
@@ -156,6 +255,7 @@ def delete_worker_by_id(unique_id: str):
     finally:
         if conn: conn.close()
 
+@cached_query('Dormitories', 'Rooms', 'Workers')
 def get_my_company_workers_for_selection():
     """
     所有移工的列表，用於編輯下拉選單。
@@ -178,6 +278,7 @@ def get_my_company_workers_for_selection():
     finally:
         if conn: conn.close()
 
+@cached_query('WorkerStatusHistory')
 def get_worker_status_history(unique_id: str):
     """
     查詢單一移工的所有歷史狀態紀錄。
@@ -201,12 +302,14 @@ def get_worker_status_history(unique_id: str):
     finally:
         if conn: conn.close()
 
+@invalidates('WorkerStatusHistory')
 def add_new_worker_status(details: dict):
     """為移工新增一筆新的狀態紀錄 (資料庫觸發器會自動處理舊紀錄)。"""
     conn = database.get_db_connection()
     if not conn: return False, "DB connection failed."
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('WorkerStatusHistory', details)
         columns = ', '.join(f'"{k}"' for k in details.keys())
         placeholders = ', '.join(['?'] * len(details))
         sql = f"INSERT INTO WorkerStatusHistory ({columns}) VALUES ({placeholders})"
@@ -220,6 +323,7 @@ def add_new_worker_status(details: dict):
         if conn: conn.close()
 
 
+@cached_query('WorkerStatusHistory')
 def get_single_status_details(status_id: int):
     """取得單筆狀態歷史的詳細資料。"""
     conn = database.get_db_connection()
@@ -232,12 +336,14 @@ def get_single_status_details(status_id: int):
     finally:
         if conn: conn.close()
 
+@invalidates('WorkerStatusHistory')
 def update_worker_status(status_id: int, details: dict):
     """更新一筆已存在的狀態歷史紀錄。"""
     conn = database.get_db_connection()
     if not conn: return False, "資料庫連線失敗"
     try:
         cursor = conn.cursor()
+        details = database.normalize_date_fields('WorkerStatusHistory', details)
         fields = ', '.join([f'"{key}" = ?' for key in details.keys()])
         values = list(details.values())
         values.append(status_id)
@@ -251,6 +357,7 @@ def update_worker_status(status_id: int, details: dict):
     finally:
         if conn: conn.close()
 
+@invalidates('WorkerStatusHistory')
 def delete_worker_status(status_id: int):
     """刪除一筆狀態歷史紀錄。"""
     conn = database.get_db_connection()
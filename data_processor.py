@@ -1,9 +1,16 @@
 import pandas as pd
+from pandas.errors import OutOfBoundsDatetime
 from lxml import etree
 import re
 import os
 from datetime import datetime
-from typing import List, Callable, Dict
+from typing import List, Callable, Dict, Iterator, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pickle import PicklingError
+from functools import lru_cache
+
+import database
 
 def chinese_to_arabic(cn_num_str: str) -> str:
     """
@@ -49,32 +56,37 @@ def chinese_to_arabic(cn_num_str: str) -> str:
         num = _trans(sec[0])
     return str(num)
 
-def normalize_taiwan_address(address: str) -> Dict[str, str]:
-    """對台灣地址進行深度正規化 (v2.8 最終版)。"""
-    if not isinstance(address, str) or pd.isna(address) or not address.strip():
-        return {'full': "", 'city': "", 'district': ""}
-    
+# --- 地址正規化所用的規則，於匯入時預先編譯 ---
+ADDRESS_RULES_VERSION = "2.8"
+_FULL_TO_HALF_WIDTH_NUMS = str.maketrans("０１２３４５６７８９", "0123456789")
+_RE_PARENTHESES = re.compile(r'[\(（].*?[\)）]')
+_RE_NEIGHBORHOOD = re.compile(r'(\d+)鄰')
+_RE_REPEATED_UNIT = re.compile(r'(縣|市|區|鄉|鎮|村|里|路|街|段|巷|弄|號|樓)\1+')
+_RE_CHINESE_NUMBER = re.compile(r'([一二三四五六七八九十百]+)(?=段|巷|弄|號|樓|街)')
+_RE_ADDRESS_PARTS = re.compile(r'(?P<city>\D+?[縣市])?(?P<district>\D+?[區鄉鎮市])?(?P<village>\D+?[村里])?(?P<road>.*?((路|街|大道|道)(?!.*(路|街|大道|道))))?(?P<section>\d+[段])?(?P<lane>\d+[巷])?(?P<alley>\d+[弄])?(?P<number>[\d之、-]+[號])?(?P<floor>\d+[樓])?(?P<rest>.*)')
+_RE_WHITESPACE = re.compile(r'\s+')
+_COUNTY_MAP = {"鹿港鎮": "彰化縣鹿港鎮", "彰化市": "彰化縣彰化市", "嘉義市": "嘉義縣嘉義市", "新竹市": "新竹縣新竹市"} # 簡化
+
+@lru_cache(maxsize=16384)
+def _normalize_taiwan_address_cached(address: str) -> Tuple[str, str, str]:
+    """正規化的實際運算，結果以 (full, city, district) 形式存入有上限的 LRU 快取。"""
     addr = address.strip().upper().replace(" ", "").replace("\u3000", "").replace("臺", "台")
     addr = addr.replace('.', '、').replace('-', '之')
-    full_width_nums = "０１２３４５６７８９"
-    half_width_nums = "0123456789"
-    addr = addr.translate(str.maketrans(full_width_nums, half_width_nums))
+    addr = addr.translate(_FULL_TO_HALF_WIDTH_NUMS)
     addr = addr.replace('F', '樓')
-    addr = re.sub(r'[\(（].*?[\)）]', '', addr)
-    addr = re.sub(r'(\d+)鄰', '', addr)
-    addr = re.sub(r'(縣|市|區|鄉|鎮|村|里|路|街|段|巷|弄|號|樓)\1+', r'\1', addr)
+    addr = _RE_PARENTHESES.sub('', addr)
+    addr = _RE_NEIGHBORHOOD.sub('', addr)
+    addr = _RE_REPEATED_UNIT.sub(r'\1', addr)
 
-    addr = re.sub(r'([一二三四五六七八九十百]+)(?=段|巷|弄|號|樓|街)', lambda m: chinese_to_arabic(m.group(1)), addr)
+    addr = _RE_CHINESE_NUMBER.sub(lambda m: chinese_to_arabic(m.group(1)), addr)
 
-    county_map = {"鹿港鎮": "彰化縣鹿港鎮", "彰化市": "彰化縣彰化市", "嘉義市": "嘉義縣嘉義市", "新竹市": "新竹縣新竹市"} # 簡化
-    for city_short, city_full in county_map.items():
+    for city_short, city_full in _COUNTY_MAP.items():
         if addr.startswith(city_short):
             addr = addr.replace(city_short, city_full, 1)
             break
 
-    pattern = r'(?P<city>\D+?[縣市])?(?P<district>\D+?[區鄉鎮市])?(?P<village>\D+?[村里])?(?P<road>.*?((路|街|大道|道)(?!.*(路|街|大道|道))))?(?P<section>\d+[段])?(?P<lane>\d+[巷])?(?P<alley>\d+[弄])?(?P<number>[\d之、-]+[號])?(?P<floor>\d+[樓])?(?P<rest>.*)'
-    match = re.search(pattern, addr)
-    if not match: return {'full': addr, 'city': "", 'district': ""}
+    match = _RE_ADDRESS_PARTS.search(addr)
+    if not match: return (addr, "", "")
     parts = match.groupdict(default='')
     
     # --- 【核心修正】擴充權威性判斷規則 ---
@@ -84,55 +96,183 @@ def normalize_taiwan_address(address: str) -> Dict[str, str]:
         village_part = ''
         
     normalized_full = f"{parts.get('city', '')}{parts.get('district', '')}{village_part}{parts.get('road', '')}{parts.get('section', '')}{parts.get('lane', '')}{parts.get('alley', '')}{parts.get('number', '')}{parts.get('floor', '')}{parts.get('rest', '')}"
-    normalized_full = re.sub(r'\s+', '', normalized_full).strip()
+    normalized_full = _RE_WHITESPACE.sub('', normalized_full).strip()
     
-    return {'full': normalized_full, 'city': parts.get('city', ''), 'district': parts.get('district', '')}
+    return (normalized_full, parts.get('city', ''), parts.get('district', ''))
 
-def parse_and_process_reports(
-    file_paths: List[str],
-    log_callback: Callable[[str], None]
-) -> pd.DataFrame:
+def normalize_taiwan_address(address: str) -> Dict[str, str]:
+    """對台灣地址進行深度正規化 (v2.8 最終版)。相同地址的結果會被快取。"""
+    if not isinstance(address, str) or pd.isna(address) or not address.strip():
+        return {'full': "", 'city': "", 'district': ""}
+    full, city, district = _normalize_taiwan_address_cached(address)
+    return {'full': full, 'city': city, 'district': district}
+
+def _load_address_cache(addresses: List[str]) -> Dict[str, Tuple[str, str, str]]:
+    """從資料庫的 AddressNormalizationCache 表讀取已正規化過的地址 (僅限目前的規則版本)。"""
+    cached = {}
+    conn = database.get_db_connection()
+    if not conn: return cached
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS AddressNormalizationCache (
+                raw_address TEXT PRIMARY KEY, normalized_full TEXT, city TEXT, district TEXT, rules_version TEXT
+            )
+        """)
+        for i in range(0, len(addresses), 500):
+            batch = addresses[i:i + 500]
+            placeholders = ', '.join(['?'] * len(batch))
+            rows = conn.execute(
+                f"SELECT raw_address, normalized_full, city, district FROM AddressNormalizationCache WHERE rules_version = ? AND raw_address IN ({placeholders})",
+                (ADDRESS_RULES_VERSION, *batch)
+            ).fetchall()
+            cached.update({row[0]: (row[1], row[2], row[3]) for row in rows})
+        conn.commit()
+    except Exception as e:
+        print(f"WARNING: 讀取地址正規化快取失敗，將直接重新計算: {e}")
+    finally:
+        conn.close()
+    return cached
+
+def _save_address_cache(results: Dict[str, Tuple[str, str, str]]):
+    """將新計算的正規化結果寫回資料庫快取表。"""
+    if not results: return
+    conn = database.get_db_connection()
+    if not conn: return
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO AddressNormalizationCache (raw_address, normalized_full, city, district, rules_version) VALUES (?, ?, ?, ?, ?)",
+            [(raw, full, city, district, ADDRESS_RULES_VERSION) for raw, (full, city, district) in results.items()]
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"WARNING: 寫入地址正規化快取失敗: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def normalize_addresses(addresses: pd.Series, use_persistent_cache: bool = True) -> pd.DataFrame:
     """
-    解析所有下載的XML報表檔案，進行清理、正規化。
+    批次正規化一整欄地址，回傳與輸入同索引、含 full / city / district 三欄的 DataFrame。
+    先去除重複地址，再依序查詢資料庫快取、LRU 快取，只有從未見過的地址才真正執行正規化。
     """
-    log_callback("INFO: 開始執行報表解析與資料處理程序...")
-    all_dataframes = []
-    ns = {'ss': 'urn:schemas-microsoft-com:office:spreadsheet'}
+    cleaned = addresses.where(addresses.map(lambda a: isinstance(a, str)), '')
+    unique_addresses = [a for a in cleaned.unique() if a.strip()]
 
-    for file_path in file_paths:
-        try:
-            tree = etree.parse(file_path)
-            rows_xml = tree.xpath('.//ss:Row', namespaces=ns)
-            header, all_rows_data, is_data_section = [], [], False
-            for row in rows_xml:
-                cells_text = [(data.text or "").strip() for cell in row.findall('ss:Cell', ns) for data in cell.findall('ss:Data', ns)]
-                if not cells_text: continue
-                if cells_text[0] == "入境日" and not is_data_section:
-                    is_data_section = True
-                    header = [h.replace('\n', '') for h in cells_text]
-                    continue
-                if is_data_section:
-                    row_data = cells_text[:len(header)]
-                    while len(row_data) < len(header):
-                        row_data.append("")
-                    all_rows_data.append(row_data)
-            if header and all_rows_data:
-                df = pd.DataFrame(all_rows_data, columns=header)
-                all_dataframes.append(df)
-        except Exception as e:
-            log_callback(f"ERROR: 解析檔案 {os.path.basename(file_path)} 時發生錯誤: {e}")
+    results = _load_address_cache(unique_addresses) if use_persistent_cache and unique_addresses else {}
+    new_results = {a: _normalize_taiwan_address_cached(a) for a in unique_addresses if a not in results}
+    results.update(new_results)
+    if use_persistent_cache:
+        _save_address_cache(new_results)
 
-    if not all_dataframes:
-        log_callback("CRITICAL: 所有檔案均解析失敗或為空。")
-        return pd.DataFrame()
+    results[''] = ("", "", "")
+    mapped = cleaned.map(lambda a: results.get(a, ("", "", "")))
+    return pd.DataFrame(mapped.tolist(), index=addresses.index, columns=['full', 'city', 'district'])
 
-    master_df = pd.concat(all_dataframes, ignore_index=True)
-    log_callback(f"INFO: 所有報表已成功合併！總共有 {len(master_df)} 筆原始資料。")
+SPREADSHEET_NS = 'urn:schemas-microsoft-com:office:spreadsheet'
 
-    if not master_df.empty and str(master_df.iloc[-1, 0]).strip().startswith('合計'):
-        master_df = master_df.iloc[:-1]
-        log_callback("INFO: 已成功移除合計列。")
-    
+def iter_report_rows(file_path: str) -> Iterator[List[str]]:
+    """
+    以 lxml.etree.iterparse 串流讀取 SpreadsheetML 報表，逐列產出每一列的儲存格文字。
+    每處理完一列就清除該元素及其先前的兄弟節點，解析中的 XML 樹不會隨報表大小增加。
+    """
+    row_tag = f'{{{SPREADSHEET_NS}}}Row'
+    cell_tag = f'{{{SPREADSHEET_NS}}}Cell'
+    data_tag = f'{{{SPREADSHEET_NS}}}Data'
+    for _, row in etree.iterparse(file_path, events=('end',), tag=row_tag):
+        cells_text = [(data.text or "").strip() for cell in row.iterchildren(cell_tag) for data in cell.iterchildren(data_tag)]
+        row.clear()
+        while row.getprevious() is not None:
+            del row.getparent()[0]
+        if cells_text:
+            yield cells_text
+
+def iter_report_chunks(file_path: str, chunk_size: int = 5000) -> Iterator[pd.DataFrame]:
+    """
+    解析單一報表檔案：找到以「入境日」開頭的表頭列後，將其後的資料列補齊/截斷為表頭長度，
+    每累積 chunk_size 列就產出一個 DataFrame (欄位皆為表頭)。檔案中沒有表頭或資料列時不產出任何結果。
+    呼叫端可逐塊處理，不必先把整個檔案合併為一個 DataFrame。
+    """
+    header, pending_rows, is_data_section = [], [], False
+    for cells_text in iter_report_rows(file_path):
+        if cells_text[0] == "入境日" and not is_data_section:
+            is_data_section = True
+            header = [h.replace('\n', '') for h in cells_text]
+            continue
+        if is_data_section:
+            row_data = cells_text[:len(header)]
+            while len(row_data) < len(header):
+                row_data.append("")
+            pending_rows.append(row_data)
+            if len(pending_rows) >= chunk_size:
+                yield pd.DataFrame(pending_rows, columns=header)
+                pending_rows = []
+    if pending_rows:
+        yield pd.DataFrame(pending_rows, columns=header)
+
+def parse_report_file(file_path: str, chunk_size: int = 5000) -> Optional[pd.DataFrame]:
+    """
+    將 iter_report_chunks 的結果合併為單一 DataFrame；檔案中沒有表頭或資料列時回傳 None。
+    注意：iterparse 只讓 XML 樹不隨檔案變大，合併後整個檔案的資料仍會在記憶體中。
+    """
+    chunks = list(iter_report_chunks(file_path, chunk_size))
+    if not chunks:
+        return None
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+def _parse_report_file_safe(file_path: str) -> Tuple[List[pd.DataFrame], Optional[str]]:
+    """
+    解析單一檔案，回傳 (各塊 DataFrame, 錯誤訊息)，例外轉為錯誤訊息，讓主行程依檔案逐一回報。
+    直接回傳各塊而不在此合併，所有檔案的資料塊只在 parse_and_process_reports 合併一次。
+    """
+    try:
+        return list(iter_report_chunks(file_path)), None
+    except Exception as e:
+        return [], str(e)
+
+# 報表中已知的日期格式，依序嘗試；皆不符合者才交由 pandas 自動推斷
+REPORT_DATE_FORMATS = ('%Y/%m/%d', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+def _parse_single_date(value: str, fmt: str):
+    try:
+        return pd.to_datetime(value, format=fmt)
+    except (OutOfBoundsDatetime, ValueError, OverflowError):
+        return pd.NaT
+
+def _parse_dates(text: pd.Series, fmt: str) -> pd.Series:
+    """
+    以指定格式解析日期字串 (format='mixed' 為逐值推斷)，回傳 datetime64[ns]。
+    無法解析，或超出 ns 可表示範圍 (約西元 1677~2262 年，例如民國年 '112/05/01' 被當成西元 112 年) 者為 NaT。
+    """
+    try:
+        result = pd.to_datetime(text, format=fmt, errors='coerce')
+    except OutOfBoundsDatetime:
+        result = text.map(lambda value: _parse_single_date(value, fmt))
+    in_bounds = (result >= pd.Timestamp.min) & (result <= pd.Timestamp.max)
+    return result.where(in_bounds).astype('datetime64[ns]')
+
+def _to_iso_date_strings(values: pd.Series) -> pd.Series:
+    """將日期欄位整欄轉為 'YYYY-MM-DD' 字串，無法解析或超出範圍者為 None。"""
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    text = values.astype(str).str.strip().where(values.notna(), '')
+    remaining = text != ''
+    for fmt in REPORT_DATE_FORMATS + ('mixed',):
+        if not remaining.any():
+            break
+        attempt = _parse_dates(text[remaining], fmt)
+        parsed.loc[attempt.index] = attempt
+        remaining &= parsed.isna()
+    iso = parsed.dt.strftime('%Y-%m-%d')
+    return iso.astype(object).where(parsed.notna(), None)
+
+def clean_report_dataframe(
+    master_df: pd.DataFrame,
+    log_callback: Callable[[str], None],
+    use_persistent_cache: bool = True
+) -> pd.DataFrame:
+    """
+    對合併後的原始報表進行清理：過濾空白列、欄位更名、日期格式統一、
+    產生 unique_id 與地址正規化。所有步驟皆以整欄運算完成，不逐列呼叫 Python 函式。
+    """
     log_callback("INFO: 正在過濾無效的空白資料列...")
     original_rows = len(master_df)
     master_df.dropna(subset=['雇主簡稱', '中文譯名'], inplace=True)
@@ -153,26 +293,23 @@ def parse_and_process_reports(
     date_columns = ['arrival_date', 'departure_date', 'work_permit_expiry_date']
     for col in date_columns:
         if col in master_df.columns:
-            master_df[col] = pd.to_datetime(master_df[col], errors='coerce').dt.strftime('%Y-%m-%d')
-            master_df[col] = master_df[col].where(pd.notna(master_df[col]), None)
+            master_df[col] = _to_iso_date_strings(master_df[col])
 
     regex_pattern = r'\s?\(接\)$|\s?\(遞:.*?\)$'
     master_df['employer_name'] = master_df['employer_name'].str.replace(regex_pattern, '', regex=True).str.strip()
     
     log_callback("INFO: 正在根據最新規則生成 Unique ID...")
-    def generate_unique_id(row):
-        employer = str(row.get('employer_name', '')).strip()
-        name = str(row.get('worker_name', '')).strip()
-        passport = str(row.get('passport_number', '')).strip()
-        
-        if passport:
-            return f"{employer}_{name}_{passport}"
-        else:
-            return f"{employer}_{name}"
+    # 規則：雇主_姓名_護照號碼，若無護照號碼則為 雇主_姓名
+    def _id_part(col):
+        if col not in master_df.columns:
+            return pd.Series('', index=master_df.index, dtype=object)
+        return master_df[col].fillna('').astype(str).str.strip()
 
-    master_df['unique_id'] = master_df.apply(generate_unique_id, axis=1)
+    passport = _id_part('passport_number')
+    passport_suffix = ('_' + passport).where(passport != '', '')
+    master_df['unique_id'] = _id_part('employer_name') + '_' + _id_part('worker_name') + passport_suffix
 
-    addr_info = master_df['original_address'].apply(normalize_taiwan_address).apply(pd.Series)
+    addr_info = normalize_addresses(master_df['original_address'], use_persistent_cache=use_persistent_cache)
     master_df[['normalized_address', 'city', 'district']] = addr_info[['full', 'city', 'district']]
     
     final_columns = [
@@ -186,5 +323,51 @@ def parse_and_process_reports(
     final_df = master_df[master_df['unique_id'] != '_'].copy()
     final_df = final_df[existing_final_columns].drop_duplicates(subset=['unique_id'], keep='first')
     
+    return final_df
+
+def parse_and_process_reports(
+    file_paths: List[str],
+    log_callback: Callable[[str], None],
+    max_workers: int = 1
+) -> pd.DataFrame:
+    """
+    解析所有下載的XML報表檔案，進行清理、正規化。
+    max_workers 大於 1 時，以行程池 (ProcessPoolExecutor) 平行解析各檔案，
+    結果仍依 file_paths 的順序合併；行程池無法使用 (子行程異常結束、無法序列化) 時改為逐一解析。
+    報表以串流方式逐塊讀取，但後續的清理與去重複需要所有檔案的資料，
+    因此全部報表的資料最後仍會合併為一個 DataFrame，峰值記憶體與報表總筆數成正比。
+    """
+    log_callback("INFO: 開始執行報表解析與資料處理程序...")
+    all_dataframes = []
+
+    if max_workers > 1 and len(file_paths) > 1:
+        log_callback(f"INFO: 以 {max_workers} 個行程平行解析 {len(file_paths)} 個檔案...")
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                parse_results = list(executor.map(_parse_report_file_safe, file_paths))
+        except (BrokenProcessPool, PicklingError) as e:
+            log_callback(f"WARNING: 平行解析失敗，改為逐一解析各檔案: {e}")
+            parse_results = [_parse_report_file_safe(file_path) for file_path in file_paths]
+    else:
+        parse_results = [_parse_report_file_safe(file_path) for file_path in file_paths]
+
+    for file_path, (chunks, error) in zip(file_paths, parse_results):
+        if error is not None:
+            log_callback(f"ERROR: 解析檔案 {os.path.basename(file_path)} 時發生錯誤: {error}")
+        else:
+            all_dataframes.extend(chunks)
+
+    if not all_dataframes:
+        log_callback("CRITICAL: 所有檔案均解析失敗或為空。")
+        return pd.DataFrame()
+
+    master_df = pd.concat(all_dataframes, ignore_index=True)
+    log_callback(f"INFO: 所有報表已成功合併！總共有 {len(master_df)} 筆原始資料。")
+
+    if not master_df.empty and str(master_df.iloc[-1, 0]).strip().startswith('合計'):
+        master_df = master_df.iloc[:-1]
+        log_callback("INFO: 已成功移除合計列。")
+    
+    final_df = clean_report_dataframe(master_df, log_callback)
     log_callback(f"INFO: 資料清理與正規化完成，最終處理完畢資料共 {len(final_df)} 筆。")
-    return final_df
\ No newline at end of file
+    return final_df
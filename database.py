@@ -1,6 +1,9 @@
 import sqlite3
 import os
 import sys # 【本次新增】匯入 sys 模組
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
 import pandas as pd
 
 def get_base_path():
@@ -18,27 +21,286 @@ def get_base_path():
 # 將 DB_NAME 定義為一個動態的絕對路徑
 DB_NAME = os.path.join(get_base_path(), "dorm_management.db")
 
+# 每個連線池最多保留的閒置連線數，可由 configure_connection_pool 調整
+DEFAULT_POOL_SIZE = 5
+
+class PooledConnection(sqlite3.Connection):
+    """
+    由連線池管理的 SQLite 連線。呼叫 close() 時會將連線歸還連線池而非真正關閉，
+    因此既有的 `try: ... finally: conn.close()` 寫法不需修改即可重複使用連線。
+    """
+    _pool = None
+    _checked_out = False
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checked_out:
+            self._pool.release(self)
+
+    def close_physical(self):
+        """真正關閉底層連線。"""
+        self._pool = None
+        super().close()
+
+class ConnectionPool:
+    """
+    單一資料庫檔案的連線池 (執行緒安全)。
+    每條連線在建立時設定一次 PRAGMA；取出時做健康檢查，歸還時回滾未提交的交易。
+    連線池用盡時會另外建立新連線，超出 max_size 的連線在歸還時才真正關閉，
+    因此巢狀取用連線的模型函式不會因等待而卡住。
+    """
+    def __init__(self, db_path: str, max_size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> PooledConnection:
+        # 連線可能在不同執行緒 (Streamlit session) 間被輪流取用，但同一時間只會借給一個呼叫者
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn._pool = self
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn):
+                conn.close_physical()
+                continue
+            conn.row_factory = sqlite3.Row
+            conn._checked_out = True
+            return conn
+
+    def release(self, conn: PooledConnection):
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close_physical()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+        conn.close_physical()
+
+    def close_all(self):
+        """關閉所有閒置連線 (例如在刪除或替換資料庫檔案之前)。"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close_physical()
+
+# 連線池以 (行程 ID, 資料庫路徑) 為鍵；子行程 (fork) 不會沿用父行程的連線
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(db_path: str) -> ConnectionPool:
+    key = (os.getpid(), db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path, DEFAULT_POOL_SIZE)
+        return pool
+
+def configure_connection_pool(max_size: int):
+    """設定每個連線池保留的閒置連線數上限，並套用到已建立的連線池。"""
+    global DEFAULT_POOL_SIZE
+    DEFAULT_POOL_SIZE = max(0, int(max_size))
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.max_size = DEFAULT_POOL_SIZE
+
+def close_all_connections():
+    """關閉本行程所有連線池中的閒置連線。"""
+    with _pools_lock:
+        pools = [pool for (pid, _), pool in _pools.items() if pid == os.getpid()]
+    for pool in pools:
+        pool.close_all()
+
 def get_db_connection(db_name=None):
-    """建立並回傳資料庫連線。"""
+    """從連線池取得資料庫連線。用完請呼叫 conn.close() 歸還，或改用 db_connection()。"""
     target_db = db_name if db_name else DB_NAME
     try:
         base_path = os.path.dirname(os.path.abspath(__file__))
         full_path = os.path.join(base_path, target_db)
-        conn = sqlite3.connect(full_path)
-        conn.execute("PRAGMA foreign_keys = ON")
-        conn.row_factory = sqlite3.Row
-        return conn
+        return _get_pool(full_path).acquire()
     except sqlite3.Error as e:
         print(f"資料庫連線失敗: {e}")
         return None
 
+@contextmanager
+def db_connection(db_name=None):
+    """
+    以 context manager 形式取得連線，離開區塊時自動歸還連線池：
+        with database.db_connection() as conn:
+            if not conn: return ...
+    """
+    conn = get_db_connection(db_name)
+    try:
+        yield conn
+    finally:
+        if conn:
+            conn.close()
+
+# 所有存放「日期」的欄位。寫入時一律轉為 'YYYY-MM-DD' 字串，無日期時存 NULL (不存空字串)，
+# 查詢即可直接比較欄位 (例如 end_date >= ?)，不需再包 date(...) 或判斷 = ''，也才能使用索引。
+DATE_COLUMNS = {
+    'Dormitories': ['insurance_start_date', 'insurance_end_date', 'fire_safety_start_date', 'fire_safety_end_date'],
+    'Workers': ['arrival_date', 'departure_date', 'work_permit_expiry_date',
+                'accommodation_start_date', 'accommodation_end_date'],
+    'WorkerStatusHistory': ['start_date', 'end_date'],
+    'DormitoryEquipment': ['last_replaced_date', 'next_check_date'],
+    'Leases': ['lease_start_date', 'lease_end_date'],
+    'UtilityBills': ['bill_start_date', 'bill_end_date'],
+    'AnnualExpenses': ['payment_date'],
+    'OtherIncome': ['transaction_date'],
+}
+
+# 資料庫結構版本 (存於 PRAGMA user_version)，run_migrations 依此判斷需要執行哪些升級
+SCHEMA_VERSION = 5
+
+# 本行程已確認為最新結構的資料庫 (避免每次頁面重新執行都查詢版本)
+_migrated_dbs = set()
+
+_DATE_INPUT_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S')
+
+def to_iso_date(value):
+    """
+    將各種日期表示法 (date / datetime / Timestamp / 字串) 轉為 'YYYY-MM-DD'。
+    None、NaN、空字串回傳 None；無法辨識的值會拋出 ValueError。
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    if not isinstance(value, str):
+        value = str(value)
+    text = value.strip()
+    if not text:
+        return None
+    for fmt in _DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"無法辨識的日期格式: {value!r}")
+
+def normalize_date_fields(table: str, details: dict) -> dict:
+    """回傳 details 的複本，其中屬於 table 日期欄位的值已轉為標準格式 (見 to_iso_date)。"""
+    normalized = dict(details)
+    for column in DATE_COLUMNS.get(table, []):
+        if column in normalized:
+            normalized[column] = to_iso_date(normalized[column])
+    return normalized
+
+def migrate_canonical_dates(cursor) -> list:
+    """
+    將既有資料的日期欄位轉為標準格式：空字串改為 NULL、'2024/1/5' 或含時間的值改為 'YYYY-MM-DD'。
+    無法辨識的值保持原樣並列入報告。回傳處理報告 (每個有異動或問題的欄位一行)。
+    """
+    report_lines = []
+    existing_tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, columns in DATE_COLUMNS.items():
+        if table not in existing_tables:
+            continue
+        existing_columns = {col[1] for col in cursor.execute(f'PRAGMA table_info("{table}")').fetchall()}
+        for column in columns:
+            if column not in existing_columns:
+                continue
+            # 1. 空白 -> NULL (NOT NULL 欄位略過，交由人工處理)
+            try:
+                cursor.execute(f'UPDATE "{table}" SET "{column}" = NULL WHERE TRIM("{column}") = \'\'')
+                cleared = cursor.rowcount
+            except sqlite3.IntegrityError:
+                cleared = 0
+                report_lines.append(f"WARNING: {table}.{column} 為必填欄位，但有空白值，請手動補齊。")
+
+            # 2. 其餘非標準格式的值逐一解析後寫回
+            rows = cursor.execute(f"""
+                SELECT rowid, "{column}" FROM "{table}"
+                WHERE "{column}" IS NOT NULL AND (date("{column}") IS NULL OR date("{column}") != "{column}")
+            """).fetchall()
+            converted, invalid = [], []
+            for rowid, value in rows:
+                try:
+                    converted.append((to_iso_date(value), rowid))
+                except ValueError:
+                    invalid.append(value)
+            cursor.executemany(f'UPDATE "{table}" SET "{column}" = ? WHERE rowid = ?', converted)
+
+            if cleared or converted:
+                report_lines.append(f"{table}.{column}: {cleared} 筆空白改為 NULL，{len(converted)} 筆轉為 YYYY-MM-DD。")
+            if invalid:
+                samples = ', '.join(repr(v) for v in invalid[:5])
+                report_lines.append(f"WARNING: {table}.{column} 有 {len(invalid)} 筆無法辨識的日期 (例如 {samples})，已保留原值。")
+    return report_lines
+
+def run_migrations(db_name=None):
+    """
+    依 PRAGMA user_version 對既有資料庫執行尚未套用的升級，應用程式啟動時呼叫。
+    版本 1：日期欄位統一為 'YYYY-MM-DD' / NULL。
+    版本 2：在住判斷用的覆蓋索引 idx_workers_residency。
+    版本 3：查詢員工目前狀態用的 idx_status_worker_current。
+    版本 4：員工 / 宿舍搜尋用的全文檢索索引 (create_search_index)。
+    版本 5：查詢快取的資料版本表 DataVersions (create_data_versions_table)。
+    每次升級最後都會重新執行 create_indexes 補建缺少的索引。
+    """
+    target_db = db_name if db_name else DB_NAME
+    if target_db in _migrated_dbs:
+        return
+    conn = get_db_connection(db_name)
+    if not conn: return
+    try:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            _migrated_dbs.add(target_db)
+            return
+        cursor.execute("BEGIN IMMEDIATE")
+        if version < 1:
+            for line in migrate_canonical_dates(cursor):
+                print(f"INFO: {line}")
+        create_indexes(cursor)
+        if version < 4:
+            create_search_index(cursor)
+        if version < 5:
+            create_data_versions_table(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        _migrated_dbs.add(target_db)
+        # 日期值可能已變更，讓查詢快取失效 (延遲匯入以避免循環相依)
+        from data_models import query_cache
+        query_cache.invalidate_tables(*DATE_COLUMNS.keys())
+    except sqlite3.Error as e:
+        print(f"ERROR: 資料庫升級失敗: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
 def create_indexes(cursor):
     """建立所有必要的索引以提升查詢效能。"""
     print("INFO: 開始建立資料庫索引...")
     
     # --- 為所有外鍵建立索引 ---
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_rooms_dorm_id ON Rooms(dorm_id);")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_workers_room_id ON Workers(room_id);")
+    # Workers.room_id 由下方的 idx_workers_residency (以 room_id 開頭) 涵蓋
+    cursor.execute("DROP INDEX IF EXISTS idx_workers_room_id;")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_equipment_dorm_id ON DormitoryEquipment(dorm_id);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_meters_dorm_id ON Meters(dorm_id);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_leases_dorm_id ON Leases(dorm_id);")
@@ -50,14 +312,182 @@ def create_indexes(cursor):
     # --- 為常用查詢欄位建立索引 ---
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_dorms_legacy_code ON Dormitories(legacy_dorm_code);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_workers_employer_name ON Workers(employer_name);")
+    # WorkerStatusHistory 不在 create_all_tables_and_indexes 中建立，存在時才建索引 (查詢員工目前狀態用)
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'WorkerStatusHistory'").fetchone():
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_worker_current ON WorkerStatusHistory(worker_unique_id, end_date, start_date);")
+
+    # --- 在住判斷 (data_models.residency) ---
+    # 覆蓋索引：依房間查詢在住人數、性別、月費時不需讀取 Workers 表
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_workers_residency
+        ON Workers(room_id, accommodation_start_date, accommodation_end_date, gender, monthly_fee);
+    """)
     
     # --- 為日期/攤提相關欄位建立索引 ---
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_leases_end_date ON Leases(lease_end_date);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_bills_dates ON UtilityBills(bill_start_date, bill_end_date);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_workers_permit_expiry ON Workers(work_permit_expiry_date);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_equipment_next_check ON DormitoryEquipment(next_check_date);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dorms_insurance_end ON Dormitories(insurance_end_date);")
     
     print("SUCCESS: 所有索引已建立。")
 
 
+def create_data_versions_table(cursor):
+    """建立各表格的資料版本表 DataVersions，寫入時遞增，供查詢快取判斷結果是否過時 (見 data_models/query_cache.py)。"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS DataVersions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+
+def create_finance_rollup(cursor):
+    """
+    建立每月收支彙總表 DormMonthlyFinance，以及標記「需重新計算宿舍」的觸發器。
+    Workers / Leases / UtilityBills / AnnualExpenses 異動時，觸發器會把受影響的宿舍
+    寫入 DormMonthlyFinanceDirty，下次查詢時只重算這些宿舍 (見 data_models/finance_rollup.py)。
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS DormMonthlyFinance (
+        dorm_id INTEGER NOT NULL,
+        year_month TEXT NOT NULL,
+        income INTEGER, rent INTEGER, utilities REAL, amortized INTEGER,
+        PRIMARY KEY (dorm_id, year_month),
+        FOREIGN KEY (dorm_id) REFERENCES Dormitories (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dorm_monthly_finance_month ON DormMonthlyFinance(year_month);")
+    # 已彙總過的月份 (該月份所有宿舍的資料皆已寫入 DormMonthlyFinance)
+    cursor.execute("CREATE TABLE IF NOT EXISTS DormMonthlyFinanceMonths (year_month TEXT PRIMARY KEY);")
+    cursor.execute("CREATE TABLE IF NOT EXISTS DormMonthlyFinanceDirty (dorm_id INTEGER PRIMARY KEY);")
+
+    mark_dirty = "INSERT OR IGNORE INTO DormMonthlyFinanceDirty (dorm_id) SELECT {dorm_expr} WHERE {dorm_expr} IS NOT NULL;"
+    mark_worker_dirty = "INSERT OR IGNORE INTO DormMonthlyFinanceDirty (dorm_id) SELECT dorm_id FROM Rooms WHERE id = {room_expr};"
+    for table in ('Leases', 'UtilityBills', 'AnnualExpenses'):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_finance_ins AFTER INSERT ON {table} BEGIN {mark_dirty.format(dorm_expr='NEW.dorm_id')} END;")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_finance_upd AFTER UPDATE ON {table} BEGIN {mark_dirty.format(dorm_expr='OLD.dorm_id')} {mark_dirty.format(dorm_expr='NEW.dorm_id')} END;")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_finance_del AFTER DELETE ON {table} BEGIN {mark_dirty.format(dorm_expr='OLD.dorm_id')} END;")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_workers_finance_ins AFTER INSERT ON Workers BEGIN {mark_worker_dirty.format(room_expr='NEW.room_id')} END;")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_workers_finance_upd
+        AFTER UPDATE OF room_id, monthly_fee, accommodation_start_date, accommodation_end_date ON Workers
+        BEGIN {mark_worker_dirty.format(room_expr='OLD.room_id')} {mark_worker_dirty.format(room_expr='NEW.room_id')} END;
+    """)
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_workers_finance_del AFTER DELETE ON Workers BEGIN {mark_worker_dirty.format(room_expr='OLD.room_id')} END;")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rooms_finance_upd AFTER UPDATE OF dorm_id ON Rooms
+        BEGIN {mark_dirty.format(dorm_expr='OLD.dorm_id')} {mark_dirty.format(dorm_expr='NEW.dorm_id')} END;
+    """)
+
+def create_expense_anomaly_tables(cursor):
+    """
+    建立費用異常偵測的表格與觸發器 (見 data_models/expense_anomalies.py)：
+    MeterAnomalyBounds 存各電水錶日均金額的正常範圍，UtilityBillAnomalies 存超出範圍的帳單；
+    UtilityBills 新增或修改金額 / 期間 / 電錶時，觸發器將帳單排入 UtilityBillAnomalyQueue，
+    下次評分時只需處理這些帳單。帳單或電錶刪除時以 ON DELETE CASCADE 一併移除。
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS MeterAnomalyBounds (
+        meter_id INTEGER PRIMARY KEY,
+        sample_size INTEGER NOT NULL,
+        q1 REAL, q3 REAL, lower_bound REAL, upper_bound REAL,
+        FOREIGN KEY (meter_id) REFERENCES Meters (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS UtilityBillAnomalies (
+        bill_id INTEGER PRIMARY KEY,
+        meter_id INTEGER NOT NULL,
+        daily_amount REAL NOT NULL,
+        lower_bound REAL NOT NULL, upper_bound REAL NOT NULL,
+        judgement TEXT NOT NULL,
+        FOREIGN KEY (bill_id) REFERENCES UtilityBills (id) ON DELETE CASCADE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS UtilityBillAnomalyQueue (
+        bill_id INTEGER PRIMARY KEY,
+        FOREIGN KEY (bill_id) REFERENCES UtilityBills (id) ON DELETE CASCADE
+    );
+    """)
+    enqueue = "INSERT OR IGNORE INTO UtilityBillAnomalyQueue (bill_id) VALUES (NEW.id);"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_utilitybills_anomaly_ins AFTER INSERT ON UtilityBills BEGIN {enqueue} END;")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_utilitybills_anomaly_upd
+        AFTER UPDATE OF meter_id, amount, bill_start_date, bill_end_date ON UtilityBills
+        BEGIN {enqueue} END;
+    """)
+
+# 全文檢索 (FTS5 trigram) 影子索引涵蓋的欄位，供 data_models/text_search.py 組合 MATCH 條件
+WORKER_SEARCH_COLUMNS = ('worker_name', 'employer_name', 'passport_number', 'arc_number')
+DORM_SEARCH_COLUMNS = ('original_address', 'normalized_address', 'dorm_name', 'legacy_dorm_code')
+
+def create_search_index(cursor) -> bool:
+    """
+    建立員工與宿舍的全文檢索影子表 WorkerSearch / DormSearch (FTS5 trigram 分詞，
+    可做任意子字串比對)，並以觸發器與 Workers / Dormitories 保持同步。
+    表格剛建立時會由現有資料回填。SQLite 未編譯 FTS5 時回傳 False，搜尋會退回 LIKE。
+    """
+    exists = lambda name: cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+    try:
+        # WorkerSearch：獨立內容表。Workers 以 TEXT 為主鍵、rowid 不保證穩定 (VACUUM 可能重編)，
+        # 因此另以 WorkerSearchKeys 對應 unique_id 與索引的 rowid，同步時可直接依 rowid 刪除。
+        new_worker_index = not exists('WorkerSearch')
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS WorkerSearch
+            USING fts5({', '.join(WORKER_SEARCH_COLUMNS)}, tokenize = 'trigram')
+        """)
+        # DormSearch：外部內容表，內容直接讀自 Dormitories，rowid 即 Dormitories.id
+        new_dorm_index = not exists('DormSearch')
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS DormSearch
+            USING fts5({', '.join(DORM_SEARCH_COLUMNS)}, content = 'Dormitories', content_rowid = 'id', tokenize = 'trigram')
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"WARNING: 無法建立全文檢索索引 (FTS5 不可用)，搜尋將使用 LIKE: {e}")
+        return False
+    cursor.execute("CREATE TABLE IF NOT EXISTS WorkerSearchKeys (id INTEGER PRIMARY KEY, unique_id TEXT NOT NULL UNIQUE);")
+
+    worker_cols = ', '.join(WORKER_SEARCH_COLUMNS)
+    insert_worker = f"""
+        INSERT INTO WorkerSearchKeys (unique_id) VALUES (NEW.unique_id);
+        INSERT INTO WorkerSearch (rowid, {worker_cols})
+        VALUES ((SELECT id FROM WorkerSearchKeys WHERE unique_id = NEW.unique_id), {', '.join(f'NEW.{c}' for c in WORKER_SEARCH_COLUMNS)});
+    """
+    delete_worker = """
+        DELETE FROM WorkerSearch WHERE rowid = (SELECT id FROM WorkerSearchKeys WHERE unique_id = OLD.unique_id);
+        DELETE FROM WorkerSearchKeys WHERE unique_id = OLD.unique_id;
+    """
+    worker_changed = ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in ('unique_id',) + WORKER_SEARCH_COLUMNS)
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_workers_search_ins AFTER INSERT ON Workers BEGIN {insert_worker} END;")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_workers_search_upd
+        AFTER UPDATE OF unique_id, {worker_cols} ON Workers WHEN {worker_changed}
+        BEGIN {delete_worker} {insert_worker} END;
+    """)
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_workers_search_del AFTER DELETE ON Workers BEGIN {delete_worker} END;")
+
+    dorm_cols = ', '.join(DORM_SEARCH_COLUMNS)
+    insert_dorm = f"INSERT INTO DormSearch (rowid, {dorm_cols}) VALUES (NEW.id, {', '.join(f'NEW.{c}' for c in DORM_SEARCH_COLUMNS)});"
+    delete_dorm = f"INSERT INTO DormSearch (DormSearch, rowid, {dorm_cols}) VALUES ('delete', OLD.id, {', '.join(f'OLD.{c}' for c in DORM_SEARCH_COLUMNS)});"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_dorms_search_ins AFTER INSERT ON Dormitories BEGIN {insert_dorm} END;")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_dorms_search_upd AFTER UPDATE OF id, {dorm_cols} ON Dormitories BEGIN {delete_dorm} {insert_dorm} END;")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_dorms_search_del AFTER DELETE ON Dormitories BEGIN {delete_dorm} END;")
+
+    if new_worker_index:
+        cursor.execute("DELETE FROM WorkerSearchKeys")
+        cursor.execute("INSERT INTO WorkerSearchKeys (unique_id) SELECT unique_id FROM Workers")
+        cursor.execute(f"""
+            INSERT INTO WorkerSearch (rowid, {worker_cols})
+            SELECT k.id, {', '.join(f'w.{c}' for c in WORKER_SEARCH_COLUMNS)}
+            FROM Workers w JOIN WorkerSearchKeys k ON k.unique_id = w.unique_id
+        """)
+    if new_dorm_index:
+        cursor.execute("INSERT INTO DormSearch (DormSearch) VALUES ('rebuild')")
+    return True
+
 def create_all_tables_and_indexes():
     """執行所有 CREATE TABLE 和 CREATE INDEX 指令。"""
     conn = get_db_connection()
@@ -162,10 +592,24 @@ def create_all_tables_and_indexes():
             FOREIGN KEY (dorm_id) REFERENCES Dormitories (id) ON DELETE CASCADE
         );
         """)
+        # 10. AddressNormalizationCache (地址正規化結果的持久化快取)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS AddressNormalizationCache (
+            raw_address TEXT PRIMARY KEY,
+            normalized_full TEXT, city TEXT, district TEXT,
+            rules_version TEXT
+        );
+        """)
+        # 11. DataVersions (各表格的資料版本，供查詢快取判斷結果是否過時)
+        create_data_versions_table(cursor)
         print("SUCCESS: 所有表格已成功建立。")
 
         # --- 【核心修正】將 create_indexes 移至所有 CREATE TABLE 之後 ---
         create_indexes(cursor)
+        create_finance_rollup(cursor)
+        create_expense_anomaly_tables(cursor)
+        create_search_index(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         
         conn.commit()
         print("\nINFO: 所有表格與索引均已成功建立！")
@@ -2,6 +2,8 @@ import streamlit as st
 import configparser
 import os
 
+import database
+
 # 從 views 資料夾中，匯入所有頁面的模組
 from views import (
     dashboard_view,
@@ -70,6 +72,8 @@ def main():
         st.session_state.log_messages = []
 
     config = load_config()
+    database.configure_connection_pool(config.getint('System', 'DB_POOL_SIZE', fallback=database.DEFAULT_POOL_SIZE))
+    database.run_migrations()
     
     # --- 全新的階層式導航 ---
     with st.sidebar:
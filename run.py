@@ -1,6 +1,7 @@
 import streamlit.web.cli as stcli
 import sys
 import os
+import multiprocessing
 
 def get_resource_path(relative_path):
     """
@@ -15,6 +16,9 @@ def get_resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 if __name__ == "__main__":
+    # 打包後的 .exe 在報表平行解析時會以子行程重新啟動自身，需先交由 multiprocessing 處理
+    multiprocessing.freeze_support()
+
     # 獲取主程式 main_app.py 的路徑
     # 我們需要 --add-data "main_app.py;." 來確保這個檔案被打包進去
     app_path = get_resource_path('main_app.py')
@@ -3,7 +3,13 @@ import os
 import shutil
 import time
 import string
-from typing import List, Tuple, Callable
+import queue
+import threading
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+from typing import List, Tuple, Callable, Dict, Optional
 from datetime import datetime
 
 # ==============================================================================
@@ -31,15 +37,240 @@ def generate_code_ranges() -> List[Tuple[str, str]]:
     
     return ranges
 
+def _build_report_payload(start_code: str, end_code: str, base_date: str) -> Dict[str, str]:
+    """組合單一查詢區間的報表下載表單參數。"""
+    return {
+        'CU00_BNO': start_code,
+        'CU00_ENO': end_code,
+        'CU00_SDATE': '1',
+        'CU00_BDATE': '',
+        'CU00_EDATE': '',
+        'CU00_BDATE1': '',
+        'CU00_EDATE1': '',
+        'CU00_BDATE2': '',
+        'CU00_EDATE2': '',
+        'CU00_BASE': base_date,
+        'CU00_BASE_I': 'N',
+        'CU00_sel8': 'A',
+        'CU00_LA04': '0',
+        'CU00_LA19': '0',
+        'CU00_LA198': '0',
+        'CU00_WORK': '0',
+        'CU00_PNO': '0',
+
+        'CU00_ORG1': 'A',
+        'CU00_LNO': '1',
+        'CU00_LA28': '0',
+        'CU00_SALERS': '0',
+        'CU00_MEMBER': '0',
+        'CU00_SERVS': 'A',
+        'CU00_ACCS': '0',
+        'CU00_TRANSF': '0',
+        'CU00_RET': '0',
+        'CU00_ORD': '1',
+        'CU00_drt': '5',
+        'CU00_SEL32': '4',
+        'CU00_SEL33': '5',
+        'CU00_SEL35': '2',
+        'CU00_LA37': '',
+        'CU00_LA37_1': '',
+        'CU00_LA120': '全部',
+        'LFK02_mm': '',
+        'key': '轉出Excel'
+    }
+
+class _HostThrottle:
+    """
+    同一主機的請求節流器：確保對同一主機發出的兩次請求之間，至少間隔 min_interval 秒。
+    可安全地在多個執行緒間共用。
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def wait(self, url: str):
+        if self.min_interval <= 0:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+MANIFEST_FILENAME = "download_manifest.json"
+
+def _range_key(start_code: str, end_code: str) -> str:
+    return f"{start_code}-{end_code}"
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_download_manifest(temp_dir: str) -> Dict:
+    """
+    讀取暫存資料夾中的下載檢查點清單 (manifest)。
+    格式: {"base_date": "YYYY-MM-DD", "ranges": {"A01-A10": {"status": "ok"|"empty"|"failed", ...}}}
+    檔案不存在或損毀時回傳空的清單。
+    """
+    manifest_path = os.path.join(temp_dir, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get('ranges'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"base_date": None, "ranges": {}}
+
+def _save_download_manifest(temp_dir: str, manifest: Dict):
+    """以「先寫暫存檔再取代」的方式寫入 manifest，避免中斷時留下半個檔案。"""
+    manifest_path = os.path.join(temp_dir, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def get_failed_ranges(temp_dir: str) -> List[str]:
+    """回傳 manifest 中標記為下載失敗的查詢區間，供寫入資料庫前檢查資料是否完整。"""
+    manifest = load_download_manifest(temp_dir)
+    return [key for key, entry in manifest['ranges'].items() if entry.get('status') == 'failed']
+
+def get_downloaded_files(temp_dir: str) -> List[str]:
+    """
+    回傳 manifest 中下載成功的報表檔案路徑 (即最近一次下載所用查詢區間的檔案)。
+    沒有 manifest 時 (例如手動放入的報表)，退回列出暫存資料夾中所有的 .xls 檔。
+    """
+    manifest = load_download_manifest(temp_dir)
+    if manifest['ranges']:
+        return [
+            os.path.join(temp_dir, entry['file'])
+            for entry in manifest['ranges'].values() if entry.get('status') == 'ok'
+        ]
+    return [os.path.join(temp_dir, f) for f in sorted(os.listdir(temp_dir)) if f.endswith('.xls')]
+
+def _prune_manifest(temp_dir: str, manifest: Dict, query_ranges: List[Tuple[str, str]]) -> int:
+    """
+    移除 manifest 中不屬於本次查詢區間的紀錄與其報表檔案 (查詢區間計畫重新切分後留下的舊區間)，
+    避免舊區間的失敗紀錄阻擋寫入，或舊檔案與新檔案重複計入。回傳移除的區間數。
+    """
+    current_keys = {_range_key(start_code, end_code) for start_code, end_code in query_ranges}
+    stale_keys = [key for key in manifest['ranges'] if key not in current_keys]
+    for key in stale_keys:
+        entry = manifest['ranges'].pop(key)
+        if entry.get('file'):
+            try:
+                os.remove(os.path.join(temp_dir, entry['file']))
+            except OSError:
+                pass
+    return len(stale_keys)
+
+def _is_checkpoint_valid(temp_dir: str, entry: Dict) -> bool:
+    """檢查 manifest 中的一筆紀錄是否仍有效 (無資料區間，或檔案存在且大小與雜湊值相符)。"""
+    if entry.get('status') == 'empty':
+        return True
+    if entry.get('status') != 'ok':
+        return False
+    file_path = os.path.join(temp_dir, entry.get('file', ''))
+    try:
+        return os.path.getsize(file_path) == entry.get('size') and _file_sha256(file_path) == entry.get('sha256')
+    except OSError:
+        return False
+
+def _is_retryable(error: Exception) -> bool:
+    """超時、連線錯誤、伺服器錯誤 (5xx) 與 429 可重試；其他 4xx (如帳密錯誤) 重試無益。"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, requests.exceptions.RequestException)
+
+def _download_single_range(
+    session: requests.Session,
+    throttle: _HostThrottle,
+    target_url: str,
+    auth_credentials: Tuple[str, str],
+    start_code: str,
+    end_code: str,
+    base_date: str,
+    temp_dir: str,
+    log: Callable[[str], None],
+    max_retries: int = 3,
+    backoff_base: float = 2.0
+) -> Dict:
+    """
+    下載單一查詢區間的報表並存檔，暫時性錯誤會以指數退避 (backoff_base * 2^n 秒) 重試。
+    回傳要寫入 manifest 的紀錄：
+        成功: {"status": "ok", "file", "size", "sha256"}
+        無資料: {"status": "empty"}
+        失敗: {"status": "failed", "error", "timeout"}；timeout 表示是否因超時失敗 (查詢區間過大的跡象)
+    """
+    attempt = 0
+    while True:
+        try:
+            throttle.wait(target_url)
+            response = session.post(
+                target_url,
+                data=_build_report_payload(start_code, end_code, base_date),
+                auth=auth_credentials,
+                timeout=300
+            )
+            response.raise_for_status()
+
+            if 'text/html' in response.headers.get('content-type', ''):
+                log(f"WARNING: 區間 {start_code}-{end_code} 可能沒有資料，伺服器回傳HTML頁面，已略過。")
+                return {"status": "empty"}
+
+            file_name = f"report_{start_code}_to_{end_code}.xls"
+            with open(os.path.join(temp_dir, file_name), 'wb') as f:
+                f.write(response.content)
+
+            log(f"SUCCESS: 已儲存報表: {file_name}")
+            return {
+                "status": "ok", "file": file_name,
+                "size": len(response.content),
+                "sha256": hashlib.sha256(response.content).hexdigest()
+            }
+
+        except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.Timeout):
+                error_message = f"下載 {start_code}-{end_code} 時發生超時錯誤。"
+            else:
+                error_message = f"下載 {start_code}-{end_code} 時發生網路或請求錯誤: {e}"
+            if attempt < max_retries and _is_retryable(e):
+                delay = backoff_base * (2 ** attempt)
+                attempt += 1
+                log(f"WARNING: {error_message} 將於 {delay:g} 秒後進行第 {attempt}/{max_retries} 次重試...")
+                time.sleep(delay)
+                continue
+            log(f"ERROR: {error_message}")
+            return {"status": "failed", "error": str(e), "timeout": isinstance(e, requests.exceptions.Timeout)}
+        except Exception as e:
+            log(f"ERROR: 處理 {start_code}-{end_code} 時發生未知系統錯誤: {e}")
+            return {"status": "failed", "error": str(e), "timeout": False}
+
 def download_all_reports(
     target_url: str,
     auth_credentials: Tuple[str, str],
     query_ranges: List[Tuple[str, str]],
     temp_dir: str,
-    log_callback: Callable[[str], None]
+    log_callback: Callable[[str], None],
+    max_workers: int = 4,
+    request_delay: float = 1.0,
+    max_retries: int = 3,
+    backoff_base: float = 2.0,
+    resume: bool = True
 ) -> List[str]:
     """
     遍歷所有查詢區間，下載所有報表，並將它們存入指定的暫存資料夾。
+    以執行緒池並行下載，所有請求共用同一個 requests.Session (keep-alive 連線重用)。
+    每個區間的結果都會記錄在暫存資料夾的 manifest 檢查點中；
+    同一基準日期重新執行時，只會重新下載失敗或缺少的區間，
+    不在本次 query_ranges 中的舊區間 (計畫重新切分後) 其紀錄與檔案會被移除。
 
     Args:
         target_url (str): 目標網站的 URL。
@@ -47,105 +278,250 @@ def download_all_reports(
         query_ranges (List[Tuple[str, str]]): 由 (起始編號, 截止編號) 組成的查詢列表。
         temp_dir (str): 用於存放下載檔案的暫存資料夾路徑。
         log_callback (Callable[[str], None]): 用於回報進度與狀態的日誌函式。
+        max_workers (int): 同時進行中的最大請求數，設為 1 即為逐一下載。
+        request_delay (float): 對同一主機連續發出兩次請求之間的最小間隔秒數。
+        max_retries (int): 每個區間遇到暫時性錯誤時的最大重試次數。
+        backoff_base (float): 第一次重試前的等待秒數，之後每次加倍。
+        resume (bool): 是否沿用同一基準日期的既有檢查點；設為 False 則一律清空重新下載。
 
     Returns:
-        List[str]: 一個包含所有成功下載的檔案絕對路徑的列表。
+        List[str]: 一個包含所有成功下載的檔案絕對路徑的列表 (依查詢區間順序排列)。
     """
     log_callback("INFO: 開始執行報表下載程序...")
 
-    # 準備暫存資料夾，如果已存在則清空重建
+    today_str = datetime.today().strftime('%Y-%m-%d')
+    manifest = load_download_manifest(temp_dir) if resume and os.path.isdir(temp_dir) else {"base_date": None, "ranges": {}}
+    can_resume = manifest.get('base_date') == today_str
+
+    # 準備暫存資料夾：可續傳時保留既有檔案，否則清空重建
     try:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        os.makedirs(temp_dir)
-        log_callback(f"INFO: 已建立並清空暫存資料夾: {temp_dir}")
+        if can_resume:
+            log_callback(f"INFO: 發現今日的下載檢查點，將沿用 {temp_dir} 中已完成的區間。")
+            pruned = _prune_manifest(temp_dir, manifest, query_ranges)
+            if pruned:
+                _save_download_manifest(temp_dir, manifest)
+                log_callback(f"INFO: 查詢區間計畫已變更，已移除 {pruned} 個舊區間的檢查點與檔案。")
+        else:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+            os.makedirs(temp_dir)
+            manifest = {"base_date": today_str, "ranges": {}}
+            _save_download_manifest(temp_dir, manifest)
+            log_callback(f"INFO: 已建立並清空暫存資料夾: {temp_dir}")
     except OSError as e:
         log_callback(f"CRITICAL: 無法建立暫存資料夾 {temp_dir}，請檢查權限。錯誤: {e}")
         return []
 
-    downloaded_files = []
     total_ranges = len(query_ranges)
+    max_workers = max(1, int(max_workers))
 
-    today_str = datetime.today().strftime('%Y-%m-%d')
     log_callback(f"INFO: 將使用基準日期: {today_str} 進行查詢。")
 
+    results: Dict[int, Dict] = {}
+    to_download = []
     for i, (start_code, end_code) in enumerate(query_ranges):
-        log_callback(f"INFO: 正在下載第 {i+1}/{total_ranges} 批: {start_code} - {end_code} ...")
-        
-        payload = {
-            'CU00_BNO': start_code,
-            'CU00_ENO': end_code,
-            'CU00_SDATE': '1',
-            'CU00_BDATE': '',
-            'CU00_EDATE': '',
-            'CU00_BDATE1': '',
-            'CU00_EDATE1': '',
-            'CU00_BDATE2': '',
-            'CU00_EDATE2': '',
-            'CU00_BASE': today_str,
-            'CU00_BASE_I': 'N',
-            'CU00_sel8': 'A',
-            'CU00_LA04': '0',
-            'CU00_LA19': '0',
-            'CU00_LA198': '0',
-            'CU00_WORK': '0',
-            'CU00_PNO': '0',
-
-            'CU00_ORG1': 'A',
-            'CU00_LNO': '1',
-            'CU00_LA28': '0',
-            'CU00_SALERS': '0',
-            'CU00_MEMBER': '0',
-            'CU00_SERVS': 'A',
-            'CU00_ACCS': '0',
-            'CU00_TRANSF': '0',
-            'CU00_RET': '0',
-            'CU00_ORD': '1',
-            'CU00_drt': '5',
-            'CU00_SEL32': '4',
-            'CU00_SEL33': '5',
-            'CU00_SEL35': '2',
-            'CU00_LA37': '',
-            'CU00_LA37_1': '',
-            'CU00_LA120': '全部',
-            'LFK02_mm': '',
-            'key': '轉出Excel'
-        }
+        entry = manifest['ranges'].get(_range_key(start_code, end_code))
+        if entry and _is_checkpoint_valid(temp_dir, entry):
+            results[i] = entry
+        else:
+            to_download.append((i, start_code, end_code))
 
-        try:
-            # ... (requests 請求與錯誤處理邏輯不變) ...
-            response = requests.post(
-                target_url,
-                data=payload,
-                auth=auth_credentials,
-                timeout=300
-            )
-            response.raise_for_status()
+    if results:
+        log_callback(f"INFO: 已有 {len(results)} 個區間完成下載，本次只需下載其餘 {len(to_download)} 個區間。")
+    log_callback(f"INFO: 最多同時下載 {max_workers} 批，請求間隔 {request_delay} 秒，失敗最多重試 {max_retries} 次。")
 
-            if 'text/html' in response.headers.get('content-type', ''):
-                log_callback(f"WARNING: 區間 {start_code}-{end_code} 可能沒有資料，伺服器回傳HTML頁面，已略過。")
-                continue
+    # 背景執行緒不直接呼叫 log_callback (Streamlit 的 session_state 只能在主執行緒存取)，
+    # 而是將訊息放入佇列，由主執行緒統一輸出。
+    messages: "queue.Queue[str]" = queue.Queue()
 
-            file_path = os.path.join(temp_dir, f"report_{start_code}_to_{end_code}.xls")
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+    def drain_messages():
+        while True:
+            try:
+                log_callback(messages.get_nowait())
+            except queue.Empty:
+                return
 
-            downloaded_files.append(file_path)
-            log_callback(f"SUCCESS: 已儲存報表: {os.path.basename(file_path)}")
-            
-            time.sleep(1)
+    def download(index: int, start_code: str, end_code: str) -> Dict:
+        messages.put(f"INFO: 正在下載第 {index+1}/{total_ranges} 批: {start_code} - {end_code} ...")
+        return _download_single_range(
+            session, throttle, target_url, auth_credentials,
+            start_code, end_code, today_str, temp_dir, messages.put,
+            max_retries=max_retries, backoff_base=backoff_base
+        )
 
-        except requests.exceptions.Timeout:
-            log_callback(f"ERROR: 下載 {start_code}-{end_code} 時發生超時錯誤。")
-        except requests.exceptions.RequestException as e:
-            log_callback(f"ERROR: 下載 {start_code}-{end_code} 時發生網路或請求錯誤: {e}")
-        except Exception as e:
-            log_callback(f"ERROR: 處理 {start_code}-{end_code} 時發生未知系統錯誤: {e}")
+    throttle = _HostThrottle(request_delay)
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
 
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {
+                executor.submit(download, i, start_code, end_code): (i, start_code, end_code)
+                for i, start_code, end_code in to_download
+            }
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                drain_messages()
+                for future in done:
+                    i, start_code, end_code = pending.pop(future)
+                    results[i] = future.result()
+                    manifest['ranges'][_range_key(start_code, end_code)] = results[i]
+                if done:
+                    _save_download_manifest(temp_dir, manifest)
+        drain_messages()
+
+    downloaded_files = [
+        os.path.join(temp_dir, results[i]['file'])
+        for i in sorted(results) if results[i].get('status') == 'ok'
+    ]
+    failed_count = sum(1 for entry in results.values() if entry.get('status') == 'failed')
 
     if not downloaded_files:
         log_callback("WARNING: 本次執行未下載任何報表檔案。")
     else:
         log_callback(f"\nINFO: 全部下載程序完成，共成功下載 {len(downloaded_files)} 個檔案。")
+    if failed_count:
+        log_callback(f"WARNING: 仍有 {failed_count} 個區間下載失敗，請重新執行下載以補齊缺少的區間。")
 
     return downloaded_files
+
+# ==============================================================================
+# 自適應查詢區間 (依歷次下載的回應大小，拆分過大的區間、合併無資料的區間)
+# ==============================================================================
+
+DEFAULT_RANGE_TARGET_BYTES = 5 * 1024 * 1024
+
+def _code_segments() -> List[List[str]]:
+    """
+    依序列出所有雇主編號，並依「可合併成單一查詢區間」的範圍分段：
+    A01~A99、B01~B99 ... H01~H99 各為一段，AA~AZ、BA~BZ ... ZA~ZZ 各為一段。
+    跨段合併會讓字典序區間意外涵蓋其他段的編號，因此區間只在段內切分。
+    """
+    segments = [[f"{prefix}{n:02d}" for n in range(1, 100)] for prefix in 'ABCDEFGH']
+    letters = string.ascii_uppercase
+    segments += [[a + b for b in letters] for a in letters]
+    return segments
+
+def _code_positions() -> Dict[str, Tuple[int, int]]:
+    """編號 -> (段索引, 段內位置)。"""
+    return {code: (seg_idx, pos) for seg_idx, codes in enumerate(_code_segments()) for pos, code in enumerate(codes)}
+
+def _expand_code_range(start_code: str, end_code: str, positions: Dict[str, Tuple[int, int]], segments: List[List[str]]) -> List[str]:
+    """展開一個查詢區間涵蓋的所有編號；起訖不在同一段時回傳空列表。"""
+    if start_code not in positions or end_code not in positions:
+        return []
+    (start_seg, start_pos), (end_seg, end_pos) = positions[start_code], positions[end_code]
+    if start_seg != end_seg or start_pos > end_pos:
+        return []
+    return segments[start_seg][start_pos:end_pos + 1]
+
+def _plan_segment(codes: List[str], code_weights: Dict[str, float], target_bytes: int) -> List[Tuple[str, str]]:
+    """依每個編號的預估大小，將一段編號貪婪地切成大小接近 target_bytes 的區間。"""
+    ranges = []
+    range_start, accumulated = codes[0], 0.0
+    for prev_code, code in zip(codes, codes[1:]):
+        accumulated += code_weights.get(prev_code, 0.0)
+        weight = code_weights.get(code, 0.0)
+        if accumulated > 0 and accumulated + weight > target_bytes:
+            ranges.append((range_start, prev_code))
+            range_start, accumulated = code, 0.0
+    ranges.append((range_start, codes[-1]))
+    return ranges
+
+def load_range_plan(plan_path: str) -> List[Tuple[str, str]]:
+    """
+    讀取上次學習得到的查詢區間計畫；尚無計畫或檔案損毀時，使用 generate_code_ranges() 的固定分組。
+    """
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            ranges = [tuple(r) for r in json.load(f).get('ranges', [])]
+        if ranges:
+            return ranges
+    except (OSError, ValueError, TypeError):
+        pass
+    return generate_code_ranges()
+
+def update_range_plan(
+    plan_path: str,
+    temp_dir: str,
+    log_callback: Callable[[str], None],
+    target_bytes: int = DEFAULT_RANGE_TARGET_BYTES
+) -> List[Tuple[str, str]]:
+    """
+    根據暫存資料夾 manifest 中本次各區間的回應大小，更新每個編號的預估大小，並重新規劃查詢區間：
+    - 回應過大 (超過目標 1.5 倍) 或因超時而失敗的區間會被拆小；
+    - 相鄰且合計仍小於目標的區間 (含無資料的區間) 會被合併。
+    其他原因的失敗 (帳密錯誤、連線被拒、伺服器故障) 與區間大小無關，不列入學習；
+    超過半數區間失敗時 (多半是整體連線或帳密問題) 本次不調整計畫，直接回傳目前的計畫。
+    只有需要調整的編號段會重新切分，其餘段維持原區間，讓同日續傳的檢查點仍可沿用。
+    新的計畫會寫回 plan_path，並回傳之。
+    """
+    segments = _code_segments()
+    positions = _code_positions()
+
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            code_weights = dict(json.load(f).get('code_weights', {}))
+    except (OSError, ValueError, TypeError):
+        code_weights = {}
+    current_ranges = load_range_plan(plan_path)
+
+    manifest_ranges = load_download_manifest(temp_dir)['ranges']
+    failed_count = sum(1 for entry in manifest_ranges.values() if entry.get('status') == 'failed')
+    if not manifest_ranges or failed_count * 2 > len(manifest_ranges):
+        log_callback(f"WARNING: 本次有 {failed_count}/{len(manifest_ranges)} 個區間下載失敗，不足以判斷區間大小，查詢區間計畫維持不變。")
+        return current_ranges
+
+    # 1. 從 manifest 學習每個編號的預估大小 (假設區間內平均分佈)
+    dirty_segments = set()
+    for key, entry in manifest_ranges.items():
+        start_code, _, end_code = key.partition('-')
+        codes = _expand_code_range(start_code, end_code, positions, segments)
+        if not codes:
+            continue
+        status = entry.get('status')
+        if status == 'ok':
+            range_bytes = float(entry.get('size') or 0)
+        elif status == 'empty':
+            range_bytes = 0.0
+        elif entry.get('timeout'):
+            # 超時的區間視為過大，預估為目標的兩倍，下次至少拆成兩半
+            range_bytes = 2.0 * target_bytes
+        else:
+            continue
+        for code in codes:
+            code_weights[code] = range_bytes / len(codes)
+        if range_bytes > 1.5 * target_bytes and len(codes) > 1:
+            dirty_segments.add(positions[start_code][0])
+
+    # 2. 找出有可合併相鄰區間的編號段
+    ranges_by_segment: Dict[int, List[Tuple[str, str]]] = {}
+    for start_code, end_code in current_ranges:
+        if _expand_code_range(start_code, end_code, positions, segments):
+            ranges_by_segment.setdefault(positions[start_code][0], []).append((start_code, end_code))
+    for seg_idx, seg_ranges in ranges_by_segment.items():
+        sizes = [sum(code_weights.get(c, 0.0) for c in _expand_code_range(s, e, positions, segments)) for s, e in seg_ranges]
+        if any(a + b <= target_bytes for a, b in zip(sizes, sizes[1:])):
+            dirty_segments.add(seg_idx)
+
+    # 3. 重新切分需要調整的段；未涵蓋完整的段也重新切分以確保不漏掉任何編號
+    new_ranges = []
+    for seg_idx, codes in enumerate(segments):
+        seg_ranges = sorted(ranges_by_segment.get(seg_idx, []), key=lambda r: positions[r[0]][1])
+        covered = sum(len(_expand_code_range(s, e, positions, segments)) for s, e in seg_ranges)
+        if seg_idx in dirty_segments or covered != len(codes):
+            new_ranges.extend(_plan_segment(codes, code_weights, target_bytes))
+        else:
+            new_ranges.extend(seg_ranges)
+
+    try:
+        tmp_path = plan_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"target_bytes": target_bytes, "code_weights": code_weights, "ranges": new_ranges}, f, ensure_ascii=False)
+        os.replace(tmp_path, plan_path)
+        log_callback(f"INFO: 已依本次回應大小更新查詢區間計畫：{len(current_ranges)} 個區間 -> {len(new_ranges)} 個區間。")
+    except OSError as e:
+        log_callback(f"WARNING: 無法儲存查詢區間計畫 {plan_path}: {e}")
+
+    return new_ranges
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from data_models import query_cache
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """建立全新結構的暫存資料庫，並讓 database.DB_NAME 指向它 (路徑為絕對路徑)。"""
+    db_path = str(tmp_path / 'scratch.db')
+    monkeypatch.setattr(database, 'DB_NAME', db_path)
+    query_cache.clear_cache()
+    database.create_all_tables_and_indexes()
+    yield db_path
+    query_cache.clear_cache()
+    database.close_all_connections()
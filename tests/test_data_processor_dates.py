@@ -0,0 +1,18 @@
+import pandas as pd
+
+import data_processor
+
+
+def test_known_formats_and_mixed_fallback():
+    values = pd.Series(['2023/05/01', '2023-05-02', '2023-05-03T08:00:00', '2023.5.4', '', None, '不是日期'])
+    assert data_processor._to_iso_date_strings(values).tolist() == [
+        '2023-05-01', '2023-05-02', '2023-05-03', '2023-05-04', None, None, None,
+    ]
+
+
+def test_out_of_range_and_roc_dates_become_none():
+    # 民國年與超出 ns 範圍的年份：只有該格為 None，不會中斷整批清理
+    values = pd.Series(['2023/05/01', '112/05/01', '0023/05/01', '1500-01-01', '2023/06/01'])
+    assert data_processor._to_iso_date_strings(values).tolist() == [
+        '2023-05-01', None, None, None, '2023-06-01',
+    ]
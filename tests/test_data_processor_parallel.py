@@ -0,0 +1,40 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import data_processor
+
+
+class _BrokenPool:
+    """模擬子行程異常結束的行程池。"""
+    def __init__(self, max_workers):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, func, *iterables):
+        raise BrokenProcessPool("子行程異常結束")
+
+
+def test_broken_process_pool_falls_back_to_serial_parsing(monkeypatch):
+    monkeypatch.setattr(data_processor, 'ProcessPoolExecutor', _BrokenPool)
+    parsed = []
+
+    def parse_safe(file_path):
+        parsed.append(file_path)
+        return [], f"{file_path} 格式錯誤"
+
+    monkeypatch.setattr(data_processor, '_parse_report_file_safe', parse_safe)
+    logs = []
+    result = data_processor.parse_and_process_reports(['a.xls', 'b.xls'], logs.append, max_workers=2)
+
+    assert result.empty
+    assert parsed == ['a.xls', 'b.xls']
+    assert any(m.startswith('WARNING: 平行解析失敗') for m in logs)
+    # 每個檔案仍各自記錄錯誤
+    assert [m for m in logs if m.startswith('ERROR:')] == [
+        'ERROR: 解析檔案 a.xls 時發生錯誤: a.xls 格式錯誤',
+        'ERROR: 解析檔案 b.xls 時發生錯誤: b.xls 格式錯誤',
+    ]
@@ -0,0 +1,39 @@
+import data_processor
+
+SPREADSHEET_NS = data_processor.SPREADSHEET_NS
+
+
+def _write_report(path, rows):
+    cells = lambda values: ''.join(f'<Cell><Data ss:Type="String">{v}</Data></Cell>' for v in values)
+    body = ''.join(f'<Row>{cells(values)}</Row>' for values in rows)
+    path.write_text(
+        f'<?xml version="1.0"?><Workbook xmlns="{SPREADSHEET_NS}" xmlns:ss="{SPREADSHEET_NS}">'
+        f'<Worksheet ss:Name="報表"><Table>{body}</Table></Worksheet></Workbook>',
+        encoding='utf-8',
+    )
+
+
+def test_report_chunks_share_the_header_and_cover_every_row(tmp_path):
+    report = tmp_path / 'report.xls'
+    _write_report(report, [
+        ['外勞資料查詢'],
+        ['入境日', '雇主簡稱', '中文譯名'],
+        *[[f'2023/01/0{i}', '甲', f'工人{i}'] for i in range(1, 6)],
+        ['2023/01/09', '乙'],  # 欄位不足補空字串
+    ])
+
+    chunks = list(data_processor.iter_report_chunks(str(report), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+    assert all(list(chunk.columns) == ['入境日', '雇主簡稱', '中文譯名'] for chunk in chunks)
+
+    df = data_processor.parse_report_file(str(report), chunk_size=2)
+    assert df['中文譯名'].tolist() == ['工人1', '工人2', '工人3', '工人4', '工人5', '']
+    assert df.index.tolist() == list(range(6))
+
+
+def test_report_without_header_yields_nothing(tmp_path):
+    report = tmp_path / 'empty.xls'
+    _write_report(report, [['查無資料']])
+    assert list(data_processor.iter_report_chunks(str(report))) == []
+    assert data_processor.parse_report_file(str(report)) is None
+    assert data_processor._parse_report_file_safe(str(report)) == ([], None)
@@ -0,0 +1,68 @@
+import pandas as pd
+
+import database
+from data_models import analytics_model, expense_anomalies, importer_model, query_cache
+
+
+def _seed_meter_bills(amounts):
+    """建立一間我司管理的宿舍與一個電錶，並寫入每月帳單 (每張 30 天)。"""
+    conn = database.get_db_connection()
+    try:
+        conn.execute("INSERT INTO Dormitories (id, original_address, normalized_address, primary_manager) VALUES (1, '甲路1號', '甲路1號', '我司')")
+        conn.execute("INSERT INTO Meters (id, dorm_id, meter_type, meter_number) VALUES (1, 1, '電費', 'M1')")
+        conn.executemany("""
+            INSERT INTO UtilityBills (dorm_id, meter_id, bill_type, amount, bill_start_date, bill_end_date)
+            VALUES (1, 1, '電費', ?, ?, ?)
+        """, [(amount, f"2025-{month:02d}-01", f"2025-{month:02d}-30") for month, amount in enumerate(amounts, start=1)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _pending_count():
+    conn = database.get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM UtilityBillAnomalyQueue").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_cached_read_does_not_score_until_refreshed(scratch_db):
+    _seed_meter_bills([3000, 3100, 2900, 3050, 3000, 9000])
+    versions_before = query_cache.get_data_versions(['MeterAnomalyBounds'])
+
+    # 讀取只讀出已存的結果，不評分、不遞增版本
+    assert analytics_model.find_expense_anomalies().empty
+    assert _pending_count() == 6
+    assert query_cache.get_data_versions(['MeterAnomalyBounds']) == versions_before
+
+    assert analytics_model.refresh_expense_anomalies() == 6
+    anomalies = analytics_model.find_expense_anomalies()
+    assert anomalies['異常金額'].tolist() == [9000]
+    assert anomalies['判斷'].tolist() == ['費用過高']
+
+    # 沒有待評分的帳單時不寫入、不讓快取失效
+    versions_after = query_cache.get_data_versions(['MeterAnomalyBounds'])
+    assert analytics_model.refresh_expense_anomalies() == 0
+    assert query_cache.get_data_versions(['MeterAnomalyBounds']) == versions_after
+
+
+def test_failed_expense_import_does_not_commit_or_score(scratch_db, monkeypatch):
+    _seed_meter_bills([])
+    scored = []
+    monkeypatch.setattr(expense_anomalies, 'score_after_write', lambda conn: scored.append(conn))
+    rows = pd.DataFrame([
+        {'宿舍地址': '甲路1號', '費用月份': '2025-01', '費用類型': '電費', '對應錶號': 'M1',
+         '帳單金額': 3000, '帳單起始日': '2025-01-01', '帳單結束日': '2025-01-31'},
+        # 起始日無法解析：整批匯入中止並回滾
+        {'宿舍地址': '甲路1號', '費用月份': '2025-02', '費用類型': '電費', '對應錶號': 'M1',
+         '帳單金額': 3100, '帳單起始日': '不是日期', '帳單結束日': '2025-02-28'},
+    ])
+    importer_model.batch_import_expenses(rows)
+
+    conn = database.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM UtilityBills").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert scored == []
@@ -0,0 +1,51 @@
+import datetime
+
+import database
+from data_models import query_cache
+
+
+class _FakeDate(datetime.date):
+    current = datetime.date(2026, 1, 15)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+def test_cached_results_expire_when_the_date_changes(scratch_db, monkeypatch):
+    monkeypatch.setattr(query_cache, 'date', _FakeDate)
+    calls = []
+
+    @query_cache.cached_query('Workers')
+    def residents_today():
+        calls.append(_FakeDate.today())
+        return len(calls)
+
+    assert residents_today() == 1
+    assert residents_today() == 1  # 同一天、資料未變動：命中快取
+
+    _FakeDate.current = datetime.date(2026, 1, 16)
+    assert residents_today() == 2  # 跨日：「在住」的判斷日期改變，重新查詢
+    assert residents_today() == 2
+
+    query_cache.invalidate_tables('Workers')
+    assert residents_today() == 3
+
+
+def test_invalidate_in_caller_transaction_does_not_commit_it(scratch_db):
+    conn = database.get_db_connection()
+    try:
+        # 模擬尚未升級、沒有 DataVersions 表的舊資料庫
+        conn.execute("DROP TABLE DataVersions")
+        conn.commit()
+        conn.execute("INSERT INTO Dormitories (original_address, normalized_address) VALUES ('甲路1號', '甲路1號')")
+        query_cache.invalidate_tables('Dormitories', conn=conn)
+        conn.rollback()
+        # 補建資料版本表不會提前提交呼叫端寫到一半的資料
+        assert conn.execute("SELECT COUNT(*) FROM Dormitories").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+    assert query_cache.get_data_versions(['Dormitories']) == (0,)
+    query_cache.invalidate_tables('Dormitories')
+    assert query_cache.get_data_versions(['Dormitories']) == (1,)
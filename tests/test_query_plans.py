@@ -0,0 +1,90 @@
+import re
+
+import pandas as pd
+import pytest
+
+import database
+from data_models import dashboard_model, reminder_model, single_dorm_analyzer, worker_model
+
+
+@pytest.fixture
+def plan_db(scratch_db):
+    """暫存資料庫，另建 WorkerStatusHistory (不在 create_all_tables_and_indexes 中) 與其索引。"""
+    conn = database.get_db_connection()
+    try:
+        conn.execute("""
+            CREATE TABLE WorkerStatusHistory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, worker_unique_id TEXT NOT NULL,
+                status TEXT, start_date DATE, end_date DATE, notes TEXT
+            )
+        """)
+        database.create_indexes(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    return scratch_db
+
+
+def _query_plans(monkeypatch, func, *args) -> list:
+    """執行 func (不經快取)，回傳其中每個 pd.read_sql_query 查詢的 EXPLAIN QUERY PLAN (每個查詢一個字串)。"""
+    captured = []
+    original = pd.read_sql_query
+
+    def recording_read_sql_query(sql, con, params=None, **kwargs):
+        captured.append((sql, params))
+        return original(sql, con, params=params, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_sql_query', recording_read_sql_query)
+    func.__wrapped__(*args)
+    monkeypatch.setattr(pd, 'read_sql_query', original)
+
+    conn = database.get_db_connection()
+    try:
+        return [
+            '\n'.join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, tuple(params or ())))
+            for sql, params in captured
+        ]
+    finally:
+        conn.close()
+
+
+def _scans_workers(plan: str) -> bool:
+    return re.search(r'^SCAN (Workers|w)\b', plan, re.MULTILINE) is not None
+
+
+def test_worker_view_uses_residency_and_status_indexes(plan_db, monkeypatch):
+    [plan] = _query_plans(monkeypatch, worker_model.get_workers_for_view, {'dorm_id': 1, 'status': '在住'})
+    assert 'USING INDEX idx_workers_residency' in plan
+    assert 'USING INDEX idx_status_worker_current' in plan
+    assert not _scans_workers(plan)
+
+
+def test_current_status_summary_uses_status_index(plan_db, monkeypatch):
+    [plan] = _query_plans(monkeypatch, dashboard_model.get_special_status_summary)
+    assert 'USING INDEX idx_status_worker_current' in plan
+    assert not _scans_workers(plan)
+
+
+def test_reminder_queries_use_date_indexes(plan_db, monkeypatch):
+    plans = _query_plans(monkeypatch, reminder_model.get_upcoming_reminders)
+    expected = ('idx_leases_end_date', 'idx_workers_permit_expiry', 'idx_equipment_next_check', 'idx_dorms_insurance_end')
+    for plan, index in zip(plans, expected, strict=True):
+        assert f'USING INDEX {index}' in plan
+        assert not plan.startswith('SCAN')
+
+
+def test_financial_dashboard_looks_up_monthly_finance_by_month(plan_db, monkeypatch):
+    [plan] = _query_plans(monkeypatch, dashboard_model.get_financial_dashboard_data, '2026-01')
+    assert 'SEARCH f USING INDEX idx_dorm_monthly_finance_month (year_month=?)' in plan
+    assert 'SEARCH d USING INTEGER PRIMARY KEY' in plan
+
+    [series_plan] = _query_plans(monkeypatch, dashboard_model.get_financial_series, '2026-01', '2026-03')
+    assert 'SEARCH f USING INDEX idx_dorm_monthly_finance_month (year_month=?)' in series_plan
+    assert not re.search(r'^SCAN (DormMonthlyFinance|f)\b', series_plan, re.MULTILINE)
+
+
+def test_dorm_analyzer_residents_use_residency_and_status_indexes(plan_db, monkeypatch):
+    plans = _query_plans(monkeypatch, single_dorm_analyzer.get_dorm_analysis_bundle, 1, '2026-01')
+    [residents_plan] = [plan for plan in plans if 'idx_workers_residency' in plan]
+    assert 'USING INDEX idx_status_worker_current' in residents_plan
+    assert not any(_scans_workers(plan) for plan in plans)
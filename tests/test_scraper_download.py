@@ -0,0 +1,106 @@
+import base64
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+import scraper
+
+EXPECTED_AUTH = 'Basic ' + base64.b64encode(b'user:secret').decode()
+
+
+class _StubReportHandler(BaseHTTPRequestHandler):
+    """模擬內網報表系統：依查詢的起始編號決定回應。"""
+    protocol_version = 'HTTP/1.1'  # 支援 keep-alive，才能驗證連線重用
+
+    def do_POST(self):
+        server = self.server
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        start_code = form['CU00_BNO'][0]
+        with server.lock:
+            server.requests.append((start_code, self.client_address[1], time.monotonic()))
+            attempt = sum(1 for code, _, _ in server.requests if code == start_code)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(0.1)
+            if self.headers.get('Authorization') != EXPECTED_AUTH or start_code == 'C01':
+                self._reply(401, b'unauthorized', 'text/plain')
+            elif start_code == 'B01' and attempt == 1:
+                self._reply(503, b'busy', 'text/plain')
+            elif start_code == 'D01':
+                self._reply(200, b'<html>no data</html>', 'text/html; charset=utf-8')
+            else:
+                self._reply(200, f'report {start_code}'.encode(), 'application/vnd.ms-excel')
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubReportHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests, server.in_flight, server.max_in_flight = [], 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_against_stub_server(stub_server, tmp_path):
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/report"
+    temp_dir = str(tmp_path / 'downloads')
+    ranges = [('A01', 'A10'), ('A11', 'A20'), ('A21', 'A30'), ('B01', 'B10'), ('C01', 'C10'), ('D01', 'D10')]
+    logs, log_threads = [], set()
+
+    def log(message):
+        logs.append(message)
+        log_threads.add(threading.current_thread())
+
+    files = scraper.download_all_reports(
+        url, ('user', 'secret'), ranges, temp_dir, log,
+        max_workers=3, request_delay=0.05, max_retries=2, backoff_base=0.01,
+    )
+
+    # 並行下載成功，503 重試後成功，依查詢區間順序回傳
+    assert [os.path.basename(f) for f in files] == [
+        'report_A01_to_A10.xls', 'report_A11_to_A20.xls', 'report_A21_to_A30.xls', 'report_B01_to_B10.xls',
+    ]
+    with open(files[3], 'rb') as f:
+        assert f.read() == b'report B01'
+    assert stub_server.max_in_flight > 1
+
+    # 401 不重試，記為非超時的失敗；回傳 HTML 的區間記為無資料
+    requested = [code for code, _, _ in stub_server.requests]
+    assert requested.count('B01') == 2
+    assert requested.count('C01') == 1
+    manifest = scraper.load_download_manifest(temp_dir)['ranges']
+    assert manifest['C01-C10']['status'] == 'failed' and manifest['C01-C10']['timeout'] is False
+    assert manifest['D01-D10'] == {'status': 'empty'}
+    assert scraper.get_failed_ranges(temp_dir) == ['C01-C10']
+
+    # 共用 Session：連線數不超過 max_workers；同一主機的請求間隔不小於 request_delay
+    assert len({port for _, port, _ in stub_server.requests}) <= 3
+    arrivals = sorted(t for _, _, t in stub_server.requests)
+    assert min(b - a for a, b in zip(arrivals, arrivals[1:])) >= 0.03
+
+    # 背景執行緒的訊息都由主執行緒輸出
+    assert log_threads == {threading.main_thread()}
+    assert any('B01-B10' in m and '重試' in m for m in logs)
+    assert any(m.startswith('ERROR:') and 'C01-C10' in m for m in logs)
@@ -0,0 +1,73 @@
+import hashlib
+import os
+
+import scraper
+
+
+def _fake_download(failing):
+    """取代實際的 HTTP 下載：failing 中的區間回傳失敗，其餘寫出一個小檔案。"""
+    def download(session, throttle, target_url, auth, start_code, end_code, base_date, temp_dir, log, **kwargs):
+        if (start_code, end_code) in failing:
+            return {"status": "failed", "error": "timeout"}
+        content = f"{start_code}-{end_code}".encode('utf-8')
+        file_name = f"report_{start_code}_to_{end_code}.xls"
+        with open(os.path.join(temp_dir, file_name), 'wb') as f:
+            f.write(content)
+        return {"status": "ok", "file": file_name, "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+    return download
+
+
+def test_resume_with_recut_plan_drops_stale_ranges(tmp_path, monkeypatch):
+    temp_dir = str(tmp_path / 'downloads')
+    log = lambda msg: None
+    first_plan = [('A01', 'A10'), ('A11', 'A20'), ('A21', 'A30')]
+    monkeypatch.setattr(scraper, '_download_single_range', _fake_download(failing={('A01', 'A10')}))
+    scraper.download_all_reports('http://example', ('u', 'p'), first_plan, temp_dir, log, request_delay=0)
+    assert scraper.get_failed_ranges(temp_dir) == ['A01-A10']
+
+    # 同日以重新切分後的計畫續傳：失敗的區間拆小、相鄰的小區間合併
+    second_plan = [('A01', 'A05'), ('A06', 'A10'), ('A11', 'A30')]
+    monkeypatch.setattr(scraper, '_download_single_range', _fake_download(failing=set()))
+    files = scraper.download_all_reports('http://example', ('u', 'p'), second_plan, temp_dir, log, request_delay=0)
+
+    assert scraper.get_failed_ranges(temp_dir) == []
+    expected = sorted(os.path.join(temp_dir, f"report_{s}_to_{e}.xls") for s, e in second_plan)
+    assert sorted(files) == expected
+    assert sorted(scraper.get_downloaded_files(temp_dir)) == expected
+    # 舊計畫的檔案已移除，不會與新檔案重複計入
+    assert sorted(f for f in os.listdir(temp_dir) if f.endswith('.xls')) == sorted(os.path.basename(p) for p in expected)
+
+
+def _write_manifest(temp_dir, entries):
+    os.makedirs(temp_dir, exist_ok=True)
+    scraper._save_download_manifest(temp_dir, {"base_date": "2026-01-01", "ranges": entries})
+
+
+def test_range_plan_splits_only_timed_out_ranges(tmp_path):
+    temp_dir, plan_path = str(tmp_path / 'downloads'), str(tmp_path / 'range_plan.json')
+    log = lambda msg: None
+    ranges = scraper.generate_code_ranges()
+    ok = {scraper._range_key(s, e): {"status": "ok", "file": "x.xls", "size": 1000} for s, e in ranges}
+    _write_manifest(temp_dir, ok)
+    assert scraper.update_range_plan(plan_path, temp_dir, log, target_bytes=1000) == ranges
+
+    # 帳密錯誤等非超時的失敗與區間大小無關：計畫不變
+    _write_manifest(temp_dir, {**ok, 'A01-A10': {"status": "failed", "error": "401", "timeout": False}})
+    assert scraper.update_range_plan(plan_path, temp_dir, log, target_bytes=1000) == ranges
+
+    # 超時的區間才視為過大而拆小
+    _write_manifest(temp_dir, {**ok, 'A01-A10': {"status": "failed", "error": "timeout", "timeout": True}})
+    new_plan = scraper.update_range_plan(plan_path, temp_dir, log, target_bytes=1000)
+    assert ('A01', 'A10') not in new_plan and new_plan[0][0] == 'A01' and new_plan[0][1] < 'A10'
+
+
+def test_range_plan_kept_when_most_ranges_failed(tmp_path):
+    temp_dir, plan_path = str(tmp_path / 'downloads'), str(tmp_path / 'range_plan.json')
+    log = lambda msg: None
+    ranges = scraper.generate_code_ranges()
+    # 整體超時 (例如伺服器停擺) 也不代表區間過大
+    _write_manifest(temp_dir, {
+        scraper._range_key(s, e): {"status": "failed", "error": "timeout", "timeout": True} for s, e in ranges
+    })
+    assert scraper.update_range_plan(plan_path, temp_dir, log, target_bytes=1000) == ranges
+    assert not os.path.exists(plan_path)
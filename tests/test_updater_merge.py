@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import database
+import updater
+
+TODAY = '2026-01-15'
+
+EXISTING_WORKERS = [
+    # unique_id, employer_name, worker_name, passport_number, gender, accommodation_end_date
+    ('甲_阿明_P1', '甲', '阿明', 'P1', '男', None),
+    ('甲_阿明_P2', '甲', '阿明', 'P2', '男', None),
+    ('甲_小花', '甲', '小花', None, '女', None),
+    ('乙_阿強_P3', '乙', '阿強', 'P3', '男', '2025-12-31'),
+    ('乙_阿美_P4', '乙', '阿美', 'P4', '女', None),
+    ('丙_阿德_P5', '丙', '阿德', 'P5', '男', None),
+]
+
+FRESH_WORKERS = [
+    # unique_id, employer_name, worker_name, passport_number, gender
+    ('甲_阿明_P1', '甲', '阿明', 'P1', '男'),         # 護照精準匹配
+    ('甲_阿明', '甲', '阿明', np.nan, '女'),          # NaN 護照：匹配第一位「甲 阿明」，且為同一位員工的最後一筆
+    ('甲_小花', '甲', '小花', '', '女'),              # 空字串護照：匹配第一位「甲 小花」
+    ('乙_阿強_P3', '乙', '阿強', 'P3', '男'),         # 已離住的員工恢復在住
+    ('乙_阿美_P9', '乙', '阿美', 'P9', '女'),         # 護照不同：新增
+    ('丁_阿福_P6', '丁', '阿福', 'P6', '男'),         # 全新員工
+]
+
+
+def _seed(conn):
+    conn.executemany("""
+        INSERT INTO Workers (unique_id, employer_name, worker_name, passport_number, gender,
+                             accommodation_start_date, accommodation_end_date, data_source)
+        VALUES (?, ?, ?, ?, ?, '2025-01-01', ?, '系統自動更新')
+    """, EXISTING_WORKERS)
+    conn.commit()
+
+
+def _fresh_df(rows=FRESH_WORKERS) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=['unique_id', 'employer_name', 'worker_name', 'passport_number', 'gender'])
+    df['nationality'] = '印尼'
+    df['arrival_date'] = '2025-01-01'
+    return df
+
+
+def _merge(scratch_db, bulk: bool, rows=FRESH_WORKERS) -> pd.DataFrame:
+    conn = database.get_db_connection()
+    try:
+        conn.execute("DELETE FROM Workers")
+        conn.commit()
+        _seed(conn)
+        cursor = conn.cursor()
+        fresh_df = _fresh_df(rows)
+        if bulk:
+            updater._merge_workers_bulk(cursor, fresh_df, TODAY, lambda msg: None)
+        else:
+            db_workers_df = pd.read_sql_query('SELECT * FROM Workers', conn)
+            updater._merge_workers_row_by_row(cursor, fresh_df, db_workers_df, TODAY, lambda msg: None)
+        conn.commit()
+        return pd.read_sql_query("""
+            SELECT unique_id, employer_name, worker_name, passport_number, gender, nationality,
+                   accommodation_start_date, accommodation_end_date
+            FROM Workers ORDER BY unique_id
+        """, conn)
+    finally:
+        conn.close()
+
+
+@pytest.mark.skipif(not updater.BULK_MERGE_MIN_SQLITE <= __import__('sqlite3').sqlite_version_info,
+                    reason="批次合併需要 SQLite 3.33 以上")
+def test_bulk_merge_matches_row_by_row(scratch_db):
+    row_by_row = _merge(scratch_db, bulk=False)
+    bulk = _merge(scratch_db, bulk=True)
+    pd.testing.assert_frame_equal(bulk, row_by_row)
+
+    by_id = bulk.set_index('unique_id')
+    # NaN 護照的新資料匹配第一位「甲 阿明」並覆寫 (同一位員工的最後一筆)，不另外新增
+    assert '甲_阿明' not in by_id.index
+    assert by_id.loc['甲_阿明_P1', 'gender'] == '女'
+    assert by_id.loc['甲_小花', 'nationality'] == '印尼'
+    assert pd.isna(by_id.loc['乙_阿強_P3', 'accommodation_end_date'])
+    # 不在最新名單中的員工標記離住
+    assert by_id.loc['甲_阿明_P2', 'accommodation_end_date'] == TODAY
+    assert by_id.loc['丙_阿德_P5', 'accommodation_end_date'] == TODAY
+    assert {'乙_阿美_P9', '丁_阿福_P6'} <= set(by_id.index)
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_resync_overwrites_manual_edits_and_skips_unchanged(scratch_db, bulk):
+    # 不含「NaN 護照覆寫同一位員工」那筆，兩次同步的比對結果才會相同
+    rows = [row for row in FRESH_WORKERS if row[0] != '甲_阿明']
+    _merge(scratch_db, bulk=bulk, rows=rows)
+    conn = database.get_db_connection()
+    try:
+        # 同步後手動修改一個同步欄位：爬蟲資料未變動，仍應被覆寫回最新資料
+        conn.execute("UPDATE Workers SET nationality = '越南' WHERE unique_id = '丁_阿福_P6'")
+        conn.commit()
+        cursor = conn.cursor()
+        fresh_df = _fresh_df(rows)
+        if bulk:
+            counts = updater._merge_workers_bulk(cursor, fresh_df, TODAY, lambda msg: None)
+        else:
+            db_workers_df = pd.read_sql_query('SELECT * FROM Workers', conn)
+            counts = updater._merge_workers_row_by_row(cursor, fresh_df, db_workers_df, TODAY, lambda msg: None)
+        conn.commit()
+        nationality = conn.execute("SELECT nationality FROM Workers WHERE unique_id = '丁_阿福_P6'").fetchone()[0]
+    finally:
+        conn.close()
+
+    added, updated, unchanged, deleted = counts
+    assert nationality == '印尼'
+    assert (added, updated, deleted) == (0, 1, 0)
+    assert unchanged > 0
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_values_with_different_types_compare_the_same_in_both_modes(scratch_db, bulk):
+    # 資料庫中的居留證號為文字 '12345'，最新資料為整數 12345：兩種模式皆以文字比較，視為未變動
+    rows = [('丁_阿福_P6', '丁', '阿福', 'P6', '男')]
+    _merge(scratch_db, bulk=bulk, rows=rows)
+    conn = database.get_db_connection()
+    try:
+        conn.execute("UPDATE Workers SET arc_number = '12345' WHERE unique_id = '丁_阿福_P6'")
+        conn.execute("DELETE FROM Workers WHERE unique_id <> '丁_阿福_P6'")
+        conn.commit()
+        cursor = conn.cursor()
+        fresh_df = _fresh_df(rows)
+        fresh_df['arc_number'] = pd.Series([12345], dtype=object)
+        if bulk:
+            counts = updater._merge_workers_bulk(cursor, fresh_df, TODAY, lambda msg: None)
+        else:
+            db_workers_df = pd.read_sql_query('SELECT * FROM Workers', conn)
+            counts = updater._merge_workers_row_by_row(cursor, fresh_df, db_workers_df, TODAY, lambda msg: None)
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert counts == (0, 0, 1, 0)
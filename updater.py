@@ -6,6 +6,7 @@ from typing import Callable, List, Dict
 # 只依賴最基礎的 database 模組
 import database
 from data_processor import normalize_taiwan_address
+from data_models import query_cache
 
 def sync_dormitories(conn, fresh_df: pd.DataFrame, log_callback: Callable[[str], None]):
     """
@@ -59,10 +60,199 @@ def build_address_to_room_map(conn, log_callback: Callable[[str], None]) -> dict
     log_callback(f"INFO: 地址映射索引建立完成，共 {len(address_map_dict)} 個地址。")
     return address_map_dict
 
-def run_update_process(fresh_df: pd.DataFrame, log_callback: Callable[[str], None]):
+# 批次合併模式使用 UPDATE ... FROM，需要 SQLite 3.33 以上；較舊的版本自動改用逐筆模式
+BULK_MERGE_MIN_SQLITE = (3, 33, 0)
+
+WORKER_UPDATE_COLUMNS = ['gender', 'nationality', 'passport_number', 'arc_number', 'arrival_date', 'departure_date', 'work_permit_expiry_date']
+
+def _synced_values_changed_clause(columns: List[str], fresh_value: Callable[[str], str]) -> str:
+    """
+    SQL 條件：Workers 目前的同步欄位值與最新資料是否有任何不同 (包含上次同步後被手動修改的值)。
+    兩種合併模式共用此條件，皆由 SQLite 以文字比較 (CAST AS TEXT，NULL 與 NULL 視為相同)，
+    型別不同但文字相同的值 (例如 12345 與 '12345') 在兩種模式中都視為未變動。
+    fresh_value(col) 回傳最新資料該欄位的 SQL 運算式 (參數 ? 或暫存表欄位)。
+    """
+    if not columns:
+        return '0'
+    return ' OR '.join(
+        f'CAST(Workers."{col}" AS TEXT) IS NOT CAST({fresh_value(col)} AS TEXT)' for col in columns
+    )
+
+def _synced_values_changed(cursor, worker_id: str, fresh_worker) -> bool:
+    """逐筆模式：資料庫中該員工的同步欄位值是否與最新資料不同 (比較方式見 _synced_values_changed_clause)。"""
+    columns = [col for col in WORKER_UPDATE_COLUMNS if col in fresh_worker]
+    clause = _synced_values_changed_clause(columns, lambda col: '?')
+    values = [None if pd.isna(fresh_worker.get(col)) else fresh_worker.get(col) for col in columns]
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM Workers WHERE unique_id = ? AND ({clause}))", (worker_id, *values))
+    return bool(cursor.fetchone()[0])
+
+def _merge_workers_row_by_row(cursor, fresh_df: pd.DataFrame, db_workers_df: pd.DataFrame, today_str: str, log_callback: Callable[[str], None]):
     """
-    執行核心的資料庫更新流程 (v1.7 - 最終安全版)。
-    採用逐筆 INSERT, UPDATE, 軟刪除，不再使用 'replace'。
+    逐筆比對模式：每位移工各自查詢、INSERT 或 UPDATE，最後進行軟刪除。
+    同步欄位值皆未變動、且仍在住的員工不會被改寫。
+    回傳 (新增數, 更新數, 未變動數, 標記離職數)。
+    """
+    processed_ids = set()
+    added_count, updated_count, unchanged_count, deleted_count = 0, 0, 0, 0
+    cols_to_keep = [col[1] for col in cursor.execute("PRAGMA table_info(Workers)").fetchall()]
+
+    for index, fresh_worker in fresh_df.iterrows():
+        employer = fresh_worker['employer_name']
+        name = fresh_worker['worker_name']
+        passport = fresh_worker.get('passport_number')
+        if pd.isna(passport):
+            passport = None # NaN 視同無護照 (與批次模式相同)
+        
+        # 查找匹配的既有員工
+        match_query = "SELECT * FROM Workers WHERE employer_name = ? AND worker_name = ?"
+        cursor.execute(match_query, (employer, name))
+        existing_matches = [dict(row) for row in cursor.fetchall()]
+        
+        target_worker = None
+        if existing_matches:
+            if passport: # 有護照，用護照精準匹配
+                for match in existing_matches:
+                    if match.get('passport_number') == passport:
+                        target_worker = match
+                        break
+            else: # 沒護照，匹配第一個找到的
+                target_worker = existing_matches[0]
+        target_worker_id = target_worker['unique_id'] if target_worker else None
+
+        # 執行操作
+        if target_worker_id and target_worker.get('accommodation_end_date') is None and not _synced_values_changed(cursor, target_worker_id, fresh_worker):
+            # 內容未變動且仍在住，不需改寫
+            unchanged_count += 1
+            processed_ids.add(target_worker_id)
+        elif target_worker_id:
+            # 更新在職員工
+            update_details = {col: fresh_worker.get(col) for col in WORKER_UPDATE_COLUMNS if col in fresh_worker}
+            update_details['accommodation_end_date'] = None # 確保在職
+            
+            fields = ', '.join([f'"{key}" = ?' for key in update_details.keys()])
+            values = list(update_details.values()) + [target_worker_id]
+            cursor.execute(f"UPDATE Workers SET {fields} WHERE unique_id = ?", tuple(values))
+            updated_count += 1
+            processed_ids.add(target_worker_id)
+        else:
+            # 新增員工
+            new_worker_details = fresh_worker.to_dict()
+            new_worker_details['data_source'] = '系統自動更新'
+            new_worker_details['accommodation_start_date'] = new_worker_details.get('arrival_date')
+            
+            final_details = {k: v for k, v in new_worker_details.items() if k in cols_to_keep}
+            
+            columns = ', '.join(f'"{k}"' for k in final_details.keys())
+            placeholders = ', '.join(['?'] * len(final_details))
+            cursor.execute(f"INSERT INTO Workers ({columns}) VALUES ({placeholders})", tuple(final_details.values()))
+            added_count += 1
+    
+    # 處理離職員工 (軟刪除)
+    db_system_ids = set(db_workers_df[db_workers_df['data_source'] == '系統自動更新']['unique_id'])
+    deleted_ids = db_system_ids - processed_ids
+    if deleted_ids:
+        for uid in deleted_ids:
+            cursor.execute("UPDATE Workers SET accommodation_end_date = ? WHERE unique_id = ? AND accommodation_end_date IS NULL", (today_str, uid))
+            if cursor.rowcount > 0:
+                deleted_count += 1
+                log_callback(f"INFO: 移工 '{uid}' 已不在最新名單，更新住宿迄日。")
+
+    return added_count, updated_count, unchanged_count, deleted_count
+
+def _merge_workers_bulk(cursor, fresh_df: pd.DataFrame, today_str: str, log_callback: Callable[[str], None]):
+    """
+    批次合併模式：將最新名單載入暫存表 (TEMP TABLE)，
+    以一次 JOIN 完成比對 (雇主+姓名，有護照時以護照精準匹配)，
+    再以少數幾個集合式 UPDATE ... FROM / INSERT ... SELECT 完成更新、新增與軟刪除。
+    護照為 NULL / NaN / 空字串時視同無護照，匹配第一個同雇主同姓名的員工；
+    多筆新資料匹配到同一位員工時，以名單中最後一筆為準 (與逐筆模式依序覆寫的結果相同)。
+    與逐筆模式唯一的差異：比對對象只有本次同步前已存在的資料，
+    逐筆模式則可能匹配到同一批稍早才新增的員工 (同雇主同姓名、其中一筆無護照時)。
+    同步欄位值皆未變動、且仍在住的員工不會被改寫。需要 SQLite 3.33 以上 (UPDATE ... FROM)。
+    回傳 (新增數, 更新數, 未變動數, 標記離職數)。
+    """
+    worker_columns = [col[1] for col in cursor.execute("PRAGMA table_info(Workers)").fetchall()]
+    staging_columns = [col for col in fresh_df.columns if col in worker_columns]
+    for required in ('employer_name', 'worker_name', 'passport_number', 'arrival_date'):
+        if required not in staging_columns:
+            staging_columns.append(required)
+
+    # 1. 載入暫存表 (NaN 一律轉為 NULL)
+    staging_df = fresh_df.reindex(columns=staging_columns).astype(object)
+    staging_df = staging_df.where(pd.notna(staging_df), None)
+    quoted_columns = ', '.join(f'"{c}"' for c in staging_columns)
+    cursor.execute("DROP TABLE IF EXISTS temp._fresh_workers")
+    cursor.execute("DROP TABLE IF EXISTS temp._worker_matches")
+    cursor.execute(f"CREATE TEMP TABLE _fresh_workers (seq INTEGER PRIMARY KEY, {quoted_columns})")
+    cursor.executemany(
+        f"INSERT INTO _fresh_workers (seq, {quoted_columns}) VALUES (?, {', '.join(['?'] * len(staging_columns))})",
+        [(i, *row) for i, row in enumerate(staging_df.itertuples(index=False, name=None))]
+    )
+
+    # 2. 一次 JOIN 完成比對，每筆新資料只取第一個符合的既有員工
+    cursor.execute("CREATE TEMP TABLE _worker_matches (seq INTEGER PRIMARY KEY, target_id TEXT NOT NULL)")
+    cursor.execute("""
+        INSERT INTO _worker_matches (seq, target_id)
+        SELECT seq, unique_id FROM (
+            SELECT f.seq, w.unique_id,
+                   ROW_NUMBER() OVER (PARTITION BY f.seq ORDER BY w.rowid) AS rn
+            FROM _fresh_workers f
+            JOIN Workers w ON w.employer_name = f.employer_name AND w.worker_name = f.worker_name
+            WHERE IFNULL(f.passport_number, '') = '' OR w.passport_number = f.passport_number
+        )
+        WHERE rn = 1
+    """)
+    cursor.execute("CREATE INDEX temp._idx_worker_matches_target ON _worker_matches(target_id)")
+    matched_count = cursor.execute("SELECT COUNT(DISTINCT target_id) FROM _worker_matches").fetchone()[0]
+
+    # 3. 軟刪除：不在最新名單中的系統同步員工 (須在新增之前執行，避免誤判新進員工)
+    departed_query = """
+        FROM Workers
+        WHERE data_source = '系統自動更新'
+          AND accommodation_end_date IS NULL
+          AND unique_id NOT IN (SELECT target_id FROM _worker_matches)
+    """
+    departed_ids = [row[0] for row in cursor.execute(f"SELECT unique_id {departed_query}").fetchall()]
+    if departed_ids:
+        cursor.execute(f"UPDATE Workers SET accommodation_end_date = ? WHERE unique_id IN (SELECT unique_id {departed_query})", (today_str,))
+        for uid in departed_ids:
+            log_callback(f"INFO: 移工 '{uid}' 已不在最新名單，更新住宿迄日。")
+    deleted_count = len(departed_ids)
+
+    # 4. 只更新同步欄位值有變動 (含被手動修改)、或需恢復在住的已匹配員工
+    update_cols = [col for col in WORKER_UPDATE_COLUMNS if col in fresh_df.columns]
+    set_clause = ', '.join([f'"{col}" = f."{col}"' for col in update_cols] + ['accommodation_end_date = NULL'])
+    changed_clause = _synced_values_changed_clause(update_cols, lambda col: f'f."{col}"')
+    cursor.execute(f"""
+        UPDATE Workers SET {set_clause}
+        FROM (SELECT target_id, MAX(seq) AS seq FROM _worker_matches GROUP BY target_id) m
+        JOIN _fresh_workers f ON f.seq = m.seq
+        WHERE Workers.unique_id = m.target_id
+          AND (Workers.accommodation_end_date IS NOT NULL OR {changed_clause})
+    """)
+    updated_count = cursor.rowcount
+    unchanged_count = matched_count - updated_count
+
+    # 5. 新增未匹配的員工
+    insert_cols = [col for col in staging_columns if col not in ('data_source', 'accommodation_start_date')]
+    cursor.execute(f"""
+        INSERT INTO Workers ({', '.join(f'"{c}"' for c in insert_cols)}, data_source, accommodation_start_date)
+        SELECT {', '.join(f'f."{c}"' for c in insert_cols)}, '系統自動更新', f.arrival_date
+        FROM _fresh_workers f
+        WHERE f.seq NOT IN (SELECT seq FROM _worker_matches)
+        ORDER BY f.seq
+    """)
+    added_count = cursor.rowcount
+
+    cursor.execute("DROP TABLE temp._worker_matches")
+    cursor.execute("DROP TABLE temp._fresh_workers")
+    return added_count, updated_count, unchanged_count, deleted_count
+
+def run_update_process(fresh_df: pd.DataFrame, log_callback: Callable[[str], None], bulk_merge: bool = True):
+    """
+    執行核心的資料庫更新流程 (v1.8 - 批次合併版)。
+    預設採用暫存表 + 集合式 SQL 的批次合併 (bulk_merge=True，SQLite 低於 3.33 時自動改用逐筆模式)，
+    亦可切回逐筆 INSERT, UPDATE, 軟刪除的舊流程。兩者皆不使用 'replace'。
     """
     log_callback("\n===== 開始執行核心資料庫更新程序 =====")
     today_str = datetime.today().strftime('%Y-%m-%d')
@@ -90,6 +280,8 @@ def run_update_process(fresh_df: pd.DataFrame, log_callback: Callable[[str], Non
                 cursor.execute(f"INSERT INTO Dormitories ({columns}) VALUES ({placeholders})", tuple(dorm_details.values()))
                 dorm_id = cursor.lastrowid
                 cursor.execute("INSERT INTO Rooms (dorm_id, room_number) VALUES (?, ?)", (dorm_id, "[未分配房間]"))
+            # 資料版本與新增的宿舍一併提交，其他 session 的快取結果隨之失效
+            query_cache.invalidate_tables('Dormitories', 'Rooms', conn=conn)
         
         conn.commit() # 提交宿舍新增的變更
 
@@ -99,72 +291,21 @@ def run_update_process(fresh_df: pd.DataFrame, log_callback: Callable[[str], Non
         address_room_map = pd.Series(address_room_df.room_id.values, index=address_room_df.normalized_address).to_dict()
         fresh_df['room_id'] = fresh_df['normalized_address'].map(address_room_map)
 
-        db_workers_df = pd.read_sql_query('SELECT * FROM Workers', conn)
-        
-        # --- 步驟 3: 執行全新的逐筆比對與更新 ---
-        log_callback("INFO: 步驟 3/3 - 正在執行全新的逐筆資料比對與更新...")
-        
-        processed_ids = set()
-        added_count, updated_count, deleted_count = 0, 0, 0
-
-        for index, fresh_worker in fresh_df.iterrows():
-            employer = fresh_worker['employer_name']
-            name = fresh_worker['worker_name']
-            passport = fresh_worker.get('passport_number')
-            
-            # 查找匹配的既有員工
-            match_query = "SELECT * FROM Workers WHERE employer_name = ? AND worker_name = ?"
-            cursor.execute(match_query, (employer, name))
-            existing_matches = [dict(row) for row in cursor.fetchall()]
-            
-            target_worker_id = None
-            if existing_matches:
-                if passport: # 有護照，用護照精準匹配
-                    for match in existing_matches:
-                        if match.get('passport_number') == passport:
-                            target_worker_id = match['unique_id']
-                            break
-                else: # 沒護照，匹配第一個找到的
-                    target_worker_id = existing_matches[0]['unique_id']
-
-            # 執行操作
-            if target_worker_id:
-                # 更新在職員工
-                update_cols = ['gender', 'nationality', 'passport_number', 'arc_number', 'arrival_date', 'departure_date', 'work_permit_expiry_date']
-                update_details = {col: fresh_worker.get(col) for col in update_cols if col in fresh_worker}
-                update_details['accommodation_end_date'] = None # 確保在職
-                
-                fields = ', '.join([f'"{key}" = ?' for key in update_details.keys()])
-                values = list(update_details.values()) + [target_worker_id]
-                cursor.execute(f"UPDATE Workers SET {fields} WHERE unique_id = ?", tuple(values))
-                updated_count += 1
-                processed_ids.add(target_worker_id)
-            else:
-                # 新增員工
-                new_worker_details = fresh_worker.to_dict()
-                new_worker_details['data_source'] = '系統自動更新'
-                new_worker_details['accommodation_start_date'] = new_worker_details.get('arrival_date')
-                
-                cols_to_keep = [col[1] for col in cursor.execute("PRAGMA table_info(Workers)").fetchall()]
-                final_details = {k: v for k, v in new_worker_details.items() if k in cols_to_keep}
-                
-                columns = ', '.join(f'"{k}"' for k in final_details.keys())
-                placeholders = ', '.join(['?'] * len(final_details))
-                cursor.execute(f"INSERT INTO Workers ({columns}) VALUES ({placeholders})", tuple(final_details.values()))
-                added_count += 1
-        
-        # 處理離職員工 (軟刪除)
-        db_system_ids = set(db_workers_df[db_workers_df['data_source'] == '系統自動更新']['unique_id'])
-        deleted_ids = db_system_ids - processed_ids
-        if deleted_ids:
-            for uid in deleted_ids:
-                cursor.execute("UPDATE Workers SET accommodation_end_date = ? WHERE unique_id = ? AND accommodation_end_date IS NULL", (today_str, uid))
-                if cursor.rowcount > 0:
-                    deleted_count += 1
-                    log_callback(f"INFO: 移工 '{uid}' 已不在最新名單，更新住宿迄日。")
+        # --- 步驟 3: 比對與更新 ---
+        if bulk_merge and sqlite3.sqlite_version_info < BULK_MERGE_MIN_SQLITE:
+            log_callback(f"WARNING: SQLite {sqlite3.sqlite_version} 不支援批次合併 (需 3.33 以上)，改用逐筆模式。")
+            bulk_merge = False
+        if bulk_merge:
+            log_callback("INFO: 步驟 3/3 - 正在以批次合併模式執行資料比對與更新...")
+            added_count, updated_count, unchanged_count, deleted_count = _merge_workers_bulk(cursor, fresh_df, today_str, log_callback)
+        else:
+            log_callback("INFO: 步驟 3/3 - 正在執行全新的逐筆資料比對與更新...")
+            db_workers_df = pd.read_sql_query('SELECT * FROM Workers', conn)
+            added_count, updated_count, unchanged_count, deleted_count = _merge_workers_row_by_row(cursor, fresh_df, db_workers_df, today_str, log_callback)
 
+        query_cache.invalidate_tables('Workers', conn=conn)
         conn.commit()
-        log_callback(f"SUCCESS: 資料庫更新完成！新增: {added_count}, 更新: {updated_count}, 標記離職: {deleted_count}。")
+        log_callback(f"SUCCESS: 資料庫更新完成！新增: {added_count}, 更新: {updated_count}, 未變動: {unchanged_count}, 標記離職: {deleted_count}。")
 
     except Exception as e:
         log_callback(f"CRITICAL: 更新資料庫時發生嚴重錯誤: {e}")
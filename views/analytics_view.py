@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from data_models import analytics_model, dormitory_model, meter_model
+from data_models import analytics_model, dormitory_model, meter_model, query_cache
 
 def render():
     """渲染「費用分析」儀表板"""
@@ -8,7 +8,7 @@ def render():
     st.info("此工具用於追蹤單一電水錶的歷史費用，並自動偵測潛在的異常帳單。")
     
     if st.button("🔄 重新整理所有數據"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
     st.markdown("---")
 
@@ -20,15 +20,23 @@ def render():
             st.markdown("""
             系統採用統計學中的 **IQR (四分位距)** 方法來自動偵測異常值：
             1.  **分組計算**：將同一個電水錶的所有歷史帳單分為一組。
-            2.  **找出中間值**：計算這組數據中，排名在25% (Q1)和75% (Q3)的金額。
-            3.  **定義正常範圍**：系統會定義一個合理的「正常費用範圍」。
-            4.  **揪出異常**：任何**遠遠超出**這個正常範圍的帳單，就會被標記為「費用過高」或「費用過低」。
+            2.  **換算日均金額**：帳單期間長短不一，先以「帳單金額 ÷ 帳單天數」換算為每日金額再比較。
+            3.  **找出中間值**：計算這組數據中，排名在25% (Q1)和75% (Q3)的日均金額。
+            4.  **定義正常範圍**：系統會定義一個合理的「正常日均費用範圍」。
+            5.  **揪出異常**：任何**遠遠超出**這個正常範圍的帳單，就會被標記為「費用過高」或「費用過低」。
             
             *註：至少需要4筆歷史帳單，系統才能進行有效的統計分析。*
+            *新增或修改帳單時，系統會立即以既有的正常範圍判斷該帳單；大量修正歷史帳單後，可按下方按鈕重新計算所有範圍。*
             """)
+            if st.button("重新計算所有電水錶的正常範圍"):
+                success, message = analytics_model.rebuild_expense_anomalies()
+                if success:
+                    st.success(message)
+                else:
+                    st.error(message)
 
-        @st.cache_data
         def get_anomalies():
+            analytics_model.refresh_expense_anomalies()
             return analytics_model.find_expense_anomalies()
             
         anomalies_df = get_anomalies()
@@ -56,6 +64,7 @@ def render():
                 hide_index=True,
                 column_config={
                     "異常金額": st.column_config.NumberColumn(format="NT$ %d"),
+                    "日均金額": st.column_config.NumberColumn(format="NT$ %.1f"),
                 }
             )
             # --- 修改結束 ---
@@ -91,7 +100,6 @@ def render():
             if selected_meter_id:
                 st.markdown(f"#### 分析結果: {meter_options[selected_meter_id]}")
                 
-                @st.cache_data
                 def get_data(meter_id):
                     return analytics_model.get_bill_history_for_meter(meter_id)
 
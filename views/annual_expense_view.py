@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from data_models import finance_model, dormitory_model
+from data_models import finance_model, dormitory_model, query_cache
 
 def render():
     """渲染「年度費用管理」頁面"""
@@ -75,7 +75,6 @@ def render():
                     success, message, _ = finance_model.add_annual_expense_record(details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                     else:
                         st.error(message)
 
@@ -85,9 +84,8 @@ def render():
     st.subheader(f"歷史費用總覽: {dorm_options.get(selected_dorm_id)}")
 
     if st.button("🔄 重新整理費用列表"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
-    @st.cache_data
     def get_annual_expenses(dorm_id):
         return finance_model.get_annual_expenses_for_dorm_as_df(dorm_id)
 
@@ -113,7 +111,6 @@ def render():
                 success, message = finance_model.delete_annual_expense_record(record_id)
                 if success:
                     st.success(message)
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error(message)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import dashboard_model
+from data_models import dashboard_model, query_cache
 
 def render():
     """渲染儀表板頁面，包含「住宿總覽」和「財務分析」兩個頁籤。"""
@@ -13,11 +13,10 @@ def render():
     with tab1:
         st.subheader("各宿舍即時住宿統計")
         if st.button("🔄 重新整理住宿數據", key="refresh_overview"):
-            st.cache_data.clear()
+            query_cache.clear_cache()
 
-        @st.cache_data
         def get_overview_data():
-            """快取住宿總覽的查詢結果。"""
+            """取得住宿總覽的查詢結果 (快取由 dashboard_model 負責)。"""
             return dashboard_model.get_dormitory_dashboard_data()
 
         overview_df = get_overview_data()
@@ -38,7 +37,6 @@ def render():
             st.markdown("---")
             st.subheader("特殊狀況人員統計")
 
-            @st.cache_data
             def get_status_summary():
                 return dashboard_model.get_special_status_summary()
 
@@ -78,13 +76,11 @@ def render():
         with st.container(border=True):
             st.markdown("##### 費用預測分析")
             
-            @st.cache_data
             def get_annual_forecast():
                 return dashboard_model.get_expense_forecast_data()
             
             annual_forecast_data = get_annual_forecast()
             
-            @st.cache_data
             def get_seasonal_forecast(period):
                 return dashboard_model.get_seasonal_expense_forecast(period)
                 
@@ -115,9 +111,8 @@ def render():
         st.info("此報表統計實際發生的「總收入」(員工月費+其他收入)與「總支出」(宿舍月租+當月帳單攤銷+年度費用攤銷)的差額。")
 
         if st.button("🔍 產生財務報表"):
-            get_finance_data.clear()
+            dashboard_model.get_financial_dashboard_data.clear()
 
-        @st.cache_data
         def get_finance_data(period):
             return dashboard_model.get_financial_dashboard_data(period)
 
@@ -156,4 +151,21 @@ def render():
                     # 我們仍然可以為上色後的欄位設定數字格式
                     "預估損益": st.column_config.NumberColumn(format="NT$ %d")
                 }
-            )
\ No newline at end of file
+            )
+
+        st.markdown("---")
+        st.subheader("多月份損益趨勢")
+        t_col1, t_col2 = st.columns(2)
+        month_options = [f"{y}-{m:02d}" for y in range(today.year - 3, today.year + 2) for m in range(1, 13)]
+        default_end = month_options.index(year_month_str)
+        start_month = t_col1.selectbox("起始月份", options=month_options, index=max(default_end - 11, 0))
+        end_month = t_col2.selectbox("結束月份", options=month_options, index=default_end)
+
+        series_df = dashboard_model.get_financial_series(start_month, end_month)
+        if series_df is None or series_df.empty:
+            st.info("所選期間內沒有任何「我司管理」宿舍的收支數據。")
+        else:
+            monthly_totals = series_df.groupby('月份')[['預計總收入', '預計總支出', '預估損益']].sum()
+            st.line_chart(monthly_totals)
+            with st.expander("查看各宿舍每月明細"):
+                st.dataframe(series_df.drop(columns=['dorm_id']), use_container_width=True, hide_index=True)
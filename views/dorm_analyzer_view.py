@@ -23,27 +23,8 @@ def render():
     if not selected_dorm_id: return
     st.markdown("---")
 
-    # --- 2. 顯示基本資訊 ---
-    basic_info = single_dorm_analyzer.get_dorm_basic_info(selected_dorm_id)
-    meters_df = single_dorm_analyzer.get_dorm_meters(selected_dorm_id)
-
-    st.subheader(f"基本資訊: {dorm_options[selected_dorm_id]}")
-    if basic_info:
-        c1, c2, c3, c4 = st.columns(4)
-        c1.metric("主要管理人", basic_info.get('primary_manager'))
-        c2.metric("租金支付方", basic_info.get('rent_payer'))
-        c3.metric("水電支付方", basic_info.get('utilities_payer'))
-        
-        # --- 更安全的格式化方式 ---
-        rent_value = basic_info.get('monthly_rent') or 0
-        c4.metric("當前月租", f"NT$ {int(rent_value):,}")
-
-        st.write(f"**租賃合約期間:** {basic_info.get('lease_start_date', 'N/A')} ~ {basic_info.get('lease_end_date', 'N/A')}")
-
-    if not meters_df.empty:
-        with st.expander("顯示此宿舍的電水錶號"):
-            st.dataframe(meters_df, use_container_width=True, hide_index=True)
-            
+    # 基本資訊區塊先保留位置，待選定月份、一次取得整包分析資料後再填入
+    basic_info_container = st.container()
     st.markdown("---")
 
     # --- 3. 數據分析區塊 ---
@@ -55,9 +36,36 @@ def render():
     selected_month = sc2.selectbox("選擇月份", options=range(1, 13), index=today.month - 1)
     year_month_str = f"{selected_year}-{selected_month:02d}"
 
-    # 獲取數據
-    resident_data = single_dorm_analyzer.get_resident_summary(selected_dorm_id, year_month_str)
-    expense_data_df = single_dorm_analyzer.get_expense_summary(selected_dorm_id, year_month_str)
+    # 一次取得此宿舍、此月份所需的全部資料 (單一連線、單一快取項目)
+    bundle = single_dorm_analyzer.get_dorm_analysis_bundle(selected_dorm_id, year_month_str)
+    if bundle is None:
+        st.error("分析數據時發生錯誤，請檢查資料庫連線。")
+        return
+
+    # --- 2. 顯示基本資訊 ---
+    basic_info = bundle.basic_info
+    meters_df = bundle.meters
+
+    with basic_info_container:
+        st.subheader(f"基本資訊: {dorm_options[selected_dorm_id]}")
+        if basic_info:
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("主要管理人", basic_info.get('primary_manager'))
+            c2.metric("租金支付方", basic_info.get('rent_payer'))
+            c3.metric("水電支付方", basic_info.get('utilities_payer'))
+            
+            # --- 更安全的格式化方式 ---
+            rent_value = basic_info.get('monthly_rent') or 0
+            c4.metric("當前月租", f"NT$ {int(rent_value):,}")
+
+            st.write(f"**租賃合約期間:** {basic_info.get('lease_start_date', 'N/A')} ~ {basic_info.get('lease_end_date', 'N/A')}")
+
+        if not meters_df.empty:
+            with st.expander("顯示此宿舍的電水錶號"):
+                st.dataframe(meters_df, use_container_width=True, hide_index=True)
+
+    resident_data = bundle.resident_summary
+    expense_data_df = bundle.expenses
 
     # 顯示數據
     st.markdown(f"#### {year_month_str} 住宿人員分析")
@@ -77,8 +85,7 @@ def render():
     # --- 3-2. 數據分析區塊 (徹底重構) ---
     st.subheader(f"{year_month_str} 宿舍營運分析")
     
-    # 獲取所有分析數據
-    analysis_data = single_dorm_analyzer.get_dorm_analysis_data(selected_dorm_id, year_month_str)
+    analysis_data = bundle.occupancy
 
     if not analysis_data:
         st.error("分析數據時發生錯誤，請檢查資料庫連線。")
@@ -125,10 +132,40 @@ def render():
     st.markdown("---")
     st.subheader(f"{year_month_str} 在住人員詳細名單")
     
-    # 從後端獲取詳細名單
-    resident_details_df = single_dorm_analyzer.get_resident_details_as_df(selected_dorm_id, year_month_str)
+    resident_details_df = bundle.resident_details
 
     if resident_details_df.empty:
         st.info("此宿舍於該月份沒有在住人員。")
     else:
-        st.dataframe(resident_details_df, use_container_width=True, hide_index=True)
\ No newline at end of file
+        st.dataframe(resident_details_df, use_container_width=True, hide_index=True)
+    # --- 5. 多宿舍營運比較 ---
+    st.markdown("---")
+    with st.expander("多宿舍營運比較", expanded=False):
+        st.info("一次比較多間宿舍在指定期間的住用率、每床收入、每人成本與每人水電，並依所選指標排名。未選擇宿舍時比較所有「我司管理」的宿舍。")
+        compare_ids = st.multiselect(
+            "選擇要比較的宿舍：",
+            options=list(dorm_options.keys()),
+            format_func=lambda x: dorm_options.get(x, "未知宿舍")
+        )
+        pc1, pc2, pc3 = st.columns(3)
+        month_options = [f"{y}-{m:02d}" for y in range(today.year - 2, today.year + 2) for m in range(1, 13)]
+        default_end = month_options.index(f"{today.year}-{today.month:02d}")
+        start_month = pc1.selectbox("起始月份", options=month_options, index=max(default_end - 5, 0), key="portfolio_start")
+        end_month = pc2.selectbox("結束月份", options=month_options, index=default_end, key="portfolio_end")
+        rank_by = pc3.selectbox("排名依據", options=list(single_dorm_analyzer.PORTFOLIO_METRICS.keys()))
+
+        portfolio_df = single_dorm_analyzer.get_portfolio_analysis(compare_ids, start_month, end_month, rank_by)
+        if portfolio_df.empty:
+            st.info("所選期間沒有可比較的宿舍資料。")
+        else:
+            st.dataframe(
+                portfolio_df.drop(columns=['dorm_id']),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "住用率": st.column_config.NumberColumn(format="percent"),
+                    "總收入": st.column_config.NumberColumn(format="NT$ %d"),
+                    "總支出": st.column_config.NumberColumn(format="NT$ %d"),
+                    "預估損益": st.column_config.NumberColumn(format="NT$ %d"),
+                }
+            )
@@ -45,7 +45,6 @@ def render():
                     success, message = dormitory_model.add_new_dormitory(dorm_details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                     else:
                         st.error(message)
 
@@ -56,7 +55,6 @@ def render():
     
     search_term = st.text_input("搜尋宿舍 (可輸入舊編號、名稱、原始或正規化地址)")
     
-    @st.cache_data
     def get_dorms_df(search=None):
         # 將搜尋條件傳遞給後端
         return dormitory_model.get_all_dorms_for_view(search_term=search)
@@ -112,7 +110,6 @@ def render():
                         success, message = dormitory_model.update_dormitory_details(dorm_id, updated_details)
                         if success:
                             st.success(message)
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.error(message)
@@ -125,7 +122,6 @@ def render():
                     if success:
                         st.success(message)
                         st.session_state.selected_dorm_id = None
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
@@ -167,7 +163,6 @@ def render():
                                 success, message = dormitory_model.update_room_details(selected_room_id, updated_details)
                                 if success:
                                     st.success(message)
-                                    st.cache_data.clear()
                                     st.rerun()
                                 else:
                                     st.error(message)
@@ -177,7 +172,6 @@ def render():
                             success, message = dormitory_model.delete_room_by_id(selected_room_id)
                             if success:
                                 st.success(message)
-                                st.cache_data.clear()
                                 st.rerun()
                             else:
                                 st.error(message)
@@ -209,7 +203,6 @@ def render():
                             success, msg, _ = dormitory_model.add_new_room_to_dorm(room_details)
                             if success:
                                 st.success(msg)
-                                st.cache_data.clear()
                                 st.rerun()
                             else:
                                 st.error(msg)
\ No newline at end of file
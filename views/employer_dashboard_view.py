@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import employer_dashboard_model
+from data_models import employer_dashboard_model, query_cache
 
 def render():
     """渲染「雇主儀表板」頁面"""
@@ -9,7 +9,6 @@ def render():
     st.info("請從下方選擇一位雇主，以檢視其所有在住員工的詳細住宿分佈與財務貢獻情況。")
 
     # --- 1. 雇主與月份選擇 ---
-    @st.cache_data
     def get_employers_list():
         return employer_dashboard_model.get_all_employers()
 
@@ -32,7 +31,18 @@ def render():
     year_month_str = f"{selected_year}-{selected_month:02d}"
 
     if st.button("🔄 重新整理數據"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
+
+    with st.expander(f"所有雇主財務總覽 ({year_month_str})"):
+        all_summary_df = employer_dashboard_model.get_all_employers_financial_summary(year_month_str)
+        if all_summary_df.empty:
+            st.info("該月份沒有任何雇主的財務資料。")
+        else:
+            st.dataframe(
+                all_summary_df.rename(columns={'total_income': '預估總收入', 'total_expense': '預估分攤總支出', 'profit_loss': '預估淨貢獻'})
+                              .sort_values('預估淨貢獻', ascending=False),
+                use_container_width=True
+            )
 
     st.markdown("---")
 
@@ -40,7 +50,6 @@ def render():
     if selected_employer:
         
         # --- 獲取數據 ---
-        @st.cache_data
         def get_details(employer):
             return employer_dashboard_model.get_employer_resident_details(employer)
 
@@ -52,7 +61,6 @@ def render():
             # --- 財務總覽 (維持不變) ---
             st.subheader(f"財務總覽 ({year_month_str})")
             
-            @st.cache_data
             def get_finance_summary(employer, period):
                 return employer_dashboard_model.get_employer_financial_summary(employer, period)
 
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import equipment_model, dormitory_model
+from data_models import equipment_model, dormitory_model, query_cache
 
 def render():
     """渲染「設備管理」頁面"""
@@ -65,7 +65,6 @@ def render():
                     success, message, _ = equipment_model.add_equipment_record(details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                     else:
                         st.error(message)
 
@@ -75,9 +74,8 @@ def render():
     st.subheader(f"現有設備總覽: {dorm_options.get(selected_dorm_id)}")
     
     if st.button("🔄 重新整理設備列表"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
-    @st.cache_data
     def get_equipment(dorm_id):
         return equipment_model.get_equipment_for_dorm_as_df(dorm_id)
 
@@ -142,7 +140,6 @@ def render():
                         success, message = equipment_model.update_equipment_record(selected_id, update_data)
                         if success:
                             st.success(message)
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.error(message)
@@ -154,7 +151,6 @@ def render():
                     success, message = equipment_model.delete_equipment_record(selected_id)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import finance_model, dormitory_model, meter_model
+from data_models import finance_model, dormitory_model, meter_model, query_cache
 
 def render():
     """渲染「費用管理」頁面 (帳單式)"""
@@ -71,7 +71,6 @@ def render():
                     success, message, _ = finance_model.add_bill_record(details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                     else:
                         st.error(message)
 
@@ -81,9 +80,8 @@ def render():
     st.subheader(f"歷史帳單總覽: {dorm_options.get(selected_dorm_id)}")
 
     if st.button("🔄 重新整理帳單列表"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
-    @st.cache_data
     def get_bills(dorm_id):
         return finance_model.get_bill_records_for_dorm_as_df(dorm_id)
 
@@ -160,7 +158,6 @@ def render():
                         success, message = finance_model.update_bill_record(selected_bill_id, update_data)
                         if success:
                             st.success(message)
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.error(message)
@@ -172,7 +169,6 @@ def render():
                     success, message = finance_model.delete_bill_record(selected_bill_id)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
\ No newline at end of file
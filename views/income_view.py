@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import income_model, dormitory_model
+from data_models import income_model, dormitory_model, query_cache
 
 def render():
     st.header("我司管理宿舍 - 其他收入管理")
@@ -35,7 +35,6 @@ def render():
                 success, message, _ = income_model.add_income_record(details)
                 if success:
                     st.success(message)
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error(message)
@@ -44,9 +43,8 @@ def render():
     st.subheader("歷史收入紀錄")
 
     if st.button("🔄 重新整理列表"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
         
-    @st.cache_data
     def get_income_df(dorm_id):
         return income_model.get_income_for_dorm_as_df(dorm_id)
         
@@ -78,7 +76,6 @@ def render():
                 success, message = income_model.delete_income_record(selected_income_id)
                 if success:
                     st.success(message)
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error(message)
\ No newline at end of file
@@ -37,7 +37,6 @@ def render():
                 success, message, _ = lease_model.add_lease(details)
                 if success:
                     st.success(message)
-                    st.cache_data.clear()
                     st.rerun()
                 else:
                     st.error(message)
@@ -51,7 +50,6 @@ def render():
     dorm_filter_options = {0: "所有宿舍"} | {d['id']: d['original_address'] for d in dorms_for_filter}
     dorm_id_filter = st.selectbox("篩選宿舍", options=list(dorm_filter_options.keys()), format_func=lambda x: dorm_filter_options.get(x))
 
-    @st.cache_data
     def get_leases(filter_id):
         return lease_model.get_leases_for_view(filter_id if filter_id else None)
 
@@ -111,7 +109,6 @@ def render():
                         success, message = lease_model.update_lease(selected_lease_id, updated_details)
                         if success:
                             st.success(message)
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.error(message)
@@ -123,7 +120,6 @@ def render():
                     success, message = lease_model.delete_lease(selected_lease_id)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_models import meter_model, dormitory_model
+from data_models import meter_model, dormitory_model, query_cache
 
 def render():
     """渲染「電水錶管理」頁面"""
@@ -9,7 +9,6 @@ def render():
     st.info("用於登錄與管理宿舍的電錶、水錶、天然氣、電信等各類用戶號碼。")
 
     # --- 1. 宿舍選擇 ---
-    @st.cache_data
     def get_my_dorms():
         return dormitory_model.get_my_company_dorms_for_selection()
 
@@ -55,7 +54,6 @@ def render():
                     success, message, _ = meter_model.add_meter_record(details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear() # 清除快取以刷新列表
                     else:
                         st.error(message)
 
@@ -65,9 +63,8 @@ def render():
     st.subheader(f"現有用戶號總覽: {dorm_options[selected_dorm_id]}")
 
     if st.button("🔄 重新整理列表"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
-    @st.cache_data
     def get_meters(dorm_id):
         return meter_model.get_meters_for_dorm_as_df(dorm_id)
 
@@ -96,7 +93,6 @@ def render():
                     success, message = meter_model.delete_meter_record(record_id)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
\ No newline at end of file
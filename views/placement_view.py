@@ -8,13 +8,12 @@ def render():
     st.info("此工具能協助您根據新進員工的條件，快速找到我司管理宿舍中所有符合入住條件的空床位。")
 
     # --- 1. 篩選條件 ---
-    @st.cache_data
     def get_my_dorms():
         return dormitory_model.get_my_company_dorms_for_selection()
 
     my_dorms = get_my_dorms()
     
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns([1, 2, 1])
     
     gender_filter = c1.selectbox(
         "預計入住員工性別：",
@@ -30,6 +29,7 @@ def render():
         format_func=lambda x: dorm_options.get(x)
     )
     # --- 修改結束 ---
+    min_free_beds = c3.number_input("最少空床位數：", min_value=1, step=1, value=1)
     
     st.markdown("---")
 
@@ -38,7 +38,8 @@ def render():
         with st.spinner("正在為您進行智能配對，請稍候..."):
             filters = {
                 "gender": gender_filter,
-                "dorm_ids": selected_dorm_ids # 將選擇的宿舍ID列表傳入
+                "dorm_ids": selected_dorm_ids, # 將選擇的宿舍ID列表傳入
+                "min_free_beds": int(min_free_beds)
             }
             results_df = placement_model.find_available_rooms(filters)
 
@@ -51,4 +52,35 @@ def render():
                 results_df.sort_values(by="空床位數", ascending=False),
                 use_container_width=True,
                 hide_index=True
-            )
\ No newline at end of file
+            )
+    # --- 3. 整批安排 ---
+    st.markdown("---")
+    st.subheader("整批新進員工安排")
+    st.caption("輸入各組 (性別、國籍) 的人數，系統會在上方選擇的宿舍範圍內一次分配房間：人數多的組先排，同組盡量集中，並避免與異性或不同國籍混住。")
+    batch_df = st.data_editor(
+        pd.DataFrame([{"性別": "男", "國籍": "", "人數": 0}, {"性別": "女", "國籍": "", "人數": 0}]),
+        num_rows="dynamic",
+        column_config={
+            "性別": st.column_config.SelectboxColumn(options=["男", "女"], required=True),
+            "人數": st.column_config.NumberColumn(min_value=0, step=1, format="%d 人"),
+        },
+        hide_index=True,
+        key="placement_batch_editor"
+    )
+
+    if st.button("🧮 產生整批安排建議"):
+        batch = [
+            {'gender': row["性別"], 'nationality': (row["國籍"] or '').strip(), 'count': int(row["人數"] or 0)}
+            for row in batch_df.to_dict('records')
+        ]
+        if not any(group['count'] > 0 for group in batch):
+            st.warning("請至少輸入一組人數。")
+        else:
+            with st.spinner("正在分配房間..."):
+                assignments_df, unplaced_df = placement_model.plan_batch_placement(batch, selected_dorm_ids)
+            if not assignments_df.empty:
+                st.success(f"已安排 {int(assignments_df['安排人數'].sum())} 人，共使用 {len(assignments_df)} 間房。")
+                st.dataframe(assignments_df, use_container_width=True, hide_index=True)
+            if not unplaced_df.empty:
+                st.error(f"尚有 {int(unplaced_df['未安排人數'].sum())} 人找不到合適的床位：")
+                st.dataframe(unplaced_df, use_container_width=True, hide_index=True)
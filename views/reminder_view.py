@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from data_models import reminder_model
+from data_models import reminder_model, query_cache
 
 def render():
     """渲染「智慧提醒」儀表板"""
@@ -16,9 +16,8 @@ def render():
     st.info(f"以下將顯示在 **{days_ahead} 天內**即將到期的所有項目。")
     
     if st.button("🔄 重新整理"):
-        st.cache_data.clear()
+        query_cache.clear_cache()
 
-    @st.cache_data
     def get_reminders(days):
         return reminder_model.get_upcoming_reminders(days)
 
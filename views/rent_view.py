@@ -9,7 +9,6 @@ def render():
     # --- 1. 宿舍選擇 ---
     st.subheader("步驟一：選擇要管理的宿舍")
     
-    @st.cache_data
     def get_my_dorms():
         return dormitory_model.get_my_company_dorms_for_selection()
 
@@ -71,6 +70,5 @@ def render():
                     )
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                     else:
                         st.error(message)
\ No newline at end of file
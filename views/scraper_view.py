@@ -12,17 +12,21 @@ def log_message(message: str):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     st.session_state.log_messages.insert(0, f"[{timestamp}] {message}")
 
-def _run_download_only(url, auth, temp_dir):
+def _run_download_only(url, auth, temp_dir, max_workers=4, request_delay=1.0, range_plan_path='range_plan.json', range_target_bytes=scraper.DEFAULT_RANGE_TARGET_BYTES):
     """執行「僅下載」的後端流程。"""
     log_message("流程啟動：僅下載最新報表...")
-    query_ranges = scraper.generate_code_ranges()
+    query_ranges = scraper.load_range_plan(range_plan_path)
     downloaded_files = scraper.download_all_reports(
         target_url=url,
         auth_credentials=auth,
         query_ranges=query_ranges,
         temp_dir=temp_dir,
-        log_callback=log_message
+        log_callback=log_message,
+        max_workers=max_workers,
+        request_delay=request_delay
     )
+    # 依本次各區間的回應大小調整下次的查詢區間
+    scraper.update_range_plan(range_plan_path, temp_dir, log_message, range_target_bytes)
     if downloaded_files:
         log_message(f"下載完成！共 {len(downloaded_files)} 個檔案已存放於 '{temp_dir}' 資料夾。")
         st.success(f"下載成功！檔案已暫存，您可以隨時執行「寫入資料庫」。")
@@ -30,7 +34,7 @@ def _run_download_only(url, auth, temp_dir):
         log_message("下載流程結束，但未獲取任何檔案。")
         st.warning("下載完成，但未收到任何檔案。")
 
-def _run_write_only(temp_dir):
+def _run_write_only(temp_dir, parse_workers=1):
     """
     執行「僅寫入資料庫」的後端流程。
     【v1.1 核心修改】不再依賴 session_state，而是直接掃描暫存資料夾。
@@ -42,12 +46,21 @@ def _run_write_only(temp_dir):
         log_message(f"錯誤：在 '{temp_dir}' 中找不到報表檔案，請先執行「僅下載資料」。")
         return
 
-    file_paths = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.endswith('.xls')]
+    # 若有區間下載失敗，寫入會把該區間的所有員工誤判為離職，因此中止
+    failed_ranges = scraper.get_failed_ranges(temp_dir)
+    if failed_ranges:
+        st.error(f"錯誤：有 {len(failed_ranges)} 個區間下載失敗，資料不完整，已中止寫入。請先重新執行「僅下載資料」補齊。")
+        log_message(f"錯誤：以下區間下載失敗，為避免誤將員工標記為離職，已中止寫入: {', '.join(failed_ranges)}")
+        return
+
+    # 只處理最近一次下載所用查詢區間的檔案 (見 scraper.get_downloaded_files)
+    file_paths = scraper.get_downloaded_files(temp_dir)
     log_message(f"在 '{temp_dir}' 中找到 {len(file_paths)} 個報表檔案，開始處理...")
     
     processed_df = data_processor.parse_and_process_reports(
         file_paths=file_paths,
-        log_callback=log_message
+        log_callback=log_message,
+        max_workers=parse_workers
     )
     
     if processed_df is not None and not processed_df.empty:
@@ -70,6 +83,12 @@ def render(config):
     account = config.get('System', 'ACCOUNT', fallback='')
     password = config.get('System', 'PASSWORD', fallback='')
     temp_dir = config.get('System', 'TEMP_DIR', fallback='temp_downloads')
+    max_workers = config.getint('System', 'MAX_CONCURRENT_DOWNLOADS', fallback=4)
+    request_delay = config.getfloat('System', 'REQUEST_DELAY', fallback=1.0)
+    # 預設逐一解析；設定大於 1 時才啟用多行程平行解析
+    parse_workers = config.getint('System', 'PARSE_WORKERS', fallback=1)
+    range_plan_path = config.get('System', 'RANGE_PLAN_FILE', fallback='range_plan.json')
+    range_target_bytes = config.getint('System', 'RANGE_TARGET_BYTES', fallback=scraper.DEFAULT_RANGE_TARGET_BYTES)
 
     with st.sidebar:
         st.header("系統連線設定")
@@ -86,22 +105,22 @@ def render(config):
         if st.button("① 僅下載資料", help="從內網系統下載最新的報表，並存放於暫存資料夾。"):
             st.session_state.log_messages = []
             with st.spinner("正在連線並下載報表..."):
-                _run_download_only(target_url, auth_credentials, temp_dir)
+                _run_download_only(target_url, auth_credentials, temp_dir, max_workers, request_delay, range_plan_path, range_target_bytes)
 
     with col2:
         if st.button("② 僅寫入資料庫", help="讀取暫存資料夾中的所有報表，進行處理與比對，並更新至資料庫。"):
             st.session_state.log_messages = []
             with st.spinner("正在掃描檔案並更新資料庫..."):
-                _run_write_only(temp_dir)
+                _run_write_only(temp_dir, parse_workers)
     
     with col3:
         if st.button("🚀 下載並直接寫入 (全自動)", type="primary", help="自動化執行步驟①和②。"):
             st.session_state.log_messages = []
             with st.spinner("正在執行全自動同步..."):
-                _run_download_only(target_url, auth_credentials, temp_dir)
+                _run_download_only(target_url, auth_credentials, temp_dir, max_workers, request_delay, range_plan_path, range_target_bytes)
                 # 檢查檔案是否真的存在於資料夾中
                 if os.path.exists(temp_dir) and any(f.endswith('.xls') for f in os.listdir(temp_dir)):
-                    _run_write_only(temp_dir)
+                    _run_write_only(temp_dir, parse_workers)
 
     st.header("執行日誌")
     with st.expander("點此展開/收合詳細日誌", expanded=True):
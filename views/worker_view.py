@@ -77,7 +77,6 @@ def render():
                     success, message, _ = worker_model.add_manual_worker(details, status_details)
                     if success:
                         st.success(message)
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error(message)
@@ -87,7 +86,6 @@ def render():
     # --- 2. 編輯與檢視區塊 ---
     st.subheader("編輯/檢視單一移工資料")
     
-    @st.cache_data
     def get_editable_workers_list():
         return worker_model.get_my_company_workers_for_selection()
 
@@ -176,7 +174,6 @@ def render():
                             success, message = worker_model.update_worker_details(selected_worker_id, update_data)
                             if success:
                                 st.success(message)
-                                st.cache_data.clear()
                                 st.rerun()
                             else:
                                 st.error(message)
@@ -188,7 +185,6 @@ def render():
                         success, message = worker_model.delete_worker_by_id(selected_worker_id)
                         if success:
                             st.success(message)
-                            st.cache_data.clear()
                             st.rerun()
                         else:
                             st.error(message)
@@ -213,7 +209,6 @@ def render():
                             success, message = worker_model.add_new_worker_status(status_details)
                             if success:
                                 st.success(message)
-                                st.cache_data.clear()
                                 st.rerun()
                             else:
                                 st.error(message)
@@ -268,7 +263,6 @@ def render():
                                     success, message = worker_model.update_worker_status(selected_status_id, updated_details)
                                     if success:
                                         st.success(message)
-                                        st.cache_data.clear()
                                         st.rerun()
                                     else:
                                         st.error(message)
@@ -278,7 +272,6 @@ def render():
                                 success, message = worker_model.delete_worker_status(selected_status_id)
                                 if success:
                                     st.success(message)
-                                    st.cache_data.clear()
                                     st.rerun()
                                 else:
                                     st.error(message)
@@ -290,7 +283,6 @@ def render():
     # --- 3. 移工總覽 (僅供檢視) ---
     st.subheader("移工總覽 (所有宿舍)")
     
-    @st.cache_data
     def get_dorms_list():
         return dormitory_model.get_dorms_for_selection()
 
@@ -298,12 +290,31 @@ def render():
     dorm_options = {d['id']: d['original_address'] for d in dorms}
     
     f_c1_view, f_c2_view, f_c3_view = st.columns(3)
-    name_search = f_c1_view.text_input("搜尋姓名、雇主或地址 ")
+    name_search = f_c1_view.text_input("搜尋姓名、雇主、護照 / 居留證號或地址 ")
     dorm_id_filter = f_c2_view.selectbox("篩選宿舍 ", options=[None] + list(dorm_options.keys()), format_func=lambda x: "全部宿舍" if x is None else dorm_options.get(x))
     status_filter = f_c3_view.selectbox("篩選在住狀態 ", ["全部", "在住", "已離住"])
 
     filters = {'name_search': name_search, 'dorm_id': dorm_id_filter, 'status': status_filter}
-    
-    workers_df = worker_model.get_workers_for_view(filters)
-    
+
+    # 分頁狀態：page_starts[i] 為第 i+1 頁的起始鍵 (第一頁為 None)；篩選條件或每頁筆數改變時回到第一頁
+    p_c1, p_c2, p_c3, p_c4 = st.columns([1, 1, 1, 3])
+    page_size = p_c4.selectbox("每頁筆數", [50, 100, 200, 500], index=1)
+    paging_key = (name_search, dorm_id_filter, status_filter, page_size)
+    if st.session_state.get('worker_list_paging_key') != paging_key:
+        st.session_state.worker_list_paging_key = paging_key
+        st.session_state.worker_list_page_starts = [None]
+    page_starts = st.session_state.worker_list_page_starts
+
+    total_count = worker_model.count_workers_for_view(filters)
+    workers_df, next_after = worker_model.get_workers_page(filters, page_size, page_starts[-1])
+
+    total_pages = max(1, -(-total_count // page_size))
+    if p_c1.button("⬅️ 上一頁", disabled=len(page_starts) <= 1):
+        page_starts.pop()
+        st.rerun()
+    if p_c2.button("下一頁 ➡️", disabled=next_after is None):
+        page_starts.append(next_after)
+        st.rerun()
+    p_c3.write(f"第 {len(page_starts)} / {total_pages} 頁，共 {total_count:,} 筆")
+
     st.dataframe(workers_df, use_container_width=True, hide_index=True)
\ No newline at end of file